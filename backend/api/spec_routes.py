@@ -1,12 +1,11 @@
+import json
 import logging
-import datetime
 import uuid
 import base64
-from functions import page_classification
-from quart import Blueprint, request, jsonify, current_app
-from classes import S3Bucket, db, Anthropic, PDFPageConverter
-from functions import section_pages_detection as detect_section_pages
-from csi_masterformat import divisions_and_sections
+from functions import spec_ingest, spool_uploads
+from functions.page_classifier import page_classifier
+from quart import Blueprint, request, jsonify, make_response
+from classes import S3Bucket, db, Anthropic, PDFPageConverter, progress_hub, response_cache, prompt_cache_stats, llm_scheduler, token_estimator
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -16,12 +15,9 @@ spec_routes_bp = Blueprint("spec_routes", __name__)
 anthropic = Anthropic()
 
 
-# Upload original PDF to S3 bucket and convert PDF to text or rasterize
+# Accept the upload and queue the ingest pipeline (S3 upload, page split, section detection, classification)
 @spec_routes_bp.route("/upload", methods=["POST"])
 async def upload():
-    s3 = S3Bucket()
-    start_time = datetime.datetime.now()
-
     form = await request.form
     files = await request.files
     pdf = files.getlist("pdf")
@@ -36,58 +32,34 @@ async def upload():
 
     spec_id = str(uuid.uuid4())
 
-    async with s3.s3_client() as s3_client:
-        original_pdf_upload_result = await s3.upload_original_pdf_with_client(files=pdf, spec_id=spec_id, s3=s3_client)
-        if original_pdf_upload_result["status_code"] != 200:
-            return jsonify({"error": original_pdf_upload_result["data"]}), original_pdf_upload_result["status_code"]
-
-        logger.info(
-            f"Original PDF uploaded successfully to S3 bucket: {spec_id}")
-
-        pdf_result = await s3.get_original_pdf_with_client(spec_id=spec_id, s3_client=s3_client)
-        if pdf_result["status_code"] != 200:
-            return jsonify({"error": pdf_result["data"]}), pdf_result["status_code"]
-
-        await s3.upload_original_pdf_pages(pdf=pdf_result["data"], spec_id=spec_id, s3_client=s3_client)
-
-        section_page_dict = await detect_section_pages(spec_id, s3, s3_client)
-
-        await db.create_project(spec_id, project_name)
-
-        total_divisions = 0
-        total_sections = 0
-        for division, sections in section_page_dict["divisions_and_sections"].items():
-            total_divisions += 1
-            division_title = divisions_and_sections[division][f"{division}0000"]
-            division_id = await db.create_division(spec_id, division, division_title)
-            for section_number, pages in sections.items():
-                total_sections += 1
-                section_title = pages.get(
-                    "title", "Undocumented Section Number (MSF2020)")
-
-                total_pages = sum(len(page) for page in pages.get("multi", []))
-                total_pages += len(pages.get("single", []))
-                pages["total_pages"] = total_pages
-
-                await db.create_section(spec_id, division, division_id, section_number, section_title, total_pages)
-
-        await db.update_project(
-            spec_id,
-            total_divisions=total_divisions,
-            total_sections=total_sections,
-        )
-
-    current_app.add_background_task(
-        page_classification,
-        spec_id,
-        section_page_dict["divisions_and_sections"]
-    )
+    upload_paths = await spool_uploads(pdf, spec_id)
+    await db.create_project(spec_id, project_name)
+    job_id = await spec_ingest(spec_id, upload_paths)
 
     return jsonify({
-        "run_time": f"{datetime.datetime.now() - start_time}",
-        # "text_and_rasterize": text_and_rasterize,
-        "section_page_index": section_page_dict
-    }), 200
+        "spec_id": spec_id,
+        "job_id": job_id,
+        "progress_url": f"/api/spec/progress/{spec_id}",
+    }), 202
+
+
+# Server-Sent Events stream of pipeline progress for a spec
+@spec_routes_bp.route("/progress/<spec_id>", methods=["GET"])
+async def progress(spec_id: str):
+    async def events():
+        async for event in progress_hub.subscribe(spec_id):
+            if event is None:
+                yield b": keepalive\n\n"
+                continue
+            yield f"event: {event['stage']}\ndata: {json.dumps(event)}\n\n".encode("utf-8")
+
+    response = await make_response(events(), {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+    response.timeout = None
+    return response
 
 
 @spec_routes_bp.route("/projects", methods=["GET"])
@@ -101,6 +73,33 @@ async def get_projects():
         return jsonify({"error": str(e)}), 500
 
 
+@spec_routes_bp.route("/cache_stats", methods=["GET"])
+async def get_cache_stats():
+    try:
+        s3 = S3Bucket()
+        return jsonify({
+            "object_cache": s3.cache_stats(),
+            "llm_responses": await response_cache.stats(),
+            "prompt_cache": prompt_cache_stats.stats(),
+            "llm_scheduler": llm_scheduler.stats(),
+            "token_estimator": token_estimator.stats(),
+            "page_classifier": page_classifier.stats(),
+        }), 200
+    except Exception as e:
+        logger.error(f"Error getting cache stats: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@spec_routes_bp.route("/jobs/<spec_id>", methods=["GET"])
+async def get_jobs(spec_id: str):
+    try:
+        jobs = await db.get_jobs_for_spec(spec_id)
+        return jsonify({"jobs": jobs}), 200
+    except Exception as e:
+        logger.error(f"Error getting jobs: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
 @spec_routes_bp.route("/spec_sections/<spec_id>", methods=["GET"])
 async def get_spec_sections(spec_id: str):
     try:
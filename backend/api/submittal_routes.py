@@ -2,8 +2,8 @@ import logging
 import json
 import uuid
 from classes import db, S3Bucket, Anthropic
-from quart import Blueprint, jsonify, request
-from functions import compliance_check, compare_compliance_runs
+from quart import Blueprint, jsonify, request, make_response
+from functions import compliance_check, compare_compliance_runs, save_compliance_run, stream_compliance_check
 from typing import List, Optional
 
 submittal_routes_bp = Blueprint("submittal_routes", __name__)
@@ -202,114 +202,48 @@ async def upload_submittal():
         return jsonify({"error": str(e)}), 500
 
 
+async def compliance_check_request(data: dict) -> tuple[Optional[dict], Optional[tuple]]:
+    """Validate a compliance check body and load its submittals: (kwargs, None) or (None, error response)"""
+    is_valid, missing_fields = required_fields(
+        data, ["package_id", "spec_id", "section_number", "section_id"])
+    if not is_valid:
+        return None, (jsonify({"error": f"Missing required fields: {', '.join(missing_fields)}"}), 400)
+
+    package_id = data.get("package_id")
+    submittal_ids: Optional[List[int]] = data.get("submittal_ids", None)
+    if submittal_ids:
+        submittals = await db.get_submittals_by_ids(package_id, submittal_ids)
+    else:
+        submittals = await db.get_submittals_by_package(package_id)
+
+    if not submittals:
+        return None, (jsonify({"status": "error", "error": "No submittals found"}), 404)
+
+    return {
+        "package_id": package_id,
+        "spec_id": data.get("spec_id"),
+        "section_id": data.get("section_id"),
+        "section_number": data.get("section_number"),
+        "submittals": submittals,
+        "submittal_ids": submittal_ids,
+    }, None
+
+
 @submittal_routes_bp.route("/compliance_check", methods=["POST"])
 async def compliance_check_route():
     try:
         data: dict = await request.get_json()
+        check, error_response = await compliance_check_request(data)
+        if error_response:
+            return error_response
 
-        package_id = data.get("package_id")
-        spec_id = data.get("spec_id")
-        section_id = data.get("section_id")
-        section_number = data.get("section_number")
-        submittal_ids: Optional[List[int]] = data.get("submittal_ids", None)
-
-        is_valid, missing_fields = required_fields(
-            data, ["package_id", "spec_id", "section_number", "section_id"])
-        if not is_valid:
-            return jsonify({"error": f"Missing required fields: {', '.join(missing_fields)}"}), 400
-
-        if submittal_ids:
-            submittals = await db.get_submittals_by_ids(package_id, submittal_ids)
-        else:
-            submittals = await db.get_submittals_by_package(package_id)
-
-        if not submittals:
-            return jsonify({"status": "error", "error": "No submittals found"}), 404
-
-        result = await compliance_check(
-            package_id,
-            spec_id,
-            section_id,
-            section_number,
-            submittals,
-            submittal_ids
-        )
+        result = await compliance_check(**check)
 
         if result.get("status") == "success":
-            if submittal_ids:
-                # Individual run — find by single submittal id
-                prev_runs = await db.get_compliance_runs(package_id, submittal_id=submittal_ids[0])
-                if prev_runs:
-                    await db.update_compliance_run(
-                        compliance_run_id=prev_runs[0].get("id"),
-                        submittal_ids=result.get("submittal_ids"),
-                        compliance_result=result.get("result"),
-                        compliance_score=result.get(
-                            "result").get("compliance_score"),
-                        is_compliant=result.get("result").get("is_compliant"),
-                        pipeline=result.get("pipeline"),
-                        run_type="individual",
-                        prompt_version=int(
-                            prev_runs[0].get("prompt_version")) + 1,
-                        token_count=result.get("total_tokens"),
-                    )
-                else:
-                    await db.create_compliance_run(
-                        package_id=package_id,
-                        spec_id=spec_id,
-                        section_id=section_id,
-                        submittal_ids=result.get("submittal_ids"),
-                        compliance_result=result.get("result"),
-                        compliance_score=result.get(
-                            "result").get("compliance_score"),
-                        is_compliant=result.get("result").get("is_compliant"),
-                        pipeline=result.get("pipeline"),
-                        run_type="individual",
-                        model="claude-sonnet-4-6",
-                        token_count=result.get("total_tokens"),
-                    )
-            else:
-                # Package/cumulative run — find by run_type
-                prev_run = await db.get_compliance_runs(package_id, run_type="package")
-                prev_run = prev_run[0] if prev_run else None
-                if prev_run:
-                    await db.update_compliance_run(
-                        compliance_run_id=prev_run.get("id"),
-                        submittal_ids=result.get("submittal_ids"),
-                        compliance_result=result.get("result"),
-                        compliance_score=result.get(
-                            "result").get("compliance_score"),
-                        is_compliant=result.get("result").get("is_compliant"),
-                        pipeline=result.get("pipeline"),
-                        run_type="package",
-                        prompt_version=int(prev_run.get("prompt_version")) + 1,
-                        token_count=result.get("total_tokens"),
-                    )
-                else:
-                    await db.create_compliance_run(
-                        package_id=package_id,
-                        spec_id=spec_id,
-                        section_id=section_id,
-                        submittal_ids=result.get("submittal_ids"),
-                        compliance_result=result.get("result"),
-                        compliance_score=result.get(
-                            "result").get("compliance_score"),
-                        is_compliant=result.get("result").get("is_compliant"),
-                        pipeline=result.get("pipeline"),
-                        run_type="package",
-                        model="claude-sonnet-4-6",
-                        token_count=result.get("total_tokens"),
-                    )
-
-                updated_package = await db.update_package_after_run(
-                    package_id=package_id,
-                    compliance_result=result.get("result"),
-                    compliance_score=result.get("result").get("compliance_score"),
-                    checked_submittal_ids=result.get("submittal_ids"),
-                )
-
-                if not updated_package:
-                    return jsonify({"error": "Failed to update package after run"}), 500
+            saved = await save_compliance_run(
+                check["package_id"], check["spec_id"], check["section_id"], check["submittal_ids"], result)
+            if saved.get("status") != "success":
+                return jsonify({"error": saved.get("error")}), 500
 
             return jsonify({
                 "message": "Compliance check completed successfully",
@@ -324,6 +258,28 @@ async def compliance_check_route():
         return jsonify({"error": str(e), "success": False}), 500
 
 
+# Server-Sent Events version of /compliance_check: deltas and findings as they are generated, then the saved result
+@submittal_routes_bp.route("/compliance_check/stream", methods=["POST"])
+async def compliance_check_stream_route():
+    try:
+        data: dict = await request.get_json()
+        check, error_response = await compliance_check_request(data)
+        if error_response:
+            return error_response
+
+        response = await make_response(stream_compliance_check(**check), {
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        })
+        response.timeout = None
+        return response
+
+    except Exception as e:
+        logger.error(f"Error in compliance_check_stream_route: {e}")
+        return jsonify({"error": str(e), "success": False}), 500
+
+
 @submittal_routes_bp.route("/all_submittals", methods=["GET"])
 async def all_submittals():
     try:
@@ -2,7 +2,7 @@ import logging
 import json
 from urllib.parse import unquote
 from classes import db, S3Bucket
-from prompts import SUMMARY_PROMPT
+from prompts import SUMMARY_PROMPT, SUMMARY_CONTEXT
 from quart import Blueprint, jsonify, request
 from classes import Anthropic, make_summary_schema
 from csi_masterformat import divisions_and_sections
@@ -56,24 +56,30 @@ async def generate_section_summary():
 
         summary_page_groups, _ = s3.group_contiguous_pages(
             summary_pages)
-        resolved_prompt = anthropic.build_prompt(
-            SUMMARY_PROMPT, {"section_number": section_number})
         schema = make_summary_schema(section_number)
 
         content_blocks = []
+        source_hashes = {}
 
         async with s3.s3_client() as s3_client:
+            etags = await s3.get_object_etags_with_client([f"{spec_id}/original_pages/"], s3_client)
             for group in summary_page_groups:
                 for page_index in range(group[0], group[-1] + 1):
                     key = f"{spec_id}/original_pages/page_{page_index:04d}.pdf"
                     url = await s3.generate_presigned_url(key, s3_client)
+                    if key in etags:
+                        source_hashes[url] = etags[key]
                     content_blocks.append(anthropic.pdf_document_block_url(url))
+        content_blocks.append(anthropic.text_block(
+            anthropic.build_prompt(SUMMARY_CONTEXT, {"section_number": section_number})))
 
         spec_summary = await anthropic.claude(
             content_blocks,
-            system_prompt=resolved_prompt,
+            system_prompt=SUMMARY_PROMPT,
             schema=schema,
-            max_tokens=10000
+            max_tokens=10000,
+            cache_system_prompt=True,
+            source_hashes=source_hashes
         )
 
         if spec_summary.get("status") == "success":
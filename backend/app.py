@@ -1,6 +1,6 @@
 import asyncio
 import logging
-from classes import db
+from classes import db, batch_watcher, job_queue, token_estimator
 from api import api_bp
 from quart import Quart
 from quart_cors import cors
@@ -31,6 +31,15 @@ app.register_blueprint(api_bp, url_prefix="/api")
 @app.before_serving
 async def init_db():
     await db.init_db()
+    await token_estimator.fit()
+    await batch_watcher.start()
+    await job_queue.start()
+
+@app.after_serving
+async def close_db():
+    await job_queue.stop()
+    await batch_watcher.stop()
+    await db.close()
 
 if __name__ == "__main__":
     asyncio.run(serve(app, config))
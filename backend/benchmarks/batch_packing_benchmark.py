@@ -0,0 +1,118 @@
+"""
+Batch splitting: the previous recursive halving (one full json.dumps of every candidate batch)
+vs. the size-aware packer in Anthropic.split_batch (one json.dumps per request).
+
+Synthetic request sets mirror build_claude_request output:
+    url      presigned PDF URL blocks, a few KB per request
+    base64   inline base64 documents, --kb per request on average
+
+Run from the backend folder:
+    python -m benchmarks.batch_packing_benchmark
+    python -m benchmarks.batch_packing_benchmark --requests 20000 --kb 24
+"""
+import argparse
+import json
+import random
+import string
+import time
+
+from classes import Anthropic, make_classification_schema
+from classes.anthropic import HARD_BATCH_MB, MAX_BATCH_REQUESTS, SAFE_BATCH_MB
+
+anthropic = Anthropic()
+
+SPEC_ID = "00000000-0000-0000-0000-000000000000"
+
+
+def legacy_measure_batch_size(requests: list[dict]) -> str:
+    if len(requests) > MAX_BATCH_REQUESTS:
+        return "error"
+    raw = json.dumps({"requests": requests}, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if len(raw) >= HARD_BATCH_MB * 1024 * 1024:
+        return "error"
+    if len(raw) >= SAFE_BATCH_MB * 1024 * 1024:
+        return "warning"
+    return "ok"
+
+
+def legacy_split_batch(requests: list[dict], counter: list[int]) -> list[list[dict]]:
+    counter[0] += 1
+    if legacy_measure_batch_size(requests) == "ok":
+        return [requests]
+    mid = len(requests) // 2
+    if mid == 0:
+        return [requests]
+    return legacy_split_batch(requests[:mid], counter) + legacy_split_batch(requests[mid:], counter)
+
+
+def make_requests(kind: str, count: int, kb: int, seed: int = 7) -> list[dict]:
+    rng = random.Random(seed)
+    schema = make_classification_schema("033000").model_json_schema()
+    requests = []
+    for i in range(count):
+        if kind == "url":
+            pages = rng.randint(1, 5)
+            content = [{
+                "type": "document",
+                "source": {
+                    "type": "url",
+                    "url": f"https://bucket.s3.amazonaws.com/{SPEC_ID}/original_pages/page_{i + p:04d}.pdf?"
+                           + "".join(rng.choices(string.ascii_letters, k=400)),
+                },
+            } for p in range(pages)]
+        else:
+            size = max(1, int(rng.gauss(kb, kb / 4))) * 1024
+            content = [{
+                "type": "document",
+                "source": {"type": "base64", "media_type": "application/pdf", "data": "A" * size},
+            }]
+        requests.append({
+            "custom_id": f"03-033000-{SPEC_ID}-{i}",
+            "params": {
+                "model": "claude-sonnet-4-6",
+                "max_tokens": 16000,
+                "system": [{"type": "text", "text": "Classify the pages.", "cache_control": {"type": "ephemeral"}}],
+                "messages": [{"role": "user", "content": content}],
+                "output_config": {"format": {"type": "json_schema", "schema": schema}},
+            },
+        })
+    return requests
+
+
+def check_batches(requests: list[dict], batches: list[list[dict]]):
+    assert [r["custom_id"] for batch in batches for r in batch] == [r["custom_id"] for r in requests]
+    for batch in batches:
+        assert len(batch) <= MAX_BATCH_REQUESTS
+        assert legacy_measure_batch_size(batch) == "ok"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--kb", type=int, default=24)
+    args = parser.parse_args()
+
+    for kind in ("url", "base64"):
+        requests = make_requests(kind, args.requests, args.kb)
+        total_mb = anthropic.batch_payload_size(
+            [anthropic.request_size_bytes(r) for r in requests]) / 1024 / 1024
+        print(f"{kind}: {len(requests)} requests, {total_mb:.0f} MB serialized")
+
+        counter = [0]
+        start = time.perf_counter()
+        legacy = legacy_split_batch(requests, counter)
+        legacy_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        packed = anthropic.split_batch(requests)
+        packed_seconds = time.perf_counter() - start
+
+        check_batches(requests, packed)
+        print(f"  recursive halving  {legacy_seconds:7.2f}s  {len(legacy)} batches, {counter[0]} payload serializations")
+        print(f"  size-aware packing {packed_seconds:7.2f}s  {len(packed)} batches, sizes "
+              f"{[len(b) for b in packed]}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Peak memory of reading a batch results file: buffering the whole body into a list vs. streaming
+it line by line through Anthropic.iter_batch_results.
+
+A synthetic JSONL results file is served from a local aiohttp server.
+
+Run from the backend folder:
+    python -m benchmarks.batch_results_stream_benchmark
+    python -m benchmarks.batch_results_stream_benchmark --rows 100000 --text-kb 2
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+
+from aiohttp import web
+
+from classes import Anthropic
+
+
+def make_row(i: int, text_kb: int) -> bytes:
+    content = {
+        "is_primary": i % 3 == 0,
+        "confidence": 0.9,
+        "reasoning": "x" * (text_kb * 1024),
+        "referenced_sections": ["033000"],
+        "pages_analyzed": [i],
+    }
+    row = {
+        "custom_id": f"03-033000-00000000-0000-0000-0000-000000000000-{i}",
+        "result": {
+            "type": "succeeded",
+            "message": {
+                "content": [{"type": "text", "text": json.dumps(content)}],
+                "usage": {"input_tokens": 1500, "output_tokens": 300},
+            },
+        },
+    }
+    return json.dumps(row).encode("utf-8") + b"\n"
+
+
+async def serve_results(rows: int, text_kb: int) -> tuple[web.AppRunner, str]:
+    async def results(request: web.Request) -> web.StreamResponse:
+        resp = web.StreamResponse()
+        await resp.prepare(request)
+        for i in range(rows):
+            await resp.write(make_row(i, text_kb))
+        await resp.write_eof()
+        return resp
+
+    app = web.Application()
+    app.router.add_get("/results", results)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/results"
+
+
+async def measure(name: str, consume) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = await consume()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:10s} {count:8d} items  {elapsed:6.2f}s  peak {peak / 1024 / 1024:8.1f} MB")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--text-kb", type=int, default=2)
+    args = parser.parse_args()
+
+    anthropic = Anthropic()
+    runner, url = await serve_results(args.rows, args.text_kb)
+    size_mb = len(make_row(0, args.text_kb)) * args.rows / 1024 / 1024
+    print(f"results file: {args.rows} rows, ~{size_mb:.0f} MB")
+
+    try:
+        async def buffered():
+            return len(await anthropic.fetch_batch_results(url))
+
+        async def streamed():
+            count = 0
+            async for _ in anthropic.iter_batch_results(url):
+                count += 1
+            return count
+
+        await measure("buffered", buffered)
+        await measure("streamed", streamed)
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+"""
+Classification requests per spec with and without local boundary scoring (section headers,
+END OF SECTION markers, running page-number footers and TOC pages, see
+functions/section_boundaries.py), after candidates are bounded by the spec's table of contents
+(see bound_by_toc in functions/section_pages_detection.py).
+
+Synthetic specs come with ground truth, so the accuracy of the local labels is reported too:
+a range is truly primary when one of its pages is in the body of the section.
+
+Run from the backend folder:
+    python -m benchmarks.boundary_scoring_benchmark                      # synthetic specs
+    python -m benchmarks.boundary_scoring_benchmark --pdf a.pdf b.pdf    # text layer of real specs
+"""
+import argparse
+import random
+import time
+from typing import Optional
+
+import fitz
+
+from functions.section_pages_detection import (
+    KNOWN_BASE_SECTIONS,
+    bound_by_toc,
+    division_parser,
+    find_section_numbers,
+    page_signals,
+    section_page_dict,
+)
+from functions.section_boundaries import local_classification_results
+from functions.section_classification import group_classification_requests
+
+SPEC_ID = "00000000-0000-0000-0000-000000000000"
+
+
+def spaced(section: str) -> str:
+    return f"{section[0:2]} {section[2:4]} {section[4:6]}"
+
+
+def synthetic_spec(sections: int, seed: int, header_rate: float = 0.85, footer_rate: float = 0.7) -> tuple[list[str], dict[int, str]]:
+    """Page texts plus the section whose body each page is in (TOC pages have none)"""
+    rng = random.Random(seed)
+    numbers = sorted(rng.sample(sorted(KNOWN_BASE_SECTIONS), sections))
+    pages: list[str] = []
+    owner: dict[int, str] = {}
+
+    toc_lines = [f"{spaced(number)} Section title {i}" for i, number in enumerate(numbers)]
+    for start in range(0, len(toc_lines), 40):
+        pages.append("\n".join(["TABLE OF CONTENTS" if start == 0 else "CONTENTS (CONTINUED)", *toc_lines[start:start + 40]]))
+
+    for number in numbers:
+        length = rng.randint(1, 6)
+        has_header = rng.random() < header_rate
+        has_footer = rng.random() < footer_rate
+        for page in range(length):
+            lines = []
+            if page == 0:
+                lines.append(f"SECTION {spaced(number)} - SECTION TITLE" if has_header else f"Section {spaced(number)}")
+                lines.append("PART 1 - GENERAL")
+                lines.append("1.1 RELATED SECTIONS")
+            for _ in range(rng.randint(10, 30)):
+                # Some references point at sections this project does not include
+                reference = rng.choice(numbers) if rng.random() < 0.7 else rng.choice(sorted(KNOWN_BASE_SECTIONS))
+                lines.append(f"A. Comply with Section {spaced(reference)} for related work.")
+            if page == length - 1:
+                lines.append(f"END OF SECTION {spaced(number)}" if rng.random() < 0.7 else "END OF SECTION")
+            if has_footer:
+                lines.append(f"SECTION TITLE {spaced(number)} - {page + 1}")
+            owner[len(pages)] = number
+            pages.append("\n".join(lines))
+    return pages, owner
+
+
+def pdf_spec(path: str) -> list[str]:
+    with fitz.open(path) as doc:
+        return [page.get_text("text") for page in doc]
+
+
+def run(label: str, pages: list[str], owner: Optional[dict[int, str]] = None):
+    start = time.perf_counter()
+    section_numbers = {index: find_section_numbers(text) for index, text in enumerate(pages)}
+    signals = {index: signal for index, text in enumerate(pages) if (signal := page_signals(text))}
+    raw_sections = division_parser(section_page_dict(section_numbers))
+    bounded, toc = bound_by_toc(section_numbers, signals)
+    sections = division_parser(section_page_dict(bounded, toc["sections"]))
+    scan_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    section_groups = group_classification_requests(sections, SPEC_ID, multi_section=False)
+    local = local_classification_results(sections, section_groups, signals)
+    score_seconds = time.perf_counter() - start
+
+    ranges = sum(len(group["members"]) for group in section_groups)
+    raw_ranges = sum(len(group["members"]) for group in group_classification_requests(raw_sections, SPEC_ID, multi_section=False))
+    multi_before = len(group_classification_requests(sections, SPEC_ID, multi_section=True))
+    multi_after = len(group_classification_requests(sections, SPEC_ID, multi_section=True, exclude=local))
+    print(f"{label}: {len(pages)} pages, {len(local)} section page ranges labelled locally "
+          f"(scan {scan_seconds:.3f}s, scoring {score_seconds * 1000:.1f}ms)")
+    print(f"  TOC on pages {toc['pages']} lists {len(toc['sections'])} sections; "
+          f"section page ranges {raw_ranges} -> {ranges} ({(raw_ranges - ranges) / max(raw_ranges, 1):.1%} cut), "
+          f"sections {sum(map(len, raw_sections.values()))} -> {sum(map(len, sections.values()))}")
+    print(f"  LLM requests, per section:    {ranges:>6} -> {ranges - len(local):>6}  "
+          f"({len(local) / max(ranges, 1):.1%} saved)")
+    print(f"  LLM requests, multi-section:  {multi_before:>6} -> {multi_after:>6}  "
+          f"({(multi_before - multi_after) / max(multi_before, 1):.1%} saved)")
+
+    if owner is None:
+        return
+    correct = {True: 0, False: 0}
+    labelled = {True: 0, False: 0}
+    for group in section_groups:
+        for _, section_number, custom_id in group["members"]:
+            if custom_id not in local:
+                continue
+            predicted = local[custom_id]["is_primary"]
+            truth = any(owner.get(page) == section_number for page in group["pages"])
+            labelled[predicted] += 1
+            correct[predicted] += predicted == truth
+    for verdict, name in ((True, "primary"), (False, "reference")):
+        if labelled[verdict]:
+            print(f"  local {name:<9} labels: {labelled[verdict]:>6}, precision {correct[verdict] / labelled[verdict]:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf", nargs="*", help="Use the text layer of these PDFs")
+    parser.add_argument("--specs", type=int, default=3, help="Synthetic specs")
+    parser.add_argument("--sections", type=int, default=150, help="Sections per synthetic spec")
+    args = parser.parse_args()
+
+    if args.pdf:
+        for path in args.pdf:
+            run(path, pdf_spec(path))
+        return
+
+    for seed in range(args.specs):
+        pages, owner = synthetic_spec(args.sections, seed)
+        run(f"synthetic spec {seed}", pages, owner)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark ModuDB under concurrent route-style load: pooled connections vs. the
+previous connect-per-call behaviour.
+
+Run from the backend folder:
+    python -m benchmarks.db_pool_benchmark --clients 32 --ops 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+from classes.db import ModuDB
+
+
+class ConnectPerCallDB(ModuDB):
+    """ModuDB as it behaved before pooling: a fresh connection (and thread) per call"""
+
+    async def open(self):
+        return
+
+    async def close(self):
+        return
+
+    @asynccontextmanager
+    async def connect(self):
+        async with aiosqlite.connect(self.db_path) as conn:
+            # The queries read columns by name, as on the pooled connections
+            conn.row_factory = aiosqlite.Row
+            yield conn
+
+    def writer(self):
+        return self.connect()
+
+    def reader(self):
+        return self.connect()
+
+
+async def seed(db: ModuDB, spec_id: str, sections: int) -> list[str]:
+    await db.init_db()
+    await db.create_project(spec_id, "benchmark")
+    division_id = await db.create_division(spec_id, "03", "Concrete")
+    section_numbers = [f"03{i:04d}" for i in range(sections)]
+    for section_number in section_numbers:
+        await db.create_section(spec_id, "03", division_id, section_number, "Benchmark Section", 1000)
+    return section_numbers
+
+
+async def client(db: ModuDB, spec_id: str, section_numbers: list[str], ops: int, seed_value: int):
+    rng = random.Random(seed_value)
+    for i in range(ops):
+        section_number = rng.choice(section_numbers)
+        roll = rng.random()
+        if roll < 0.4:
+            await db.get_section(spec_id, section_number)
+        elif roll < 0.6:
+            await db.get_all_sections(spec_id)
+        elif roll < 0.8:
+            result = await db.update_section_pages(spec_id, section_number, [i], [])
+            await db.save_classification_result(result["section_id"], f"bench-{i}", {
+                "is_primary": True, "confidence": 0.9, "reasoning": "benchmark"})
+        else:
+            await db.update_section_summary_status(spec_id, section_number, "complete")
+
+
+async def run(db_cls: type, clients: int, ops: int, sections: int) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = db_cls(os.path.join(tmp, "bench.db"))
+        spec_id = "bench-spec"
+        section_numbers = await seed(db, spec_id, sections)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            client(db, spec_id, section_numbers, ops, seed_value)
+            for seed_value in range(clients)
+        ])
+        elapsed = time.perf_counter() - start
+
+        await db.close()
+        return clients * ops / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--ops", type=int, default=200)
+    parser.add_argument("--sections", type=int, default=200)
+    args = parser.parse_args()
+
+    before = await run(ConnectPerCallDB, args.clients, args.ops, args.sections)
+    after = await run(ModuDB, args.clients, args.ops, args.sections)
+
+    print(f"clients={args.clients} ops/client={args.ops} sections={args.sections}")
+    print(f"connect-per-call: {before:,.0f} ops/sec")
+    print(f"pooled:           {after:,.0f} ops/sec ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+"""
+Import cost of the MasterFormat table: the section_numbers.py dict literal vs. the
+lazy table backed by section_numbers.bin.
+
+Each variant runs in a fresh interpreter so module caches don't carry over.
+
+Run from the backend folder (python benchmarks/masterformat_import_benchmark.py works too):
+    python -m benchmarks.masterformat_import_benchmark
+    python -m benchmarks.masterformat_import_benchmark --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# The backend folder, where the probes import csi_masterformat from
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VARIANTS = {
+    "dict literal": (
+        "from csi_masterformat.section_numbers import divisions_and_sections as t\n"
+        "t['03'].get('033000')\n"
+    ),
+    "lazy table (import only)": (
+        "from csi_masterformat.masterformat_table import divisions_and_sections as t\n"
+    ),
+    "lazy table (first lookup)": (
+        "from csi_masterformat.masterformat_table import divisions_and_sections as t\n"
+        "t['03'].get('033000')\n"
+    ),
+}
+
+PROBE = """
+import resource, time
+start = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - start
+print(__import__("json").dumps({{
+    "seconds": elapsed,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}}))
+"""
+
+
+def run_variant(body: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(body=body)],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    baseline = run_variant("pass")
+    print(f"interpreter baseline: max RSS {baseline['max_rss_kb'] / 1024:.1f} MB")
+    print()
+
+    for name, body in VARIANTS.items():
+        samples = [run_variant(body) for _ in range(args.runs)]
+        seconds = statistics.median(s["seconds"] for s in samples)
+        rss_kb = statistics.median(s["max_rss_kb"] for s in samples)
+        print(
+            f"{name:28s} {seconds * 1000:8.2f} ms   "
+            f"max RSS {rss_kb / 1024:6.1f} MB (+{(rss_kb - baseline['max_rss_kb']) / 1024:.1f} MB)"
+        )
+
+
+if __name__ == "__main__":
+    main()
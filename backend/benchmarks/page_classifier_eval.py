@@ -0,0 +1,104 @@
+"""
+Offline evaluation of the local page classifier (functions/page_classifier.py): trains on some
+specs, picks the auto-label thresholds on held-out training specs like the service does, then
+reports precision and recall of the local labels and the share of classification requests
+avoided on specs it never saw.
+
+With --db the labels are Claude's stored verdicts (classification rows with source 'llm') and
+the page text saved at detection time. Without it, synthetic specs from the boundary scoring
+benchmark are labelled from their ground truth, with fewer headers and footers so the boundary
+signals alone are not enough.
+
+Run from the backend folder:
+    python -m benchmarks.page_classifier_eval                       # synthetic specs
+    python -m benchmarks.page_classifier_eval --db modu_db.db       # stored verdicts
+"""
+import argparse
+import asyncio
+import json
+import time
+import zlib
+
+import numpy as np
+
+from benchmarks.boundary_scoring_benchmark import SPEC_ID, synthetic_spec
+from classes.db import ModuDB
+from functions.page_classifier import (
+    MAX_TRAINING_LABELS,
+    TARGET_PRECISION,
+    PageClassifier,
+    evaluate,
+    featurize,
+)
+from functions.request_split import parse_custom_id
+from functions.section_classification import group_classification_requests
+from functions.section_pages_detection import bound_by_toc, division_parser, find_section_numbers, page_signals, section_page_dict
+
+
+def synthetic_samples(specs: int, sections: int) -> tuple[list[tuple[str, str, list[str]]], np.ndarray]:
+    samples, labels = [], []
+    for seed in range(specs):
+        pages, owner = synthetic_spec(sections, seed, header_rate=0.5, footer_rate=0.4)
+        section_numbers = {index: find_section_numbers(text) for index, text in enumerate(pages)}
+        signals = {index: signal for index, text in enumerate(pages) if (signal := page_signals(text))}
+        bounded, toc = bound_by_toc(section_numbers, signals)
+        sections_by_division = division_parser(section_page_dict(bounded, toc["sections"]))
+        spec_id = f"synthetic-{seed}"
+        for group in group_classification_requests(sections_by_division, SPEC_ID, multi_section=False):
+            for _, section_number, _ in group["members"]:
+                samples.append((spec_id, section_number, [pages[page] for page in group["pages"]]))
+                labels.append(int(any(owner.get(page) == section_number for page in group["pages"])))
+    return samples, np.array(labels)
+
+
+async def stored_samples(path: str, limit: int) -> tuple[list[tuple[str, str, list[str]]], np.ndarray]:
+    database = ModuDB(path)
+    samples, labels = [], []
+    texts_by_spec: dict[str, dict[int, str]] = {}
+    for row in await database.get_classification_labels(limit):
+        if row["spec_id"] not in texts_by_spec:
+            texts_by_spec[row["spec_id"]] = await database.get_page_texts(row["spec_id"])
+        texts = texts_by_spec[row["spec_id"]]
+        samples.append((row["spec_id"], row["section_number"], [texts.get(page, "") for page in parse_custom_id(row["custom_id"])[2]]))
+        labels.append(int(row["is_primary"]))
+    return samples, np.array(labels)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", help="SQLite database with stored classification verdicts and page text")
+    parser.add_argument("--limit", type=int, default=MAX_TRAINING_LABELS, help="Most recent verdicts read from --db")
+    parser.add_argument("--specs", type=int, default=8, help="Synthetic specs")
+    parser.add_argument("--sections", type=int, default=80, help="Sections per synthetic spec")
+    parser.add_argument("--test-share", type=float, default=0.3, help="Share of specs held out for the report")
+    args = parser.parse_args()
+
+    samples, labels = asyncio.run(stored_samples(args.db, args.limit)) if args.db else synthetic_samples(args.specs, args.sections)
+    # Split by spec, on a different hash than the service's validation split
+    test = np.array([zlib.crc32(f"test:{spec_id}".encode("utf-8")) % 1000 < args.test_share * 1000 for spec_id, _, _ in samples])
+    if test.all() or not test.any():
+        raise SystemExit(f"{len(samples)} labelled page ranges from too few specs to hold some out")
+    print(f"{len(samples)} labelled page ranges ({labels.mean():.1%} primary) from "
+          f"{len({spec_id for spec_id, _, _ in samples})} specs; {int(test.sum())} held out for the report")
+
+    classifier = PageClassifier()
+    start = time.perf_counter()
+    validation = classifier.fit([sample for sample, out in zip(samples, test) if not out], labels[~test])
+    train_seconds = time.perf_counter() - start
+    print(f"trained in {train_seconds:.1f}s; thresholds at {TARGET_PRECISION:.0%} target precision: {classifier.thresholds}")
+    print(f"validation: {json.dumps(validation)}")
+
+    start = time.perf_counter()
+    probabilities = classifier.model.predict([featurize(section_number, texts) for (_, section_number, texts), out in zip(samples, test) if out])
+    predict_ms = (time.perf_counter() - start) * 1000 / max(int(test.sum()), 1)
+    report = evaluate(probabilities, labels[test], classifier.thresholds)
+    print(f"test ({predict_ms:.2f}ms per page range):")
+    print(f"  classification requests avoided: {report['requests_avoided']:.1%}")
+    for name in ("primary", "reference"):
+        print(f"  local {name:<9} labels: {report[name]['auto_labelled']:>6}, "
+              f"precision {report[name]['precision']}, recall {report[name]['recall']}")
+    print(f"  accuracy at p = 0.5: {report['accuracy_at_0.5']}")
+
+
+if __name__ == "__main__":
+    main()
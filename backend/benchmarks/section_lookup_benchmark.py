@@ -0,0 +1,116 @@
+"""
+Micro-benchmark for section-number candidate validation: the previous linear
+prefix scan vs. the precompiled prefix indexes in section_pages_detection.
+
+Run from the backend folder:
+    python -m benchmarks.section_lookup_benchmark                 # synthetic spec text
+    python -m benchmarks.section_lookup_benchmark --pdf spec.pdf  # text layer of a real spec
+"""
+import argparse
+import random
+import re
+import time
+
+import fitz
+
+from functions.section_pages_detection import (
+    CANDIDATE_PATTERN,
+    KNOWN_SECTIONS,
+    is_valid_section,
+    normalize_section_number,
+)
+
+
+def legacy_normalize_section_number(section: str) -> str:
+    clean = re.sub(r"[\s\-]", "", section)
+    match = re.match(
+        r"^(\d{2})\.?(\d{2})\.?(\d{2})(?:\.(\d+))?([a-zA-Z]?)$", clean)
+    if match:
+        result = match.group(1) + match.group(2) + match.group(3)
+        if match.group(4):
+            result += "." + match.group(4)
+        if match.group(5):
+            result += match.group(5)
+        return result
+    return None
+
+
+def legacy_is_valid_section(raw_match: str) -> str:
+    normalized = legacy_normalize_section_number(raw_match)
+    if normalized and normalized in KNOWN_SECTIONS:
+        return normalized
+    if normalized and len(normalized) > 6:
+        if normalized[:6] in KNOWN_SECTIONS:
+            return normalized
+    elif normalized:
+        base = normalized[:4]
+        for section in KNOWN_SECTIONS:
+            if section.startswith(base):
+                return normalized
+    return None
+
+
+def synthetic_corpus(pages: int, seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    sections = sorted(KNOWN_SECTIONS)
+    formats = [
+        lambda s: f"{s[0:2]} {s[2:4]} {s[4:]}",
+        lambda s: f"{s[0:2]}-{s[2:4]}-{s[4:]}",
+        lambda s: s,
+    ]
+    corpus = []
+    for page in range(pages):
+        section = rng.choice(sections)
+        lines = [f"SECTION {formats[0](section)}", "PART 1 - GENERAL"]
+        for _ in range(40):
+            ref = rng.choice(sections)
+            noise = f"{rng.randint(10, 49)} {rng.randint(10, 99)} {rng.randint(10, 99)}"
+            lines.append(
+                f"Comply with Section {rng.choice(formats)(ref)} and ASTM C{rng.randint(30, 999)}; "
+                f"provide {noise} units per phone 555-{rng.randint(1000, 9999)}."
+            )
+        lines.append(f"{formats[0](section)} - {page + 1}")
+        corpus.append("\n".join(lines))
+    return corpus
+
+
+def pdf_corpus(path: str) -> list[str]:
+    with fitz.open(path) as doc:
+        return [page.get_text("text") for page in doc]
+
+
+def bench(label: str, corpus: list[str], validate) -> tuple[int, float]:
+    candidates = 0
+    found = 0
+    start = time.perf_counter()
+    for text in corpus:
+        for match in CANDIDATE_PATTERN.finditer(text):
+            candidates += 1
+            if validate(match.group(0)):
+                found += 1
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {candidates:>9,} candidates  {found:>9,} valid  "
+          f"{elapsed:7.3f}s  {candidates / elapsed:>12,.0f} candidates/sec")
+    return found, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf", help="Use the text layer of this PDF as the corpus")
+    parser.add_argument("--pages", type=int, default=1500, help="Synthetic corpus size")
+    args = parser.parse_args()
+
+    corpus = pdf_corpus(args.pdf) if args.pdf else synthetic_corpus(args.pages)
+    print(f"{len(corpus)} pages, {len(KNOWN_SECTIONS)} known sections")
+
+    is_valid_section.cache_clear()
+    normalize_section_number.cache_clear()
+
+    legacy_found, legacy_elapsed = bench("legacy", corpus, legacy_is_valid_section)
+    indexed_found, indexed_elapsed = bench("indexed", corpus, is_valid_section)
+    assert legacy_found == indexed_found, "indexed lookup disagrees with the legacy scan"
+    print(f"speedup: {legacy_elapsed / indexed_elapsed:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,25 @@
 from .pdf_page_converter import PDFPageConverter
 from .s3_buckets import S3Bucket
+from .object_cache import ObjectCache
 from .typed_dicts import HybridPage
 from .ocr import Tesseract
 from .db import db, ModuDB
+from .response_cache import ResponseCache, response_cache
+from .prompt_cache import PromptCacheStats, prompt_cache_stats
+from .rate_limiter import RateLimiter, rate_limiter
+from .token_estimator import TokenEstimator, token_estimator
 from .anthropic import Anthropic
+from .llm_scheduler import LLMScheduler, llm_scheduler
+from .batch_watcher import BatchWatcher, batch_watcher
+from .job_queue import JobQueue, job_queue, JOB_WAITING
+from .progress import ProgressHub, progress_hub
 from .base_models import (
     make_classification_schema,
+    make_multi_section_classification_schema,
     make_summary_schema,
     make_spec_check_schema,
     make_compare_compliance_runs_schema
 )
 
-__all__ = ["PDFPageConverter", "S3Bucket", "HybridPage", "Tesseract", "ModuDB", "db", "Anthropic",
-           "make_classification_schema", "make_summary_schema", "make_spec_check_schema", "make_compare_compliance_runs_schema"]
+__all__ = ["PDFPageConverter", "S3Bucket", "ObjectCache", "HybridPage", "Tesseract", "ModuDB", "db", "ResponseCache", "response_cache", "PromptCacheStats", "prompt_cache_stats", "RateLimiter", "rate_limiter", "TokenEstimator", "token_estimator", "Anthropic", "LLMScheduler", "llm_scheduler", "BatchWatcher", "batch_watcher", "JobQueue", "job_queue", "JOB_WAITING", "ProgressHub", "progress_hub",
+           "make_classification_schema", "make_multi_section_classification_schema", "make_summary_schema", "make_spec_check_schema", "make_compare_compliance_runs_schema"]
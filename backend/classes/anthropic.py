@@ -1,6 +1,10 @@
 from pydantic import BaseModel
 from classes.s3_buckets import S3Bucket
-from anthropic import AsyncAnthropic
+from classes.response_cache import response_cache
+from classes.prompt_cache import PromptCacheStats, prompt_cache_stats
+from classes.rate_limiter import rate_limiter, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from classes.token_estimator import token_estimator
+from anthropic import AsyncAnthropic, APIStatusError
 import logging
 import os
 import base64
@@ -8,7 +12,7 @@ import asyncio
 import aiohttp
 import json
 import dotenv
-from typing import Any, Dict, List, Sequence, Tuple, Optional, Type
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Sequence, Tuple, Optional, Type
 
 dotenv.load_dotenv()
 
@@ -22,12 +26,28 @@ CONTEXT_WINDOW_BUFFER = 0.9  # 90% of context window to be safe
 MAX_SAFE_TOKENS = int(CONTEXT_WINDOW * CONTEXT_WINDOW_BUFFER)
 ESTIMATED_TOKENS_PER_TEXT_PAGE = 1500
 ESTIMATED_TOKENS_PER_IMAGE = 1000
+# Each PDF document page is sent as its extracted text plus an image of the page
+ESTIMATED_TOKENS_PER_PDF_PAGE = ESTIMATED_TOKENS_PER_TEXT_PAGE + ESTIMATED_TOKENS_PER_IMAGE
+MAX_PDF_PAGES_PER_REQUEST = 100
+BATCH_POLL_MIN_INTERVAL = 1
+BATCH_POLL_MAX_INTERVAL = 60
+MAX_BATCH_REQUESTS = 10000
+SAFE_BATCH_MB = 220  # split target, leaves headroom under the 256MB hard limit
+HARD_BATCH_MB = 256
+BATCH_PAYLOAD_PREFIX = '{"requests":['
+BATCH_PAYLOAD_SUFFIX = ']}'
+RESULTS_READ_TIMEOUT = 300  # seconds without data before a results download is abandoned
+RATE_LIMIT_RETRIES = 4  # 429/529 retries of a realtime call, each after the limiter's pause
+DEFAULT_RETRY_AFTER = 5  # seconds, doubled per attempt, when the response carries no retry-after
+ESTIMATED_CHARS_PER_TOKEN = 4
 
 
 class Anthropic(S3Bucket):
     def __init__(self):
         super().__init__()
         self.client = AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+        # Realtime calls retry through the shared rate limiter instead of the SDK's own backoff
+        self.realtime_client = self.client.with_options(max_retries=0)
 
     def build_prompt(self, prompt: str, kwargs: dict) -> str:
         return prompt.format(**kwargs) if kwargs else prompt
@@ -59,6 +79,9 @@ class Anthropic(S3Bucket):
             }
         }
 
+    def text_block(self, text: str) -> Dict[str, Any]:
+        return {"type": "text", "text": text}
+
     def pdf_document_block_url(self, url: str) -> Dict[str, Any]:
         return {
             "type": "document",
@@ -94,8 +117,66 @@ class Anthropic(S3Bucket):
 
         return schema
 
-    # def on_delta(self, delta: Any):
-    #     print(delta, end="", flush=True)
+    # ---------- Rate limiting ----------
+
+    def estimate_block_tokens(self, value: Any) -> int:
+        """Rough token cost of a prompt, content block or list of either"""
+        if isinstance(value, str):
+            return len(value) // ESTIMATED_CHARS_PER_TOKEN
+        if isinstance(value, list):
+            return sum(self.estimate_block_tokens(item) for item in value)
+        if not isinstance(value, dict):
+            return 0
+        if value.get("type") == "document":
+            return ESTIMATED_TOKENS_PER_PDF_PAGE
+        if value.get("type") == "image":
+            return ESTIMATED_TOKENS_PER_IMAGE
+        if "content" in value:
+            return self.estimate_block_tokens(value["content"])
+        return self.estimate_block_tokens(value.get("text", ""))
+
+    def estimate_input_tokens(self, system_prompt: Any, content_blocks: list[dict]) -> int:
+        """Input size used to reserve rate limit budget before a call, from the calibrated estimator when it can"""
+        estimate = token_estimator.estimate_request(system_prompt, content_blocks)
+        if estimate is not None:
+            return estimate
+        return self.estimate_block_tokens(system_prompt) + self.estimate_block_tokens(content_blocks)
+
+    def retry_after_seconds(self, error: APIStatusError, attempt: int) -> float:
+        retry_after = error.response.headers.get("retry-after") if error.response is not None else None
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            return DEFAULT_RETRY_AFTER * 2 ** attempt
+
+    async def call_with_rate_limit(
+        self,
+        call: Callable[[], Awaitable[Any]],
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        priority: int = PRIORITY_INTERACTIVE
+    ) -> Any:
+        """
+        Run call() once the shared rate limiter has budget for it. A 429 or 529 pauses every caller
+        for the retry-after period and the call is queued again, up to RATE_LIMIT_RETRIES times.
+        """
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            async with rate_limiter.slot(input_tokens, output_tokens, priority) as reservation:
+                try:
+                    result = await call()
+                except BaseException as e:
+                    # A rejected call uses no tokens, so its reservation is given back
+                    reservation.settle({"input_tokens": 0, "output_tokens": 0})
+                    if not isinstance(e, APIStatusError) or e.status_code not in (429, 529) or attempt == RATE_LIMIT_RETRIES:
+                        raise
+                    delay = self.retry_after_seconds(e, attempt)
+                    logger.warning(f"Claude returned {e.status_code}, pausing realtime calls for {delay}s")
+                    await rate_limiter.pause(delay)
+                    continue
+
+                usage = getattr(result, "usage", None)
+                reservation.settle(usage.model_dump() if usage is not None else {"input_tokens": input_tokens})
+                return result
 
     async def claude(
         self,
@@ -106,8 +187,41 @@ class Anthropic(S3Bucket):
         model: str = "claude-sonnet-4-6",
         adaptive_thinking: bool = False,
         effort: str = "medium",
-        cache_system_prompt: bool = False
+        cache_system_prompt: bool = False,
+        source_hashes: Optional[Dict[str, str]] = None,
+        use_response_cache: bool = True,
+        priority: int = PRIORITY_INTERACTIVE,
+        on_event: Optional[Callable[[dict], Awaitable[None]]] = None
     ) -> dict:
+        """
+        Run one structured-output request. source_hashes maps presigned document URLs to the
+        content hash of the object behind them; without it, URL documents make the request
+        uncacheable and it always goes to the API. on_event receives {"type": "thinking" | "text",
+        "text": delta} as the response streams in; a response cache hit sends none.
+        """
+        cache_key = None
+        if use_response_cache:
+            cache_key = response_cache.make_key(
+                model=model,
+                max_tokens=max_tokens,
+                system_prompt=system_prompt,
+                schema=schema.model_json_schema(),
+                content_blocks=content_blocks,
+                source_hashes=source_hashes,
+                options={"thinking": adaptive_thinking, "effort": effort if adaptive_thinking else None},
+            )
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Response cache hit for {model} request")
+                return {
+                    "status": "success",
+                    "response": cached["response"],
+                    "input_tokens": cached["input_tokens"],
+                    "output_tokens": cached["output_tokens"],
+                    "total_tokens": cached["input_tokens"] + cached["output_tokens"],
+                    "cached": True,
+                }
+
         try:
             # Cache system prompt if enabled
             system_prompt = [
@@ -131,15 +245,31 @@ class Anthropic(S3Bucket):
                 kwargs["thinking"] = {"type": "adaptive"}
                 kwargs["output_config"] = {"effort": effort}
 
-            async with self.client.messages.stream(**kwargs) as stream:
-                async for event in stream:
-                    if event.type == "content_block_delta":
+            async def stream_message():
+                async with self.realtime_client.messages.stream(**kwargs) as stream:
+                    async for event in stream:
+                        if event.type != "content_block_delta":
+                            continue
                         if event.delta.type == "thinking_delta":
-                            print(event.delta.thinking, end="", flush=True)
+                            delta = {"type": "thinking", "text": event.delta.thinking}
                         elif event.delta.type == "text_delta":
-                            print(event.delta.text, end="", flush=True)
-
-                response = await stream.get_final_message()
+                            delta = {"type": "text", "text": event.delta.text}
+                        else:
+                            continue
+
+                        if on_event:
+                            await on_event(delta)
+                        else:
+                            print(delta["text"], end="", flush=True)
+
+                    return await stream.get_final_message()
+
+            response = await self.call_with_rate_limit(
+                stream_message,
+                input_tokens=self.estimate_input_tokens(system_prompt, content_blocks),
+                output_tokens=max_tokens,
+                priority=priority
+            )
 
             text_block = next(
                 (b for b in response.content if b.type == "text"), None)
@@ -153,6 +283,18 @@ class Anthropic(S3Bucket):
             input_tokens = response.usage.input_tokens
             output_tokens = response.usage.output_tokens
             total_tokens = input_tokens + output_tokens
+            cache_read_input_tokens = response.usage.cache_read_input_tokens or 0
+            cache_creation_input_tokens = response.usage.cache_creation_input_tokens or 0
+            usage = {
+                "input_tokens": input_tokens,
+                "cache_read_input_tokens": cache_read_input_tokens,
+                "cache_creation_input_tokens": cache_creation_input_tokens,
+            }
+            prompt_cache_stats.record(usage, source="realtime")
+            await token_estimator.record(system_prompt, content_blocks, usage)
+
+            if response.stop_reason == "end_turn" and "raw" not in parsed:
+                await response_cache.put(cache_key, model, parsed, input_tokens, output_tokens)
 
             return {
                 "status": "success",
@@ -160,6 +302,8 @@ class Anthropic(S3Bucket):
                 "input_tokens": input_tokens,
                 "output_tokens": output_tokens,
                 "total_tokens": total_tokens,
+                "cache_read_input_tokens": cache_read_input_tokens,
+                "cache_creation_input_tokens": cache_creation_input_tokens,
             }
 
         except Exception as e:
@@ -169,21 +313,54 @@ class Anthropic(S3Bucket):
                 "error": str(e),
             }
 
-    def split_batch(self, requests: Dict[str, Any]) -> Dict[str, Any]:
-        batch_size = self.measure_batch_size(requests)
+    def request_size_bytes(self, request: dict) -> int:
+        """Serialized size of one request exactly as it appears inside a batch payload"""
+        return len(json.dumps(request, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
 
-        if batch_size["status"] == "ok":
-            return [requests]
+    def batch_payload_size(self, request_sizes: Sequence[int]) -> int:
+        """Size of {"requests": [...]} built from requests of the given serialized sizes"""
+        if not request_sizes:
+            return len(BATCH_PAYLOAD_PREFIX) + len(BATCH_PAYLOAD_SUFFIX)
+        return len(BATCH_PAYLOAD_PREFIX) + sum(request_sizes) + len(request_sizes) - 1 + len(BATCH_PAYLOAD_SUFFIX)
 
-        mid = len(requests) // 2
-        if mid == 0:
-            logger.error(
-                "Cannot split further - single request exceeds limits")
-            return [requests]
+    def split_batch(
+        self,
+        requests: list[dict],
+        max_requests: int = MAX_BATCH_REQUESTS,
+        max_bytes: int = SAFE_BATCH_MB * 1024 * 1024
+    ) -> list[list[dict]]:
+        """
+        Pack requests, in order, into as few batches as fit under the request-count and payload-size
+        limits. Each request is serialized once to get its size; batch sizes are then summed
+        analytically instead of re-serializing candidate batches.
+        """
+        batches: list[list[dict]] = []
+        current: list[dict] = []
+        # Empty payload plus the comma separating each additional request
+        overhead = len(BATCH_PAYLOAD_PREFIX) + len(BATCH_PAYLOAD_SUFFIX)
+        current_bytes = overhead
+
+        for request in requests:
+            size = self.request_size_bytes(request)
+            added = size + (1 if current else 0)
+
+            if current and (len(current) >= max_requests or current_bytes + added > max_bytes):
+                batches.append(current)
+                current, current_bytes, added = [], overhead, size
+
+            if size + overhead > max_bytes:
+                logger.error(
+                    f"Request {request.get('custom_id')} is {size / (1024 * 1024):.1f} MB on its own and exceeds the batch size limit")
+
+            current.append(request)
+            current_bytes += added
+
+        if current or not batches:
+            batches.append(current)
 
-        left = self.split_batch(requests[:mid])
-        right = self.split_batch(requests[mid:])
-        return left + right
+        logger.info(
+            f"Packed {len(requests)} requests into {len(batches)} batch(es)")
+        return batches
 
     # NOTE: URL PDF sources are not supported by the count_tokens endpoint, so we need to use the claude endpoint to count the tokens
     async def count_tokens_content_blocks(
@@ -194,13 +371,15 @@ class Anthropic(S3Bucket):
     ) -> int:
         try:
 
-            res = await self.client.messages.count_tokens(
-                model=model,
-                system=system_prompt,
-                messages=[{
-                    "role": "user",
-                    "content": content_blocks,
-                }]
+            res = await self.call_with_rate_limit(
+                lambda: self.realtime_client.messages.count_tokens(
+                    model=model,
+                    system=system_prompt,
+                    messages=[{
+                        "role": "user",
+                        "content": content_blocks,
+                    }]
+                )
             )
 
             return res.input_tokens
@@ -226,13 +405,15 @@ class Anthropic(S3Bucket):
                         }
                     })
 
-            tokens = await self.client.messages.count_tokens(
-                system=system_prompt,
-                messages=[{
-                    "content": content_blocks,
-                    "role": "user",
-                }],
-                model=model,
+            tokens = await self.call_with_rate_limit(
+                lambda: self.realtime_client.messages.count_tokens(
+                    system=system_prompt,
+                    messages=[{
+                        "content": content_blocks,
+                        "role": "user",
+                    }],
+                    model=model,
+                )
             )
             return {
                 "status": "success",
@@ -246,6 +427,13 @@ class Anthropic(S3Bucket):
             }
 
     def estimate_tokens(self, pages: Sequence[PagePayload]) -> int:
+        estimate = token_estimator.estimate("text", {
+            "chars": sum(len(text or "") for _, text, _, _ in pages),
+            "images": sum(1 for _, _, img_bytes, media_type in pages if img_bytes and media_type == "image/jpeg"),
+        })
+        if estimate is not None:
+            return estimate
+
         total = 0
         for _, text, img_bytes, media_type in pages:
             if text:
@@ -254,6 +442,42 @@ class Anthropic(S3Bucket):
                 total += ESTIMATED_TOKENS_PER_IMAGE
         return total
 
+    def plan_page_splits(
+        self,
+        pages: list[int],
+        system_prompt: Any,
+        max_tokens: int,
+        page_tokens: int = ESTIMATED_TOKENS_PER_PDF_PAGE,
+        context_tokens: int = MAX_SAFE_TOKENS,
+        page_costs: Optional[Sequence[int]] = None
+    ) -> list[list[int]]:
+        """
+        Split the pages of one request into the fewest contiguous, evenly sized chunks that each fit
+        the context window (system prompt, pages and max_tokens of output) and the PDF page limit.
+        Returns [pages] when no split is needed. With page_costs (tokens per page, e.g. from
+        token_estimator.page_costs) chunks are filled page by page up to the budget instead.
+        """
+        # The per-request text block after the documents is small; a page's worth covers it
+        budget = context_tokens - max_tokens - self.estimate_block_tokens(system_prompt) - page_tokens
+        if page_costs is not None:
+            splits: list[list[int]] = [[]]
+            used = 0
+            for page, cost in zip(pages, page_costs):
+                if splits[-1] and (used + cost > budget or len(splits[-1]) >= MAX_PDF_PAGES_PER_REQUEST):
+                    splits.append([])
+                    used = 0
+                splits[-1].append(page)
+                used += cost
+            return splits if len(splits) > 1 else [pages]
+
+        pages_per_request = max(1, min(MAX_PDF_PAGES_PER_REQUEST, budget // page_tokens))
+        if len(pages) <= pages_per_request:
+            return [pages]
+
+        part_count = -(-len(pages) // pages_per_request)
+        part_size = -(-len(pages) // part_count)
+        return [pages[start:start + part_size] for start in range(0, len(pages), part_size)]
+
     async def check_tokens(
         self,
         pages: Sequence[PagePayload],
@@ -269,9 +493,12 @@ class Anthropic(S3Bucket):
                 f"Request {custom_id} estimated at {estimate} tokens — skipping exact count")
             return True
 
-        content_blocks = [(text, img, media_type)
-                          for _, text, img, media_type in pages]
-        exact_count = await self.count_tokens(content_blocks, system_prompt, model)
+        content_blocks = [
+            block
+            for page_index, text, img, media_type in pages
+            for block in self.page_blocks(page_index, text, img, media_type)
+        ]
+        exact_count = await self.count_tokens_content_blocks(content_blocks, system_prompt, model)
 
         if isinstance(exact_count, dict) and "error" in exact_count:
             logger.error(
@@ -282,15 +509,15 @@ class Anthropic(S3Bucket):
 
         if exact_count > MAX_SAFE_TOKENS:
             logger.warning(
-                f"Request {custom_id} exceeds context window: {exact_count} / {self.MAX_SAFE_TOKENS} tokens")
+                f"Request {custom_id} exceeds context window: {exact_count} / {MAX_SAFE_TOKENS} tokens")
             return False
 
         return True
 
     def measure_batch_size(self, requests: list[dict]) -> dict[str, Any]:
-        MAX_REQUESTS = 10000
-        SAFE_MB_LIMIT = 220
-        HARD_MB_LIMIT = 256
+        MAX_REQUESTS = MAX_BATCH_REQUESTS
+        SAFE_MB_LIMIT = SAFE_BATCH_MB
+        HARD_MB_LIMIT = HARD_BATCH_MB
 
         SAFE_LIMIT_BYTES = SAFE_MB_LIMIT * 1024 * 1024
         HARD_LIMIT_BYTES = HARD_MB_LIMIT * 1024 * 1024
@@ -305,12 +532,10 @@ class Anthropic(S3Bucket):
                 "max_requests": MAX_REQUESTS,
             }
 
-        payload = {"requests": requests}
-
-        # separators remove whitespace; ensure_ascii=False avoids \uXXXX expansion for unicode text
-        raw = json.dumps(payload, separators=(",", ":"),
-                         ensure_ascii=False).encode("utf-8")
-        size_bytes = len(raw)
+        # Same bytes as json.dumps({"requests": requests}, separators=(",", ":"), ensure_ascii=False),
+        # without building the whole payload string
+        size_bytes = self.batch_payload_size(
+            [self.request_size_bytes(request) for request in requests])
         size_mb = size_bytes / (1024 * 1024)
 
         metrics = {
@@ -358,25 +583,13 @@ class Anthropic(S3Bucket):
     async def build_claude_request(
         self,
         custom_id: str,
-        # pages: Sequence[PagePayload],
         content_blocks: list[dict],
         system_prompt: str,
         schema: Type[BaseModel],
         max_tokens: int = 1024,
         model: str = "claude-sonnet-4-6"
     ) -> Dict[str, Any]:
-        # Check token count before building request
-        # NOTE: Develop a way to handle exceeding the context window by splitting the request into multiple requests
-        # NOTE: Option 1: Split the request into multiple requests, custom_id will have -1, -2, -3, etc tacked on to the end, then re-run the results through claude to consolidate the results or just combine them manually
-        # NOTE: Option 2: First attempt text + images, second attempt text only, then do option 1.
-        # within_context = await self.check_tokens(pages, system_prompt, model, custom_id)
-        # if not within_context:
-        #     return None
-
-        # for page_index, text, img, media_type in pages:
-        #     content_blocks.extend(self.page_blocks(
-        #         page_index, text, img, media_type))
-
+        """One batch request. Page ranges too large for the context window are split beforehand, see plan_page_splits."""
         schema = schema.model_json_schema()
         if "type" not in schema:
             schema["type"] = "object"
@@ -409,6 +622,72 @@ class Anthropic(S3Bucket):
             },
         }
 
+    def request_cache_key(self, request: dict, source_hashes: Optional[Dict[str, str]] = None) -> Optional[str]:
+        """Response cache key for a request built by build_claude_request"""
+        params = request["params"]
+        return response_cache.make_key(
+            model=params["model"],
+            max_tokens=params["max_tokens"],
+            system_prompt=params["system"],
+            schema=params["output_config"]["format"]["schema"],
+            content_blocks=params["messages"],
+            source_hashes=source_hashes,
+        )
+
+    async def partition_cached_requests(
+        self,
+        requests: list[dict],
+        source_hashes: Optional[Dict[str, str]] = None
+    ) -> Tuple[list[dict], Dict[str, str], list[str]]:
+        """
+        Look batch requests up in the response cache before submitting them.
+        Returns (requests still to submit, {custom_id: cache_key} for every cacheable request,
+        custom_ids answered from the cache).
+        """
+        cache_keys = {}
+        for request in requests:
+            cache_key = self.request_cache_key(request, source_hashes)
+            if cache_key:
+                cache_keys[request["custom_id"]] = cache_key
+
+        found = await response_cache.get_many(list(cache_keys.values()))
+        cached = [custom_id for custom_id, cache_key in cache_keys.items() if cache_key in found]
+        cached_set = set(cached)
+        remaining = [request for request in requests if request["custom_id"] not in cached_set]
+
+        if cached:
+            logger.info(f"Response cache answered {len(cached)}/{len(requests)} batch request(s)")
+        return remaining, cache_keys, cached
+
+    async def run_request(self, request: dict, priority: int = PRIORITY_BACKGROUND) -> dict:
+        """
+        Send one request built by build_claude_request as a realtime call, through the shared
+        rate limiter. The result is shaped like a parsed batch result, errors included.
+        """
+        params = request["params"]
+        try:
+            message = await self.call_with_rate_limit(
+                lambda: self.realtime_client.messages.create(**params),
+                input_tokens=self.estimate_input_tokens(params["system"], params["messages"]),
+                output_tokens=params["max_tokens"],
+                priority=priority
+            )
+        except Exception as e:
+            logger.error(f"Realtime request {request['custom_id']} failed: {e}")
+            return {
+                "custom_id": request["custom_id"],
+                "type": "errored",
+                "error": str(e),
+            }
+
+        item = self.parse_batch_result({
+            "custom_id": request["custom_id"],
+            "result": {"type": "succeeded", "message": message.model_dump(mode="json")},
+        })
+        prompt_cache_stats.record(item.get("usage"), source="realtime")
+        await token_estimator.record(params["system"], params["messages"], item.get("usage"), request["custom_id"])
+        return item
+
     async def create_batch(self, claude_requests: list[dict]) -> dict:
         try:
             batch = await self.client.messages.batches.create(requests=claude_requests)
@@ -433,68 +712,109 @@ class Anthropic(S3Bucket):
             }
 
     async def poll_and_fetch_batch_results(self, batch_id: str) -> list[dict]:
+        """Wait for a single batch in-process. Long-running pipelines should use BatchWatcher instead."""
+        interval = BATCH_POLL_MIN_INTERVAL
         while True:
             batch = await self.client.messages.batches.retrieve(batch_id)
             logger.info(
                 f"Batch status: {batch.processing_status}, batch_id: {batch_id}")
             if batch.processing_status == "ended":
                 break
-            await asyncio.sleep(1)
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, BATCH_POLL_MAX_INTERVAL)
 
-        if not batch.results_url:
-            return [{"error": "Batch ended but results_url is missing", "status": "error"}]
+        return await self.fetch_batch_results(batch.results_url)
 
-        headers = {
-            "x-api-key": os.getenv("ANTHROPIC_API_KEY"),
-            "anthropic-version": "2023-06-01",
-        }
+    def parse_batch_result(self, row: dict) -> dict:
+        """Flatten one line of a batch results file"""
+        custom_id = row.get("custom_id")
+        result = row.get("result", {})
+        rtype = result.get("type")
 
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(batch.results_url, headers=headers) as resp:
-                    resp.raise_for_status()
-                    text = await resp.text()
+        if rtype != "succeeded":
+            return {
+                "custom_id": custom_id,
+                "type": rtype,
+                "error": result.get("error")
+            }
 
-            parsed: list[dict] = []
-            for line in text.splitlines():
-                if not line.strip():
-                    continue
-                row = json.loads(line)
+        msg = result.get("message", {})
+        usage = msg.get("usage", {})
+        blocks = msg.get("content", [])
 
-                custom_id = row.get("custom_id")
-                result = row.get("result", {})
-                rtype = result.get("type")
+        # find the first text block (structured output is usually here)
+        text_block = next(
+            (b for b in blocks if b.get("type") == "text"), None)
+        raw = (text_block or {}).get("text", "{}")
 
-                if rtype != "succeeded":
-                    parsed.append({
-                        "custom_id": custom_id,
-                        "type": rtype,
-                        "error": result.get("error")
-                    })
-                    continue
+        try:
+            content = json.loads(raw)
+        except Exception:
+            content = {"raw": raw}
 
-                msg = result.get("message", {})
-                usage = msg.get("usage", {})
-                blocks = msg.get("content", [])
+        return {
+            "custom_id": custom_id,
+            "content": content,
+            "usage": usage,
+            "model": msg.get("model"),
+            "stop_reason": msg.get("stop_reason"),
+        }
 
-                # find the first text block (structured output is usually here)
-                text_block = next(
-                    (b for b in blocks if b.get("type") == "text"), None)
-                raw = (text_block or {}).get("text", "{}")
+    async def iter_batch_results(self, results_url: Optional[str]) -> AsyncIterator[dict]:
+        """
+        Stream the JSONL results of an ended batch, yielding one parsed item per line.
+        Only the line currently being parsed is held in memory, however large the results file is.
+        Raises if the file cannot be read to the end, so the batch watcher dispatches the group again
+        rather than treating the results after the break as missing.
+        """
+        if not results_url:
+            raise ValueError("Batch ended but results_url is missing")
 
-                try:
-                    content = json.loads(raw)
-                except Exception:
-                    content = {"raw": raw}
+        headers = {
+            "x-api-key": os.getenv("ANTHROPIC_API_KEY"),
+            "anthropic-version": "2023-06-01",
+        }
+        # No total timeout: large results files can take longer than aiohttp's 5 minute default
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=RESULTS_READ_TIMEOUT)
+        # Prompt cache usage of this results file, logged once it has been read
+        batch_cache_stats = PromptCacheStats()
 
-                parsed.append({
-                    "custom_id": custom_id,
-                    "content": content,
-                    "usage": usage,
-                })
+        def account(item: dict) -> dict:
+            prompt_cache_stats.record(item.get("usage"), source="batch")
+            batch_cache_stats.record(item.get("usage"), source="batch")
+            token_estimator.record_usage(item.get("custom_id"), item.get("usage"))
+            return item
 
-            return parsed
+        try:
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                async with session.get(results_url, headers=headers) as resp:
+                    resp.raise_for_status()
+
+                    buffer = bytearray()
+                    async for chunk in resp.content.iter_any():
+                        buffer.extend(chunk)
+                        start = 0
+                        while (end := buffer.find(b"\n", start)) >= 0:
+                            line = bytes(buffer[start:end])
+                            start = end + 1
+                            if line.strip():
+                                yield account(self.parse_batch_result(json.loads(line)))
+                        del buffer[:start]
+
+                    if bytes(buffer).strip():
+                        yield account(self.parse_batch_result(json.loads(bytes(buffer))))
+
+            await token_estimator.flush()
+            summary = batch_cache_stats.summary("batch")
+            if summary["requests"]:
+                logger.info(
+                    f"Prompt cache: {summary['requests_with_cache_read']}/{summary['requests']} batch request(s) "
+                    f"read the cache, {summary['cached_prompt_share']} of prompt tokens served from it")
 
         except Exception as e:
             logger.error(f"Error fetching batch results: {e}")
-            return [{"error": str(e), "status": "error"}]
+            raise
+
+    async def fetch_batch_results(self, results_url: Optional[str]) -> list[dict]:
+        """Download and parse the JSONL results of an ended batch into a list"""
+        return [item async for item in self.iter_batch_results(results_url)]
@@ -3,11 +3,14 @@ from typing import Optional, List, Literal
 
 # ------------------------------------------------------------ Classification Schema ------------------------------------------------------------
 
+# The schemas below are identical for every section: structured output schemas are part of the
+# cached prompt prefix, so the section number travels in the user turn instead.
+
 
 def make_classification_schema(section_number: str) -> type[BaseModel]:
     class PageClassification(BaseModel):
         section_title: str = Field(
-            description=f"The title of the section being classified for section {section_number}"
+            description="The title of the section being classified"
         )
         reasoning: str = Field(
             description="Brief explanation of the classification decision"
@@ -19,7 +22,7 @@ def make_classification_schema(section_number: str) -> type[BaseModel]:
             description="Confidence level in the classification between 0 and 1"
         )
         is_primary: bool = Field(
-            description=f"True ONLY if the page contains the primary specification body for section {section_number} specifically. Must be false if reasoning concludes content belongs to a different section."
+            description="True ONLY if the page contains the primary specification body for the section being analyzed specifically. Must be false if reasoning concludes content belongs to a different section."
         )
         referenced_sections: list[str] = Field(
             default_factory=list,
@@ -27,19 +30,50 @@ def make_classification_schema(section_number: str) -> type[BaseModel]:
         )
     return PageClassification
 
+
+def make_multi_section_classification_schema(section_numbers: list[str]) -> type[BaseModel]:
+    """One verdict per candidate section for a page range that mentions several section numbers"""
+    class SectionVerdict(BaseModel):
+        section_number: str = Field(
+            description="The section number this verdict is for, exactly as listed in the request"
+        )
+        section_title: str = Field(
+            description="The title of the section being classified"
+        )
+        reasoning: str = Field(
+            description="Brief explanation of the classification decision for this section"
+        )
+        confidence: float = Field(
+            description="Confidence level in the classification between 0 and 1"
+        )
+        is_primary: bool = Field(
+            description="True ONLY if the pages contain the primary specification body for this section number specifically."
+        )
+        referenced_sections: list[str] = Field(
+            default_factory=list,
+            description="List of other CSI MasterFormat section numbers explicitly referenced in these pages (e.g. ['033000', '011000']). Empty list if none found."
+        )
+
+    class MultiSectionPageClassification(BaseModel):
+        pages_analyzed: list[int] = Field(
+            description="List of page numbers that were analyzed"
+        )
+        sections: list[SectionVerdict] = Field(
+            description="Exactly one verdict for each section number listed in the request"
+        )
+    return MultiSectionPageClassification
+
 # ------------------------------------------------------------ Summary Schema ------------------------------------------------------------
 
 
 def make_summary_schema(section_number: str) -> type[BaseModel]:
-    _sec = section_number
-
     class SectionSummary(BaseModel):
         section_number: str = Field(
-            description=f"The section number being summarized for section {_sec}")
+            description="The section number being summarized")
         section_title: str = Field(
-            description=f"The title of the section being classified for section {_sec}")
+            description="The title of the section being summarized")
         overview: str = Field(
-            description=f"Brief overview of what this section covers for section {_sec}")
+            description="Brief overview of what this section covers")
         key_requirements: list[str] = Field(
             description="Key technical requirements and standards")
         materials: list[str] = Field(
@@ -139,14 +173,14 @@ def make_spec_check_schema(section_number: str) -> type[BaseModel]:
     class SpecCheck(BaseModel):
         is_compliant: bool = Field(
             description=(
-                f"Overall compliance verdict for section {section_number}. "
+                "Overall compliance verdict for the section under review. "
                 "True only if compliance_score >= 0.85 AND no critical or "
                 "major non-conformances exist."
             )
         )
         compliance_score: float = Field(
             description=(
-                f"Compliance score for section {section_number} from 0.0 to 1.0. "
+                "Compliance score for the section under review from 0.0 to 1.0. "
                 "Calculated by starting at 1.0 and applying deductions: "
                 "missing required item -0.05, clarification_needed -0.02, "
                 "non_compliant minor -0.03, non_compliant major -0.10, "
@@ -155,8 +189,8 @@ def make_spec_check_schema(section_number: str) -> type[BaseModel]:
         )
         summary: str = Field(
             description=(
-                f"3-5 sentence executive summary of the compliance review for "
-                f"section {section_number}. Should state the overall disposition, "
+                "3-5 sentence executive summary of the compliance review for "
+                "the section under review. Should state the overall disposition, "
                 "the most critical issues, and whether the submittal is approvable "
                 "as-is, approvable with comments, or requires resubmittal."
             )
@@ -164,38 +198,38 @@ def make_spec_check_schema(section_number: str) -> type[BaseModel]:
         requirement_findings: List[RequirementFinding] = Field(
             default_factory=list,
             description=(
-                f"Detailed findings for each requirement found in section "
-                f"{section_number}. Every explicit spec requirement should have "
+                "Detailed findings for each requirement found in the section "
+                "under review. Every explicit spec requirement should have "
                 "a corresponding entry."
             )
         )
         non_conformances: List[NonConformance] = Field(
             default_factory=list,
             description=(
-                f"List of identified non-conformances against section "
-                f"{section_number} requirements, ordered by severity descending."
+                "List of identified non-conformances against the section "
+                "under review's requirements, ordered by severity descending."
             )
         )
         missing_items: List[MissingItem] = Field(
             default_factory=list,
             description=(
-                f"Items explicitly required by section {section_number} that "
+                "Items explicitly required by the section under review that "
                 "are absent from the submittal."
             )
         )
         recommendations: List[str] = Field(
             default_factory=list,
             description=(
-                f"Actionable recommendations for the contractor to achieve "
-                f"compliance with section {section_number}, ordered by priority "
+                "Actionable recommendations for the contractor to achieve "
+                "compliance with the section under review, ordered by priority "
                 "descending (most critical first)."
             )
         )
         reviewer_notes: str = Field(
             default="",
             description=(
-                f"Additional observations noted during review of section "
-                f"{section_number}. Use for scope observations, voluntary "
+                "Additional observations noted during review of the section "
+                "under review. Use for scope observations, voluntary "
                 "additional documentation notes, or flags for structural/MEP "
                 "engineer review that fall outside the spec reviewer's scope."
             )
@@ -0,0 +1,286 @@
+import anthropic as anthropic_sdk
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from classes.anthropic import Anthropic
+from classes.db import db as default_db, ModuDB
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_INTERVAL = 5  # seconds before the first status check of a new batch
+DEFAULT_MAX_INTERVAL = 300  # ceiling for the backoff between checks of one batch
+DEFAULT_BACKOFF = 2.0
+DEFAULT_MAX_CONCURRENT_CHECKS = 8
+DEFAULT_MAX_DISPATCH_ATTEMPTS = 4  # handler runs per group before it is failed
+DEFAULT_DISPATCH_RETRY_DELAY = 30  # seconds before the first re-dispatch, doubled per attempt
+
+# handler(spec_id, batch_results, context) - batch_results holds one lazy result stream per batch in the group
+BatchHandler = Callable[[str, List[AsyncIterator[Dict]], Dict], Awaitable[Any]]
+# on_failed(spec_id, context, error) - the group will not be dispatched again
+BatchFailureHandler = Callable[[str, Dict, str], Awaitable[Any]]
+
+
+class BatchWatcher:
+    """
+    Single loop that watches every in-flight message batch.
+
+    Batches are persisted in the watched_batches table, so a restart picks up where it left off.
+    Each batch is re-checked on its own schedule: while it is making progress the next check is
+    placed at roughly half its projected time to completion, otherwise the interval grows
+    exponentially up to max_interval. When every batch in a group has ended, the results are
+    streamed to the handler registered for the group's kind.
+
+    A handler that raises is dispatched again with backoff, up to max_dispatch_attempts, so it must
+    tolerate seeing results it already applied. A group that runs out of attempts, or whose batches
+    all ended without results, is marked failed and handed to the kind's on_failed callback.
+    """
+
+    def __init__(
+        self,
+        anthropic: Optional[Anthropic] = None,
+        database: ModuDB = default_db,
+        min_interval: float = DEFAULT_MIN_INTERVAL,
+        max_interval: float = DEFAULT_MAX_INTERVAL,
+        backoff: float = DEFAULT_BACKOFF,
+        max_concurrent_checks: int = DEFAULT_MAX_CONCURRENT_CHECKS,
+        max_dispatch_attempts: int = DEFAULT_MAX_DISPATCH_ATTEMPTS,
+        dispatch_retry_delay: float = DEFAULT_DISPATCH_RETRY_DELAY,
+    ):
+        self.anthropic = anthropic or Anthropic()
+        self.db = database
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_concurrent_checks = max_concurrent_checks
+        self.max_dispatch_attempts = max_dispatch_attempts
+        self.dispatch_retry_delay = dispatch_retry_delay
+
+        self._handlers: Dict[str, BatchHandler] = {}
+        self._failure_handlers: Dict[str, BatchFailureHandler] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatching: Dict[str, asyncio.Task] = {}
+        # Failed dispatches by group_id: (attempts so far, time of the next attempt)
+        self._retries: Dict[str, tuple[int, float]] = {}
+
+        self.status_checks = 0
+        self.dispatched_groups = 0
+        self.failed_groups = 0
+
+    # ---------- Registration ----------
+
+    def register(self, kind: str, handler: BatchHandler, on_failed: Optional[BatchFailureHandler] = None):
+        """Handlers are looked up by kind, so groups persisted before a restart still find theirs"""
+        self._handlers[kind] = handler
+        if on_failed is not None:
+            self._failure_handlers[kind] = on_failed
+
+    async def watch(
+        self,
+        kind: str,
+        spec_id: str,
+        batch_ids: List[str],
+        context: Optional[dict] = None,
+        group_id: Optional[str] = None
+    ) -> str:
+        """
+        Start watching a group of batches. context must be JSON-serializable; it is passed back to the handler.
+        Watching a batch id that is already tracked is a no-op, so a resumed job can call this again safely.
+        """
+        group_id = group_id or uuid.uuid4().hex
+        await self.db.add_watched_batches(
+            group_id=group_id,
+            kind=kind,
+            spec_id=spec_id,
+            batch_ids=batch_ids,
+            context=context or {},
+            check_interval=self.min_interval,
+            next_check_at=time.time() + self.min_interval,
+        )
+        logger.info(f"Watching {len(batch_ids)} {kind} batch(es) for {spec_id} as group {group_id}")
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return group_id
+
+    # ---------- Lifecycle ----------
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Batch watcher started")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        # Undispatched groups stay 'ended' in the database and are dispatched again on the next start
+        for dispatch in list(self._dispatching.values()):
+            dispatch.cancel()
+        await asyncio.gather(task, *self._dispatching.values(), return_exceptions=True)
+        self._dispatching.clear()
+        logger.info("Batch watcher stopped")
+
+    def stats(self) -> dict:
+        return {
+            "status_checks": self.status_checks,
+            "dispatched_groups": self.dispatched_groups,
+            "failed_groups": self.failed_groups,
+            "dispatching": len(self._dispatching),
+            "retrying": len(self._retries),
+            "handlers": sorted(self._handlers),
+        }
+
+    # ---------- Loop ----------
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                await self._check_due_batches()
+                await self._dispatch_ended_groups()
+                delay = await self._next_delay()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Batch watcher iteration failed: {e}")
+                delay = self.min_interval
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _next_delay(self) -> float:
+        next_check_at = await self.db.get_next_watched_batch_check()
+        due = [at for at in (next_check_at, *(retry_at for _, retry_at in self._retries.values())) if at is not None]
+        if not due:
+            return self.max_interval
+        return min(max(0.0, min(due) - time.time()), self.max_interval)
+
+    def next_interval(self, interval: float, previous_processing: Optional[int], processing: int, elapsed: Optional[float]) -> float:
+        completed = (previous_processing - processing) if previous_processing is not None else 0
+        if completed > 0 and elapsed:
+            rate = completed / elapsed
+            return min(max(processing / rate / 2, self.min_interval), self.max_interval)
+        return min(interval * self.backoff, self.max_interval)
+
+    async def _check_due_batches(self):
+        due = await self.db.get_due_watched_batches(time.time())
+        if not due:
+            return
+
+        semaphore = asyncio.Semaphore(self.max_concurrent_checks)
+
+        async def check(row: dict):
+            async with semaphore:
+                await self._check_batch(row)
+
+        await asyncio.gather(*[check(row) for row in due])
+
+    async def _check_batch(self, row: dict):
+        batch_id = row["batch_id"]
+        now = time.time()
+        try:
+            batch = await self.anthropic.client.messages.batches.retrieve(batch_id)
+            self.status_checks += 1
+        except anthropic_sdk.NotFoundError:
+            # Ended without results, so its group is still dispatched (or failed) instead of waiting forever
+            logger.error(f"Watched batch {batch_id} no longer exists")
+            await self.db.update_watched_batch(batch_id, status="ended", processing_count=0, last_checked_at=now)
+            return
+        except Exception as e:
+            interval = min(row["check_interval"] * self.backoff, self.max_interval)
+            logger.warning(f"Status check failed for batch {batch_id}, retrying in {interval:.0f}s: {e}")
+            await self.db.update_watched_batch(
+                batch_id, check_interval=interval, last_checked_at=now, next_check_at=now + interval)
+            return
+
+        if batch.processing_status == "ended":
+            logger.info(f"Batch {batch_id} ended after {row['checks'] + 1} status checks")
+            await self.db.update_watched_batch(
+                batch_id, status="ended", results_url=batch.results_url, processing_count=0, last_checked_at=now)
+            return
+
+        processing = batch.request_counts.processing
+        elapsed = now - row["last_checked_at"] if row["last_checked_at"] else None
+        interval = self.next_interval(row["check_interval"], row["processing_count"], processing, elapsed)
+        logger.debug(
+            f"Batch {batch_id}: {batch.processing_status}, {processing} processing, next check in {interval:.0f}s")
+        await self.db.update_watched_batch(
+            batch_id,
+            processing_count=processing,
+            check_interval=interval,
+            last_checked_at=now,
+            next_check_at=now + interval,
+        )
+
+    # ---------- Dispatch ----------
+
+    async def _dispatch_ended_groups(self):
+        now = time.time()
+        for group in await self.db.get_ended_batch_groups():
+            group_id = group["group_id"]
+            if group_id in self._dispatching:
+                continue
+            if group_id in self._retries and self._retries[group_id][1] > now:
+                continue
+            if group["kind"] not in self._handlers:
+                logger.warning(f"No handler registered for {group['kind']} batches, leaving group {group_id}")
+                continue
+            task = asyncio.create_task(self._dispatch_group(group))
+            self._dispatching[group_id] = task
+
+    async def _dispatch_group(self, group: dict):
+        group_id = group["group_id"]
+        try:
+            results_urls = [batch["results_url"] for batch in group["batches"] if batch["results_url"]]
+            if not results_urls:
+                await self._fail_group(group, "Every batch in the group ended without results")
+                return
+            if len(results_urls) < len(group["batches"]):
+                logger.warning(f"{len(group['batches']) - len(results_urls)} batch(es) of group {group_id} ended without results")
+
+            # Results are streamed while the handler consumes them rather than downloaded up front
+            batch_results = [self.anthropic.iter_batch_results(results_url) for results_url in results_urls]
+
+            await self._handlers[group["kind"]](group["spec_id"], batch_results, group["context"])
+            await self.db.set_batch_group_status(group_id, "dispatched")
+            self._retries.pop(group_id, None)
+            self.dispatched_groups += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            attempts = self._retries.get(group_id, (0, 0.0))[0] + 1
+            if attempts < self.max_dispatch_attempts:
+                delay = self.dispatch_retry_delay * 2 ** (attempts - 1)
+                logger.warning(f"{group['kind']} handler failed for {group['spec_id']} (group {group_id}), "
+                               f"dispatching again in {delay:.0f}s: {e}")
+                self._retries[group_id] = (attempts, time.time() + delay)
+            else:
+                logger.error(f"{group['kind']} handler failed for {group['spec_id']} (group {group_id}) "
+                             f"after {attempts} attempt(s): {e}")
+                await self._fail_group(group, str(e))
+        finally:
+            self._dispatching.pop(group_id, None)
+
+    async def _fail_group(self, group: dict, error: str):
+        """Stop dispatching a group and let the kind's on_failed callback settle whatever waits on it"""
+        await self.db.set_batch_group_status(group["group_id"], "failed")
+        self._retries.pop(group["group_id"], None)
+        self.failed_groups += 1
+        on_failed = self._failure_handlers.get(group["kind"])
+        if on_failed is None:
+            return
+        try:
+            await on_failed(group["spec_id"], group["context"], error)
+        except Exception as e:
+            logger.error(f"on_failed callback failed for group {group['group_id']}: {e}")
+
+
+batch_watcher = BatchWatcher()
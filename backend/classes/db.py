@@ -1,23 +1,124 @@
 # database.py
 import aiosqlite
+import asyncio
 import json
-from typing import Optional, List, Dict
+import zlib
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional, List, Dict
 import logging
 from classes.s3_buckets import S3Bucket
+from classes.page_fingerprint import lsh_bands
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 s3 = S3Bucket()
 
+DEFAULT_READER_POOL_SIZE = 4
+
+# Summary fields that are concatenated when a section is summarized across several requests
+SUMMARY_LIST_FIELDS = ('key_requirements', 'materials', 'submittals', 'testing', 'related_sections')
+
+# Applied to every pooled connection. WAL lets the reader pool run alongside the single writer.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",  # ~16MB page cache per connection
+    "PRAGMA mmap_size = 268435456",  # 256MB
+)
+
 
 class ModuDB:
-    def __init__(self, db_path: str = "modu_db.db"):
+    def __init__(self, db_path: str = "modu_db.db", reader_pool_size: int = DEFAULT_READER_POOL_SIZE):
         self.db_path = db_path
+        self.reader_pool_size = reader_pool_size
+
+        # Connections and locks are created lazily inside the running event loop
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._writer_lock: Optional[asyncio.Lock] = None
+        self._readers: Optional[asyncio.Queue] = None
+        self._reader_conns: List[aiosqlite.Connection] = []
+        self._open_lock: Optional[asyncio.Lock] = None
+
+    # ---------- Connection pool ----------
+
+    async def _connect(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.db_path)
+        conn.row_factory = aiosqlite.Row
+        for pragma in CONNECTION_PRAGMAS:
+            await conn.execute(pragma)
+        return conn
+
+    async def open(self):
+        """Open the long-lived writer connection and the reader pool (no-op if already open)"""
+        if self._writer is not None:
+            return
+        if self._open_lock is None:
+            self._open_lock = asyncio.Lock()
+
+        async with self._open_lock:
+            if self._writer is not None:
+                return
+
+            # Open the writer first so WAL mode is set before any reader attaches
+            writer = await self._connect()
+            readers: asyncio.Queue = asyncio.Queue()
+            reader_conns = []
+            for _ in range(self.reader_pool_size):
+                conn = await self._connect()
+                reader_conns.append(conn)
+                readers.put_nowait(conn)
+
+            self._writer_lock = asyncio.Lock()
+            self._readers = readers
+            self._reader_conns = reader_conns
+            self._writer = writer
+            logger.info(
+                f"Opened SQLite pool for {self.db_path}: 1 writer, {self.reader_pool_size} readers")
+
+    async def close(self):
+        """Close all pooled connections"""
+        if self._writer is None:
+            return
+
+        writer, self._writer = self._writer, None
+        reader_conns, self._reader_conns = self._reader_conns, []
+        self._readers = None
+
+        async with self._writer_lock:
+            await writer.close()
+        for conn in reader_conns:
+            await conn.close()
+        logger.info(f"Closed SQLite pool for {self.db_path}")
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Exclusive access to the writer connection. Uncommitted work is rolled back on exit."""
+        await self.open()
+        async with self._writer_lock:
+            conn = self._writer
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    await conn.rollback()
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a read-only connection from the pool"""
+        await self.open()
+        readers = self._readers
+        conn = await readers.get()
+        try:
+            yield conn
+        finally:
+            readers.put_nowait(conn)
 
     async def init_db(self):
         """Initialize database with tables"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.writer() as conn:
 
             # Projects table
             await conn.execute("""
@@ -89,12 +190,19 @@ class ModuDB:
                     reasoning TEXT NOT NULL,
                     referenced_sections TEXT DEFAULT '[]',
                     pages_analyzed TEXT DEFAULT '[]',
+                    source TEXT DEFAULT 'llm',
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY (section_id) REFERENCES sections(id) ON DELETE CASCADE
                 )
             """)
 
+            # source (llm, reused, boundary_scoring, page_classifier) came after the table; only llm
+            # rows train the local page classifier
+            cursor = await conn.execute("PRAGMA table_info(classification)")
+            if "source" not in {row['name'] for row in await cursor.fetchall()}:
+                await conn.execute("ALTER TABLE classification ADD COLUMN source TEXT DEFAULT 'llm'")
+
             # Section summaries table
             await conn.execute("""
                 CREATE TABLE IF NOT EXISTS section_summaries (
@@ -226,6 +334,153 @@ class ModuDB:
                     FOREIGN KEY (section_id) REFERENCES sections(id) ON DELETE CASCADE
                 )""")
 
+            # Message batches tracked by the batch watcher; batches sharing a group_id are handed to one callback
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS watched_batches (
+                    batch_id TEXT PRIMARY KEY,
+                    group_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    spec_id TEXT NOT NULL,
+                    context TEXT,
+                    status TEXT NOT NULL DEFAULT 'in_progress' CHECK(status IN ('in_progress', 'ended', 'dispatched', 'failed')),
+                    results_url TEXT,
+                    processing_count INTEGER,
+                    check_interval REAL NOT NULL,
+                    last_checked_at REAL,
+                    next_check_at REAL NOT NULL,
+                    checks INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP
+                )""")
+
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_watched_batches_status
+                ON watched_batches (status, next_check_at)
+            """)
+
+            # Durable background jobs; see classes/job_queue.py
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    spec_id TEXT NOT NULL,
+                    payload TEXT NOT NULL DEFAULT '{}',
+                    progress TEXT NOT NULL DEFAULT '{}',
+                    status TEXT NOT NULL DEFAULT 'queued' CHECK(status IN ('queued', 'running', 'waiting', 'complete', 'failed')),
+                    dedupe_key TEXT UNIQUE,
+                    attempts INTEGER DEFAULT 0,
+                    max_attempts INTEGER DEFAULT 3,
+                    lease_owner TEXT,
+                    lease_expires_at REAL,
+                    available_at REAL NOT NULL,
+                    error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP
+                )""")
+
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_jobs_status
+                ON jobs (status, available_at)
+            """)
+
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_jobs_spec_status
+                ON jobs (spec_id, status)
+            """)
+
+            # Persistent LLM response cache; see classes/response_cache.py
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    cache_key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    input_tokens INTEGER DEFAULT 0,
+                    output_tokens INTEGER DEFAULT 0,
+                    size INTEGER NOT NULL,
+                    hits INTEGER DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )""")
+
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_llm_responses_last_used
+                ON llm_responses (last_used_at)
+            """)
+
+            # Page fingerprints for cross-spec duplicate detection; see classes/page_fingerprint.py
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS page_fingerprints (
+                    spec_id TEXT NOT NULL,
+                    page_index INTEGER NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    minhash TEXT NOT NULL,
+                    PRIMARY KEY (spec_id, page_index)
+                )""")
+
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_page_fingerprints_text_hash
+                ON page_fingerprints (text_hash)
+            """)
+
+            # Per-page features of the split PDF pages, the inputs of classes/token_estimator.py
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS page_features (
+                    spec_id TEXT NOT NULL,
+                    page_index INTEGER NOT NULL,
+                    chars INTEGER NOT NULL,
+                    images INTEGER NOT NULL,
+                    area REAL NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    PRIMARY KEY (spec_id, page_index)
+                )""")
+
+            # Page text from section detection (zlib), the input of functions/page_classifier.py
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS page_text (
+                    spec_id TEXT NOT NULL,
+                    page_index INTEGER NOT NULL,
+                    text BLOB NOT NULL,
+                    PRIMARY KEY (spec_id, page_index)
+                )""")
+
+            # Request features against the prompt tokens Claude reported; input_tokens is NULL until the result is in
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS token_samples (
+                    custom_id TEXT PRIMARY KEY,
+                    content_type TEXT NOT NULL,
+                    features TEXT NOT NULL,
+                    input_tokens INTEGER,
+                    created_at REAL NOT NULL
+                )""")
+
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_token_samples_type_created
+                ON token_samples (content_type, created_at)
+            """)
+
+            # MinHash LSH bands; pages sharing a band are near-duplicate candidates
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS page_fingerprint_bands (
+                    band_hash TEXT NOT NULL,
+                    spec_id TEXT NOT NULL,
+                    page_index INTEGER NOT NULL
+                )""")
+
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_page_fingerprint_bands_hash
+                ON page_fingerprint_bands (band_hash)
+            """)
+
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_page_fingerprint_bands_spec
+                ON page_fingerprint_bands (spec_id, page_index)
+            """)
+
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_classification_custom_id
+                ON classification (custom_id)
+            """)
+
             await conn.commit()
 
     async def create_project(
@@ -259,7 +514,7 @@ class ModuDB:
         set_clause = ", ".join(f"{k} = ?" for k in updates)
         values = [spec_id] + list(updates.values())
 
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.writer() as conn:
             await conn.execute(f"""
                 INSERT INTO projects ({columns})
                 VALUES ({placeholders})
@@ -301,7 +556,7 @@ class ModuDB:
         set_clause = ", ".join(f"{k} = ?" for k in updates)
         values = list(updates.values()) + [spec_id]
 
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.writer() as conn:
             await conn.execute(f"""
                 UPDATE projects
                 SET {set_clause}, updated_at = CURRENT_TIMESTAMP
@@ -311,7 +566,7 @@ class ModuDB:
 
     async def get_projects(self) -> List[Dict]:
         """Get project data"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT * FROM projects
@@ -327,10 +582,23 @@ class ModuDB:
 
     async def delete_project(self, spec_id: str):
         """Delete project"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.writer() as conn:
             await conn.execute("""
                 DELETE FROM projects WHERE spec_id = ?
             """, (spec_id,))
+            # A deleted spec's pages must not be offered for reuse
+            await conn.execute("""
+                DELETE FROM page_fingerprints WHERE spec_id = ?
+            """, (spec_id,))
+            await conn.execute("""
+                DELETE FROM page_fingerprint_bands WHERE spec_id = ?
+            """, (spec_id,))
+            await conn.execute("""
+                DELETE FROM page_features WHERE spec_id = ?
+            """, (spec_id,))
+            await conn.execute("""
+                DELETE FROM page_text WHERE spec_id = ?
+            """, (spec_id,))
             await conn.commit()
             return {
                 "deleted": True,
@@ -339,7 +607,7 @@ class ModuDB:
 
     async def create_division(self, spec_id: str, division: str, division_title: str):
         """Create division or return existing id"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.writer() as conn:
             cursor = await conn.execute("""
                 INSERT INTO divisions (spec_id, division, division_title)
                 VALUES (?, ?, ?)
@@ -352,7 +620,7 @@ class ModuDB:
 
     async def get_division(self, spec_id: str, division: str) -> Optional[Dict]:
         """Get division data"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT * FROM divisions WHERE spec_id = ? AND division = ?
@@ -362,7 +630,7 @@ class ModuDB:
 
     async def get_all_divisions(self, spec_id: str) -> List[Dict]:
         """Get all divisions for a spec"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT * FROM divisions WHERE spec_id = ?
@@ -372,7 +640,7 @@ class ModuDB:
 
     async def update_division(self, spec_id: str, division: str, division_title: str):
         """Update division"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.writer() as conn:
             await conn.execute("""
                 UPDATE divisions
                 SET division_title = ?,
@@ -384,7 +652,7 @@ class ModuDB:
 
     async def delete_division(self, spec_id: str, division: str):
         """Delete division"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.writer() as conn:
             await conn.execute("""
                 DELETE FROM divisions WHERE spec_id = ? AND division = ?
             """, (spec_id, division))
@@ -397,7 +665,7 @@ class ModuDB:
 
     async def get_section(self, spec_id: str, section_number: str) -> Optional[Dict]:
         """Get section data"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT * FROM sections WHERE spec_id = ? AND section_number = ?
@@ -407,7 +675,7 @@ class ModuDB:
 
     async def get_section_by_id(self, section_id: int) -> Optional[Dict]:
         """Get section data by id"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT * FROM sections WHERE id = ?
@@ -426,7 +694,7 @@ class ModuDB:
         classification_status: str = "pending",
         summary_status: str = "pending"
     ) -> int:
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.writer() as conn:
             # First, try to get existing section
             cursor = await conn.execute("""
                 SELECT id FROM sections
@@ -470,7 +738,7 @@ class ModuDB:
         reference_pages: list,
     ) -> dict:
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.writer() as conn:
                 conn.row_factory = aiosqlite.Row
                 cursor = await conn.execute("""
                     SELECT * FROM sections
@@ -527,7 +795,7 @@ class ModuDB:
         summary_status: str = 'complete',
     ) -> dict:
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.writer() as conn:
                 conn.row_factory = aiosqlite.Row
                 cursor = await conn.execute("""
                     SELECT id FROM sections
@@ -565,7 +833,7 @@ class ModuDB:
 
     async def update_section_title(self, section_id: int, section_title: str):
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.writer() as conn:
                 await conn.execute("""
                     UPDATE sections
                     SET section_title = ?,
@@ -587,7 +855,7 @@ class ModuDB:
 
     async def get_all_sections(self, spec_id: str) -> List[Dict]:
         """Get all sections for a spec"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT * FROM
@@ -623,7 +891,7 @@ class ModuDB:
 
     async def get_sections_with_primary_pages(self, spec_id: str) -> List[Dict]:
         """Get all sections with primary pages for a spec"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT * FROM
@@ -657,7 +925,7 @@ class ModuDB:
 
     async def get_all_sections_without_primary_pages(self, spec_id: str) -> List[Dict]:
         """Get all sections without primary pages for a spec"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT * FROM sections WHERE spec_id = ? AND primary_pages = '[]' ORDER BY section_number ASC
@@ -670,11 +938,11 @@ class ModuDB:
         Save individual classification result
         result argument schema: {"is_primary": bool, "confidence": float, "reasoning": str, "referenced_sections": list[str], "pages_analyzed": list[int]}
         """
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.writer() as conn:
             await conn.execute("""
                 INSERT INTO classification
-                (section_id, custom_id, is_primary, confidence, reasoning, referenced_sections, pages_analyzed)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                (section_id, custom_id, is_primary, confidence, reasoning, referenced_sections, pages_analyzed, source)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             """, (
                 section_id,
                 custom_id,
@@ -683,12 +951,141 @@ class ModuDB:
                 result.get('reasoning'),
                 json.dumps(result.get('referenced_sections', [])),
                 json.dumps(result.get('pages_analyzed', [])),
+                result.get('classified_by', 'llm'),
             ))
             await conn.commit()
 
+    async def apply_classification_results(self, spec_id: str, items: List[Dict], mark_manual: bool = True) -> Dict:
+        """
+        Persist a whole batch of classification results in a single transaction.
+        items schema: [{"section_number": str, "custom_id": str, "is_primary": bool, "pages": list[int], "result": dict}]
+
+        Page ranges are merged in memory per section, then sections and classification rows are
+        written with executemany. Sections that received no primary pages in this batch are marked
+        summary_status = 'manual' unless mark_manual is False (callers saving in chunks use
+        mark_sections_manual once every chunk is in).
+
+        Applying is idempotent by custom_id: an item whose section already has a classification row
+        for that custom_id is skipped, so a batch group dispatched twice adds nothing the second time.
+        """
+        async with self.writer() as conn:
+            cursor = await conn.execute("""
+                SELECT id, section_number, primary_pages, reference_pages, total_pages
+                FROM sections WHERE spec_id = ?
+            """, (spec_id,))
+            existing = {row['section_number']: row for row in await cursor.fetchall()}
+
+            cursor = await conn.execute("""
+                SELECT c.section_id, c.custom_id
+                FROM classification c
+                JOIN sections s ON s.id = c.section_id
+                WHERE s.spec_id = ?
+            """, (spec_id,))
+            applied = {(row['section_id'], row['custom_id']) for row in await cursor.fetchall()}
+
+            merged: Dict[str, Dict] = {}
+            classification_rows = []
+            missing_sections = []
+            duplicates = 0
+
+            for item in items:
+                section_number = item['section_number']
+                row = existing.get(section_number)
+                if not row:
+                    missing_sections.append(section_number)
+                    continue
+                if (row['id'], item['custom_id']) in applied:
+                    duplicates += 1
+                    continue
+                applied.add((row['id'], item['custom_id']))
+
+                if section_number not in merged:
+                    merged[section_number] = {
+                        "id": row['id'],
+                        "total_pages": row['total_pages'],
+                        "primary_pages": json.loads(row['primary_pages'] or '[]'),
+                        "reference_pages": json.loads(row['reference_pages'] or '[]'),
+                        "has_primary": False,
+                    }
+                section = merged[section_number]
+
+                pages_key = 'primary_pages' if item['is_primary'] else 'reference_pages'
+                section[pages_key].extend(page for page in item['pages'] if page not in section[pages_key])
+                if item['is_primary']:
+                    section['has_primary'] = True
+
+                result = item['result']
+                classification_rows.append((
+                    section['id'],
+                    item['custom_id'],
+                    result.get('is_primary'),
+                    result.get('confidence'),
+                    result.get('reasoning'),
+                    json.dumps(result.get('referenced_sections', [])),
+                    json.dumps(result.get('pages_analyzed', [])),
+                    result.get('classified_by', 'llm'),
+                ))
+
+            section_rows = []
+            manual_rows = []
+            for section in merged.values():
+                classified_pages = len(section['primary_pages']) + len(section['reference_pages'])
+                classification_status = "complete" if classified_pages >= (section['total_pages'] or 0) else "pending"
+                section_rows.append((
+                    json.dumps(section['primary_pages']),
+                    json.dumps(section['reference_pages']),
+                    classification_status,
+                    section['id'],
+                ))
+                if mark_manual and not section['has_primary']:
+                    manual_rows.append((section['id'],))
+
+            await conn.executemany("""
+                UPDATE sections
+                SET primary_pages = ?,
+                    reference_pages = ?,
+                    classification_status = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, section_rows)
+
+            await conn.executemany("""
+                INSERT INTO classification
+                (section_id, custom_id, is_primary, confidence, reasoning, referenced_sections, pages_analyzed, source)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, classification_rows)
+
+            await conn.executemany("""
+                UPDATE sections
+                SET summary_status = 'manual',
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, manual_rows)
+
+            await conn.commit()
+
+        return {
+            "section_ids": {section_number: section['id'] for section_number, section in merged.items()},
+            "missing_sections": missing_sections,
+            "sections_updated": len(section_rows),
+            "classifications_saved": len(classification_rows),
+            "duplicates_skipped": duplicates,
+        }
+
+    async def mark_sections_manual(self, spec_id: str, section_numbers: List[str]):
+        """Flag sections that need a manual summary because classification found no primary pages"""
+        async with self.writer() as conn:
+            await conn.executemany("""
+                UPDATE sections
+                SET summary_status = 'manual',
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE spec_id = ? AND section_number = ?
+            """, [(spec_id, section_number) for section_number in section_numbers])
+            await conn.commit()
+
     async def get_project_status(self, spec_id: str) -> Optional[Dict]:
         """Get project status"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT spec_id, total_divisions, total_sections, sections_with_primary,
@@ -704,7 +1101,7 @@ class ModuDB:
 
     async def get_section_summary(self, section_id: int) -> Optional[Dict]:
         """Get section summary"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT * FROM section_summaries WHERE section_id = ?
@@ -714,7 +1111,7 @@ class ModuDB:
 
     async def save_section_summary(self, spec_id: str, section_summary: dict):
         """Save section summary"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.writer() as conn:
             cursor = await conn.execute("""
                 INSERT INTO section_summaries (spec_id, section_id, section_number, section_title, overview, key_requirements, materials, submittals, testing, related_sections, pages_summarized, pages_not_summarized)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
@@ -737,7 +1134,7 @@ class ModuDB:
 
     async def update_section_summary(self, spec_id: str, section_summary: dict):
         """Update section summary"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.writer() as conn:
             await conn.execute("""
                 UPDATE section_summaries
                 SET section_title = ?,
@@ -766,10 +1163,117 @@ class ModuDB:
             ))
             await conn.commit()
 
+    async def apply_summary_results(self, spec_id: str, summaries: Dict[str, Dict], merge_sections: set) -> Dict:
+        """
+        Persist one chunk of consolidated section summaries in a single transaction.
+        summaries schema: {section_number: {**summary_content, "pages_summarized": list[int], "pages_not_summarized": list[int]}}
+
+        Sections in merge_sections already had a summary row written earlier in the same run; their
+        list fields and pages are appended to that row. Other sections get a new row. Section titles
+        and summary_status are updated alongside. A summary whose pages the section's latest row
+        already covers is skipped, so a batch group dispatched twice adds nothing the second time.
+        """
+        async with self.writer() as conn:
+            placeholders = ", ".join(["?"] * len(summaries))
+            cursor = await conn.execute(f"""
+                SELECT id, section_number FROM sections
+                WHERE spec_id = ? AND section_number IN ({placeholders})
+            """, (spec_id, *summaries.keys()))
+            section_ids = {row['section_number']: row['id'] for row in await cursor.fetchall()}
+
+            saved = []
+            missing_sections = []
+            duplicates = 0
+            for section_number, summary in summaries.items():
+                section_id = section_ids.get(section_number)
+                if not section_id:
+                    missing_sections.append(section_number)
+                    continue
+
+                cursor = await conn.execute("""
+                    SELECT * FROM section_summaries
+                    WHERE spec_id = ? AND section_number = ?
+                    ORDER BY id DESC LIMIT 1
+                """, (spec_id, section_number))
+                existing = await cursor.fetchone()
+                pages = set(summary.get('pages_summarized', []))
+                if existing and pages and pages <= set(json.loads(existing['pages_summarized'] or '[]')):
+                    # Counted as saved so later parts of the same section still merge into this row
+                    saved.append(section_number)
+                    duplicates += 1
+                    continue
+
+                if existing and section_number in merge_sections:
+                    merged = {
+                        field: json.loads(existing[field] or '[]') + summary.get(field, [])
+                        for field in (*SUMMARY_LIST_FIELDS, 'pages_summarized', 'pages_not_summarized')
+                    }
+                    await conn.execute("""
+                        UPDATE section_summaries
+                        SET key_requirements = ?,
+                            materials = ?,
+                            submittals = ?,
+                            testing = ?,
+                            related_sections = ?,
+                            pages_summarized = ?,
+                            pages_not_summarized = ?,
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE id = ?
+                    """, (
+                        json.dumps(merged['key_requirements']),
+                        json.dumps(merged['materials']),
+                        json.dumps(merged['submittals']),
+                        json.dumps(merged['testing']),
+                        json.dumps(merged['related_sections']),
+                        json.dumps(merged['pages_summarized']),
+                        json.dumps(merged['pages_not_summarized']),
+                        existing['id']
+                    ))
+                else:
+                    await conn.execute("""
+                        INSERT INTO section_summaries (spec_id, section_id, section_number, section_title, overview, key_requirements, materials, submittals, testing, related_sections, pages_summarized, pages_not_summarized)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (
+                        spec_id,
+                        section_id,
+                        section_number,
+                        summary.get('section_title'),
+                        summary.get('overview'),
+                        json.dumps(summary.get('key_requirements', [])),
+                        json.dumps(summary.get('materials', [])),
+                        json.dumps(summary.get('submittals', [])),
+                        json.dumps(summary.get('testing', [])),
+                        json.dumps(summary.get('related_sections', [])),
+                        json.dumps(summary.get('pages_summarized', [])),
+                        json.dumps(summary.get('pages_not_summarized', []))
+                    ))
+                    await conn.execute("""
+                        UPDATE sections
+                        SET section_title = ?,
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE id = ?
+                    """, (summary.get('section_title', 'Undocumented Section Number (MSF2020)'), section_id))
+
+                await conn.execute("""
+                    UPDATE sections
+                    SET summary_status = 'complete',
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, (section_id,))
+                saved.append(section_number)
+
+            await conn.commit()
+
+        return {
+            "saved": saved,
+            "missing_sections": missing_sections,
+            "duplicates_skipped": duplicates,
+        }
+
     async def delete_section_summary(self, section_id: int):
         """Delete section summary"""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.writer() as conn:
                 await conn.execute("""
                     DELETE FROM section_summaries WHERE id = ?
                 """, (section_id,))
@@ -798,7 +1302,7 @@ class ModuDB:
         is_chosen: bool = False
     ) -> int:
         """Create submittal package"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.writer() as conn:
             cursor = await conn.execute("""
                 INSERT INTO submittal_packages (spec_id, section_id, package_name, company_name, submitted_by, submitted_date, compliance_score, status, is_chosen)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
@@ -808,7 +1312,7 @@ class ModuDB:
 
     async def get_submittal_package(self, submittal_package_id: int) -> Optional[Dict]:
         """Get submittal package"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT * FROM submittal_packages WHERE id = ?
@@ -818,7 +1322,7 @@ class ModuDB:
 
     async def get_packages_for_section(self, section_id: int) -> List[Dict]:
         """Get submittal packages for a section, including their submittals"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
 
             # Fetch packages
@@ -842,7 +1346,7 @@ class ModuDB:
 
     async def get_all_submittal_packages(self, spec_id: str) -> List[Dict]:
         """Get all submittal packages"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT * FROM submittal_packages WHERE spec_id = ?
@@ -857,7 +1361,7 @@ class ModuDB:
         compliance_score: float,
         checked_submittal_ids: list[int],
     ) -> None:
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.writer() as conn:
             # Get all submittal IDs for this package
             async with conn.execute(
                 "SELECT id FROM submittals WHERE package_id = ?", (package_id,)
@@ -917,7 +1421,7 @@ class ModuDB:
     ) -> dict:
         """Mark or unmark a package as chosen"""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.writer() as conn:
                 await conn.execute("""
                     UPDATE submittal_packages
                     SET is_chosen = ?, updated_at = CURRENT_TIMESTAMP
@@ -930,7 +1434,7 @@ class ModuDB:
             return {"error": str(e), "package_id": None}
 
     async def get_package_result(self, package_id: int) -> Optional[Dict]:
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT id, compliance_result, compliance_score,
@@ -974,7 +1478,7 @@ class ModuDB:
                     return {"error": deleted_from_s3.get("message")}, deleted_from_s3.get("status_code")
 
             # Delete from DB
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.writer() as conn:
                 await conn.execute("""
                     DELETE FROM submittal_packages WHERE id = ?
                 """, (submittal_package_id,))
@@ -1026,7 +1530,7 @@ class ModuDB:
         submittal_findings: str = None
     ) -> int:
         """Create submittal"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.writer() as conn:
             cursor = await conn.execute("""
                 INSERT INTO submittals (package_id, spec_id, submittal_title, s3_key, page_count, compliance_score, submittal_type_id, submittal_findings)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)
@@ -1036,7 +1540,7 @@ class ModuDB:
 
     async def get_all_submittals(self, spec_id: str) -> List[Dict]:
         """Get all submittals by spec_id"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT * FROM submittals WHERE spec_id = ?
@@ -1046,7 +1550,7 @@ class ModuDB:
 
     async def get_submittal(self, submittal_id: int) -> Optional[Dict]:
         """Get submittal"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT * FROM submittals WHERE id = ?
@@ -1057,7 +1561,7 @@ class ModuDB:
     async def get_submittals_by_ids(self, package_id: int, submittal_ids: List[int]) -> List[Dict]:
         """Get submittals by ids"""
         placeholders = ", ".join("?" * len(submittal_ids))
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT * FROM submittals WHERE package_id = ? AND id IN ({placeholders})
@@ -1068,7 +1572,7 @@ class ModuDB:
 
     async def get_submittals_by_type(self, package_id: int, submittal_type_ids: List[int]) -> List[Dict]:
         """Get submittals by submittal_type_ids"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             placeholders = ", ".join("?" * len(submittal_type_ids))
             cursor = await conn.execute(f"""
@@ -1079,7 +1583,7 @@ class ModuDB:
 
     async def get_submittals_by_package(self, package_id: int) -> List[Dict]:
         """Get all submittals by package"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT * FROM submittals WHERE package_id = ?
@@ -1099,7 +1603,7 @@ class ModuDB:
         status: str = None
     ) -> int:
         """Update submittal"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.writer() as conn:
             fields = {
                 "submittal_title": submittal_title,
                 "s3_key": s3_key,
@@ -1131,7 +1635,7 @@ class ModuDB:
             if not submittal:
                 return {"error": "Submittal not found"}, 404
 
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.writer() as conn:
                 await conn.execute("""
                     DELETE FROM submittals WHERE id = ?
                 """, (submittal_id,))
@@ -1165,7 +1669,7 @@ class ModuDB:
         prompt_version: int = 1,
         token_count: int = None,
     ) -> int:
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.writer() as conn:
             cursor = await conn.execute("""
                 INSERT INTO compliance_runs (
                     package_id, spec_id, section_id, submittal_ids,
@@ -1202,7 +1706,7 @@ class ModuDB:
         prompt_version: int = None,
         token_count: int = None,
     ) -> int:
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.writer() as conn:
             cursor = await conn.execute("""
                 UPDATE compliance_runs
                 SET submittal_ids = ?,
@@ -1225,7 +1729,7 @@ class ModuDB:
         submittal_id: Optional[int] = None,
         run_type: Optional[str] = None,
     ) -> List[Dict]:
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             if submittal_id:
                 cursor = await conn.execute("""
@@ -1260,7 +1764,7 @@ class ModuDB:
 
     async def get_compliance_run(self, compliance_run_id: int) -> Optional[Dict]:
         """Get compliance run"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT * FROM compliance_runs WHERE id = ?
@@ -1293,7 +1797,7 @@ class ModuDB:
         comparison_result: str,
         model_version: str,
     ) -> int:
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.writer() as conn:
             cursor = await conn.execute("""
                 INSERT INTO compliance_comparisons (
                     package_id_a, package_id_b, section_id, section_number,
@@ -1313,7 +1817,7 @@ class ModuDB:
             return cursor.lastrowid
 
     async def get_compliance_comparisons(self, id: int = None, section_id: int = None) -> List[Dict]:
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             if id:
                 cursor = await conn.execute("""
@@ -1339,7 +1843,7 @@ class ModuDB:
                 return []
 
     async def get_compliance_comparisons_for_a_package(self, package_id: int) -> List[Dict]:
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT * FROM compliance_comparisons WHERE package_id_a = ? OR package_id_b = ?
@@ -1348,7 +1852,7 @@ class ModuDB:
             return [dict(row) for row in rows]
 
     async def get_compliance_comparisons_list(self, section_id: int) -> list[int]:
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
             SELECT id, package_name_a, package_name_b, score_a, score_b, overall_winner
@@ -1366,7 +1870,7 @@ class ModuDB:
     ) -> dict:
         """Update section lifecycle status and/or chosen packages"""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.writer() as conn:
                 conn.row_factory = aiosqlite.Row
                 cursor = await conn.execute("""
                     SELECT id, chosen_packages, lifecycle_status_override
@@ -1414,7 +1918,7 @@ class ModuDB:
 
     async def compute_division_completion(self, spec_id: str, division: str) -> float:
         """Compute and persist division completion score from section lifecycle statuses"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.writer() as conn:
             cursor = await conn.execute("""
                 SELECT lifecycle_status FROM sections
                 WHERE spec_id = ? AND division = ?
@@ -1442,7 +1946,7 @@ class ModuDB:
 
     async def compute_project_completion(self, spec_id: str) -> float:
         """Compute and persist project completion score by rolling up division scores"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.writer() as conn:
             cursor = await conn.execute("""
                 SELECT lifecycle_status FROM sections
                 WHERE spec_id = ?
@@ -1470,7 +1974,7 @@ class ModuDB:
 
     async def get_lifecycle_summary(self, spec_id: str) -> dict:
         """Get lifecycle rollup for a spec — per-division breakdown plus overall score"""
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT division, lifecycle_status
@@ -1521,7 +2025,7 @@ class ModuDB:
     ) -> dict:
         """Mark specified packages as chosen, unmark all others for this section, set lifecycle to complete"""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.writer() as conn:
                 conn.row_factory = aiosqlite.Row
 
                 # Get section for rollup
@@ -1582,7 +2086,7 @@ class ModuDB:
             return {"error": str(e)}
 
     async def get_section_pdf_pages(self, spec_id: str, section_number: str) -> list[int]:
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT primary_pages, reference_pages FROM sections WHERE spec_id = ? AND section_number = ?
@@ -1606,7 +2110,7 @@ class ModuDB:
             }
 
     async def get_amendments_for_section(self, section_id: int) -> list[dict]:
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT * FROM amendments WHERE section_id = ?
@@ -1615,7 +2119,7 @@ class ModuDB:
             return [dict(row) for row in rows]
 
     async def get_amendment_by_id(self, amendment_id: int) -> dict:
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.reader() as conn:
             conn.row_factory = aiosqlite.Row
             cursor = await conn.execute("""
                 SELECT * FROM amendments WHERE id = ?
@@ -1625,7 +2129,7 @@ class ModuDB:
 
     async def create_amendment(self, section_id: int, amendment: dict):
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.writer() as conn:
                 conn.row_factory = aiosqlite.Row
 
                 # Check if section exists
@@ -1659,7 +2163,7 @@ class ModuDB:
 
     async def delete_amendment(self, amendment_id: int):
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.writer() as conn:
                 conn.row_factory = aiosqlite.Row
 
                 # Check if amendment exists
@@ -1686,7 +2190,7 @@ class ModuDB:
 
     async def update_amendment(self, amendment_id: int, ref: str = None, type: str = None, note: str = None):
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.writer() as conn:
                 conn.row_factory = aiosqlite.Row
 
                 # Check if amendment exists
@@ -1713,4 +2217,587 @@ class ModuDB:
                 "error": str(e)
             }
 
+    # ---------- Watched batches ----------
+
+    async def add_watched_batches(
+        self,
+        group_id: str,
+        kind: str,
+        spec_id: str,
+        batch_ids: List[str],
+        context: dict,
+        check_interval: float,
+        next_check_at: float
+    ):
+        """Register in-flight message batches with the batch watcher"""
+        async with self.writer() as conn:
+            await conn.executemany("""
+                INSERT OR IGNORE INTO watched_batches
+                (batch_id, group_id, kind, spec_id, context, check_interval, next_check_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (batch_id, group_id, kind, spec_id, json.dumps(context or {}), check_interval, next_check_at)
+                for batch_id in batch_ids
+            ])
+            await conn.commit()
+
+    async def get_due_watched_batches(self, now: float) -> List[Dict]:
+        """In-progress batches whose next check is due"""
+        async with self.reader() as conn:
+            cursor = await conn.execute("""
+                SELECT * FROM watched_batches
+                WHERE status = 'in_progress' AND next_check_at <= ?
+                ORDER BY next_check_at
+            """, (now,))
+            rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
+
+    async def get_next_watched_batch_check(self) -> Optional[float]:
+        """Earliest next_check_at across in-progress batches, or None when nothing is in flight"""
+        async with self.reader() as conn:
+            cursor = await conn.execute("""
+                SELECT MIN(next_check_at) AS next_check_at
+                FROM watched_batches WHERE status = 'in_progress'
+            """)
+            row = await cursor.fetchone()
+            return row['next_check_at'] if row else None
+
+    async def update_watched_batch(
+        self,
+        batch_id: str,
+        status: str = None,
+        results_url: str = None,
+        processing_count: int = None,
+        check_interval: float = None,
+        last_checked_at: float = None,
+        next_check_at: float = None
+    ):
+        """Record the outcome of one batch status check"""
+        fields = {
+            "status": status,
+            "results_url": results_url,
+            "processing_count": processing_count,
+            "check_interval": check_interval,
+            "last_checked_at": last_checked_at,
+            "next_check_at": next_check_at,
+        }
+
+        updates = {k: v for k, v in fields.items() if v is not None}
+        set_clause = ", ".join(f"{k} = ?" for k in updates)
+        if set_clause:
+            set_clause += ", "
+        values = list(updates.values()) + [batch_id]
+
+        async with self.writer() as conn:
+            await conn.execute(f"""
+                UPDATE watched_batches
+                SET {set_clause}checks = checks + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE batch_id = ?
+            """, values)
+            await conn.commit()
+
+    async def get_ended_batch_groups(self) -> List[Dict]:
+        """Groups whose batches have all left 'in_progress' and that have not been dispatched yet"""
+        async with self.reader() as conn:
+            cursor = await conn.execute("""
+                SELECT * FROM watched_batches
+                WHERE group_id IN (
+                    SELECT group_id FROM watched_batches
+                    GROUP BY group_id
+                    HAVING SUM(status = 'in_progress') = 0 AND SUM(status = 'ended') > 0
+                )
+                ORDER BY group_id, created_at, rowid
+            """)
+            rows = await cursor.fetchall()
+
+        groups: Dict[str, Dict] = {}
+        for row in rows:
+            group = groups.setdefault(row['group_id'], {
+                "group_id": row['group_id'],
+                "kind": row['kind'],
+                "spec_id": row['spec_id'],
+                "context": json.loads(row['context'] or '{}'),
+                "batches": [],
+            })
+            group["batches"].append({
+                "batch_id": row['batch_id'],
+                "status": row['status'],
+                "results_url": row['results_url'],
+            })
+        return list(groups.values())
+
+    async def set_batch_group_status(self, group_id: str, status: str):
+        """Mark every ended batch in a group as dispatched or failed"""
+        async with self.writer() as conn:
+            await conn.execute("""
+                UPDATE watched_batches
+                SET status = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE group_id = ? AND status = 'ended'
+            """, (status, group_id))
+            await conn.commit()
+
+    # ---------- Jobs ----------
+
+    def _job_from_row(self, row) -> Dict:
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'] or '{}')
+        job['progress'] = json.loads(job['progress'] or '{}')
+        return job
+
+    async def enqueue_job(
+        self,
+        kind: str,
+        spec_id: str,
+        payload: dict,
+        available_at: float,
+        max_attempts: int = 3,
+        dedupe_key: str = None
+    ) -> int:
+        """Insert a queued job. A job with the same dedupe_key is reused instead of duplicated."""
+        async with self.writer() as conn:
+            cursor = await conn.execute("""
+                INSERT OR IGNORE INTO jobs (kind, spec_id, payload, max_attempts, available_at, dedupe_key)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (kind, spec_id, json.dumps(payload), max_attempts, available_at, dedupe_key))
+            job_id = cursor.lastrowid if cursor.rowcount else None
+            if job_id is None:
+                cursor = await conn.execute("""
+                    SELECT id FROM jobs WHERE dedupe_key = ?
+                """, (dedupe_key,))
+                job_id = (await cursor.fetchone())['id']
+            await conn.commit()
+        return job_id
+
+    async def claim_job(
+        self,
+        owner: str,
+        now: float,
+        lease_seconds: float,
+        per_spec_limit: int,
+        max_active: int
+    ) -> Optional[Dict]:
+        """
+        Lease the oldest runnable job: queued and available, or running with an expired lease.
+        Live leases count towards the global and per-spec limits; waiting jobs hold no worker and do not.
+        """
+        async with self.writer() as conn:
+            cursor = await conn.execute("""
+                SELECT COUNT(*) AS active FROM jobs
+                WHERE status = 'running' AND lease_expires_at >= ?
+            """, (now,))
+            if (await cursor.fetchone())['active'] >= max_active:
+                return None
+
+            cursor = await conn.execute("""
+                SELECT id FROM jobs j
+                WHERE ((j.status = 'queued' AND j.available_at <= ?)
+                       OR (j.status = 'running' AND j.lease_expires_at < ?))
+                  AND (
+                      SELECT COUNT(*) FROM jobs a
+                      WHERE a.spec_id = j.spec_id AND a.id != j.id
+                        AND a.status = 'running' AND a.lease_expires_at >= ?
+                  ) < ?
+                ORDER BY j.available_at, j.id
+                LIMIT 1
+            """, (now, now, now, per_spec_limit))
+            row = await cursor.fetchone()
+            if not row:
+                return None
+
+            # Conditional update so a job claimed by another process in the meantime is skipped
+            cursor = await conn.execute("""
+                UPDATE jobs
+                SET status = 'running',
+                    lease_owner = ?,
+                    lease_expires_at = ?,
+                    attempts = attempts + 1,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+                  AND (status = 'queued' OR (status = 'running' AND lease_expires_at < ?))
+            """, (owner, now + lease_seconds, row['id'], now))
+            if cursor.rowcount != 1:
+                await conn.rollback()
+                return None
+            await conn.commit()
+
+            cursor = await conn.execute("""
+                SELECT * FROM jobs WHERE id = ?
+            """, (row['id'],))
+            return self._job_from_row(await cursor.fetchone())
+
+    async def extend_job_lease(self, job_id: int, owner: str, lease_expires_at: float) -> bool:
+        """Heartbeat for a running job. Returns False if the lease was lost."""
+        async with self.writer() as conn:
+            cursor = await conn.execute("""
+                UPDATE jobs
+                SET lease_expires_at = ?
+                WHERE id = ? AND lease_owner = ? AND status = 'running'
+            """, (lease_expires_at, job_id, owner))
+            await conn.commit()
+            return cursor.rowcount == 1
+
+    async def update_job_progress(self, job_id: int, progress: dict):
+        """Checkpoint a job so a resumed attempt can pick up where this one stopped"""
+        async with self.writer() as conn:
+            await conn.execute("""
+                UPDATE jobs
+                SET progress = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (json.dumps(progress), job_id))
+            await conn.commit()
+
+    async def set_job_status(
+        self,
+        job_id: int,
+        status: str,
+        error: str = None,
+        available_at: float = None,
+        release_attempt: bool = False,
+        lease_expires_at: float = None,
+        expected_status: str = None
+    ) -> bool:
+        """
+        Move a job to queued/waiting/complete/failed and drop its lease. A waiting job keeps
+        lease_expires_at as the deadline for whatever it waits on. With expected_status the job is
+        only moved while it still has that status. Returns whether the job was updated.
+        """
+        async with self.writer() as conn:
+            cursor = await conn.execute("""
+                UPDATE jobs
+                SET status = ?,
+                    error = COALESCE(?, error),
+                    available_at = COALESCE(?, available_at),
+                    attempts = attempts - ?,
+                    lease_owner = NULL,
+                    lease_expires_at = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND (? IS NULL OR status = ?)
+            """, (status, error, available_at, 1 if release_attempt else 0, lease_expires_at, job_id,
+                  expected_status, expected_status))
+            await conn.commit()
+            return cursor.rowcount == 1
+
+    async def expire_waiting_jobs(self, now: float, error: str) -> List[int]:
+        """Fail waiting jobs whose deadline has passed; returns their ids"""
+        async with self.writer() as conn:
+            cursor = await conn.execute("""
+                UPDATE jobs
+                SET status = 'failed',
+                    error = ?,
+                    lease_expires_at = NULL,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'waiting' AND lease_expires_at < ?
+                RETURNING id
+            """, (error, now))
+            job_ids = [row['id'] for row in await cursor.fetchall()]
+            await conn.commit()
+            return job_ids
+
+    async def get_job(self, job_id: int) -> Optional[Dict]:
+        async with self.reader() as conn:
+            cursor = await conn.execute("""
+                SELECT * FROM jobs WHERE id = ?
+            """, (job_id,))
+            row = await cursor.fetchone()
+            return self._job_from_row(row) if row else None
+
+    async def get_jobs_for_spec(self, spec_id: str) -> List[Dict]:
+        async with self.reader() as conn:
+            cursor = await conn.execute("""
+                SELECT * FROM jobs WHERE spec_id = ? ORDER BY id
+            """, (spec_id,))
+            rows = await cursor.fetchall()
+            return [self._job_from_row(row) for row in rows]
+
+    # ---------- LLM response cache ----------
+
+    async def get_llm_responses(self, cache_keys: List[str], min_created_at: float) -> Dict[str, Dict]:
+        """Unexpired cached responses by cache key"""
+        found = {}
+        async with self.reader() as conn:
+            for i in range(0, len(cache_keys), 500):
+                chunk = cache_keys[i:i + 500]
+                cursor = await conn.execute(f"""
+                    SELECT cache_key, model, response, input_tokens, output_tokens
+                    FROM llm_responses
+                    WHERE cache_key IN ({','.join('?' * len(chunk))}) AND created_at >= ?
+                """, (*chunk, min_created_at))
+                for row in await cursor.fetchall():
+                    entry = dict(row)
+                    entry['response'] = json.loads(entry['response'])
+                    found[entry['cache_key']] = entry
+        return found
+
+    async def touch_llm_responses(self, cache_keys: List[str], now: float):
+        async with self.writer() as conn:
+            await conn.executemany("""
+                UPDATE llm_responses SET hits = hits + 1, last_used_at = ? WHERE cache_key = ?
+            """, [(now, cache_key) for cache_key in cache_keys])
+            await conn.commit()
+
+    async def put_llm_responses(self, entries: List[Dict], now: float):
+        """entries: dicts with cache_key, model, response, input_tokens, output_tokens"""
+        rows = []
+        for entry in entries:
+            response = json.dumps(entry['response'])
+            rows.append((
+                entry['cache_key'], entry['model'], response, entry.get('input_tokens') or 0,
+                entry.get('output_tokens') or 0, len(response), now, now
+            ))
+        async with self.writer() as conn:
+            await conn.executemany("""
+                INSERT OR REPLACE INTO llm_responses
+                (cache_key, model, response, input_tokens, output_tokens, size, created_at, last_used_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            await conn.commit()
+
+    async def evict_llm_responses(self, min_created_at: float, max_bytes: int) -> int:
+        """Drop expired entries, then least recently used ones until the cache fits in max_bytes"""
+        async with self.writer() as conn:
+            cursor = await conn.execute("""
+                DELETE FROM llm_responses WHERE created_at < ?
+            """, (min_created_at,))
+            evicted = cursor.rowcount
+            cursor = await conn.execute("""
+                DELETE FROM llm_responses WHERE cache_key IN (
+                    SELECT cache_key FROM (
+                        SELECT cache_key, SUM(size) OVER (ORDER BY last_used_at DESC, cache_key) AS running_size
+                        FROM llm_responses
+                    ) WHERE running_size > ?
+                )
+            """, (max_bytes,))
+            evicted += cursor.rowcount
+            await conn.commit()
+        return evicted
+
+    async def get_llm_response_totals(self) -> Dict:
+        async with self.reader() as conn:
+            cursor = await conn.execute("""
+                SELECT COUNT(*) AS entries, COALESCE(SUM(size), 0) AS bytes, COALESCE(SUM(hits), 0) AS lifetime_hits
+                FROM llm_responses
+            """)
+            return dict(await cursor.fetchone())
+
+    # ---------- Page fingerprints ----------
+
+    async def save_page_fingerprints(self, spec_id: str, fingerprints: List[Dict]):
+        """
+        Replace the fingerprint index for a spec.
+        fingerprints schema: [{"page_index": int, "text_hash": str, "minhash": list[int]}]
+        """
+        async with self.writer() as conn:
+            await conn.execute("""
+                DELETE FROM page_fingerprints WHERE spec_id = ?
+            """, (spec_id,))
+            await conn.execute("""
+                DELETE FROM page_fingerprint_bands WHERE spec_id = ?
+            """, (spec_id,))
+            await conn.executemany("""
+                INSERT INTO page_fingerprints (spec_id, page_index, text_hash, minhash)
+                VALUES (?, ?, ?, ?)
+            """, [
+                (spec_id, fp['page_index'], fp['text_hash'], json.dumps(fp['minhash']))
+                for fp in fingerprints
+            ])
+            await conn.executemany("""
+                INSERT INTO page_fingerprint_bands (band_hash, spec_id, page_index)
+                VALUES (?, ?, ?)
+            """, [
+                (band_hash, spec_id, fp['page_index'])
+                for fp in fingerprints
+                for band_hash in lsh_bands(fp['minhash'])
+            ])
+            await conn.commit()
+
+    async def get_page_fingerprints(self, spec_id: str) -> Dict[int, Dict]:
+        async with self.reader() as conn:
+            cursor = await conn.execute("""
+                SELECT page_index, text_hash, minhash FROM page_fingerprints WHERE spec_id = ?
+            """, (spec_id,))
+            rows = await cursor.fetchall()
+            return {
+                row['page_index']: {"text_hash": row['text_hash'], "minhash": json.loads(row['minhash'])}
+                for row in rows
+            }
+
+    async def save_page_features(self, spec_id: str, features: List[Dict]):
+        """
+        Replace the page features of a spec.
+        features schema: [{"page_index": int, "chars": int, "images": int, "area": float, "bytes": int}]
+        """
+        async with self.writer() as conn:
+            await conn.execute("""
+                DELETE FROM page_features WHERE spec_id = ?
+            """, (spec_id,))
+            await conn.executemany("""
+                INSERT INTO page_features (spec_id, page_index, chars, images, area, bytes)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [
+                (spec_id, f['page_index'], f['chars'], f['images'], f['area'], f['bytes'])
+                for f in features
+            ])
+            await conn.commit()
+
+    async def get_page_features(self, spec_id: str) -> Dict[int, Dict]:
+        async with self.reader() as conn:
+            cursor = await conn.execute("""
+                SELECT page_index, chars, images, area, bytes FROM page_features WHERE spec_id = ?
+            """, (spec_id,))
+            rows = await cursor.fetchall()
+            return {
+                row['page_index']: {"chars": row['chars'], "images": row['images'], "area": row['area'], "bytes": row['bytes']}
+                for row in rows
+            }
+
+    async def save_page_texts(self, spec_id: str, texts: Dict[int, str]):
+        """Replace the stored page text of a spec, {page_index: text}"""
+        async with self.writer() as conn:
+            await conn.execute("""
+                DELETE FROM page_text WHERE spec_id = ?
+            """, (spec_id,))
+            await conn.executemany("""
+                INSERT INTO page_text (spec_id, page_index, text) VALUES (?, ?, ?)
+            """, [
+                (spec_id, page_index, zlib.compress(text.encode("utf-8")))
+                for page_index, text in texts.items()
+            ])
+            await conn.commit()
+
+    async def get_page_texts(self, spec_id: str) -> Dict[int, str]:
+        async with self.reader() as conn:
+            cursor = await conn.execute("""
+                SELECT page_index, text FROM page_text WHERE spec_id = ?
+            """, (spec_id,))
+            rows = await cursor.fetchall()
+            return {row['page_index']: zlib.decompress(row['text']).decode("utf-8") for row in rows}
+
+    async def get_classification_labels(self, limit: int, source: str = "llm") -> List[Dict]:
+        """
+        Most recent classification verdicts of one source with their spec and section, for specs
+        whose page text is stored: [{"spec_id", "section_number", "custom_id", "is_primary"}]
+        """
+        async with self.reader() as conn:
+            cursor = await conn.execute("""
+                SELECT s.spec_id, s.section_number, c.custom_id, c.is_primary
+                FROM classification c
+                JOIN sections s ON s.id = c.section_id
+                WHERE c.source = ?
+                  AND EXISTS (SELECT 1 FROM page_text t WHERE t.spec_id = s.spec_id)
+                ORDER BY c.id DESC LIMIT ?
+            """, (source, limit))
+            rows = await cursor.fetchall()
+            return [{**dict(row), "is_primary": bool(row['is_primary'])} for row in rows]
+
+    async def save_token_samples(self, samples: List[Dict], created_at: float):
+        """
+        Insert or replace token samples by custom_id.
+        samples schema: [{"custom_id": str, "content_type": str, "features": dict, "input_tokens": int | None}]
+        """
+        async with self.writer() as conn:
+            await conn.executemany("""
+                INSERT OR REPLACE INTO token_samples (custom_id, content_type, features, input_tokens, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, [
+                (s['custom_id'], s['content_type'], json.dumps(s['features']), s.get('input_tokens'), created_at)
+                for s in samples
+            ])
+            await conn.commit()
+
+    async def set_token_sample_usage(self, usage: Dict[str, int]) -> Dict[str, int]:
+        """
+        Fill in input_tokens of pending samples from {custom_id: input_tokens}.
+        Returns the number of samples labelled per content type.
+        """
+        labelled: Dict[str, int] = {}
+        async with self.writer() as conn:
+            for custom_id, input_tokens in usage.items():
+                cursor = await conn.execute("""
+                    UPDATE token_samples SET input_tokens = ?
+                    WHERE custom_id = ? AND input_tokens IS NULL
+                    RETURNING content_type
+                """, (input_tokens, custom_id))
+                for row in await cursor.fetchall():
+                    labelled[row['content_type']] = labelled.get(row['content_type'], 0) + 1
+            await conn.commit()
+        return labelled
+
+    async def get_token_samples(self, content_type: str, limit: int) -> List[Dict]:
+        """Most recent labelled samples of a content type"""
+        async with self.reader() as conn:
+            cursor = await conn.execute("""
+                SELECT features, input_tokens FROM token_samples
+                WHERE content_type = ? AND input_tokens IS NOT NULL
+                ORDER BY created_at DESC LIMIT ?
+            """, (content_type, limit))
+            rows = await cursor.fetchall()
+            return [
+                {"features": json.loads(row['features']), "input_tokens": row['input_tokens']}
+                for row in rows
+            ]
+
+    async def find_duplicate_page_candidates(self, spec_id: str) -> List[Dict]:
+        """
+        Pages of other specs that share the exact normalized text or an LSH band with a page of spec_id.
+        Near-duplicate candidates still need their MinHash similarity checked by the caller.
+        """
+        async with self.reader() as conn:
+            cursor = await conn.execute("""
+                SELECT a.page_index, b.spec_id AS other_spec_id, b.page_index AS other_page_index,
+                       b.text_hash AS other_text_hash, b.minhash AS other_minhash
+                FROM (
+                    SELECT DISTINCT a.page_index, b.spec_id, b.page_index AS other_page_index
+                    FROM page_fingerprint_bands a
+                    JOIN page_fingerprint_bands b ON b.band_hash = a.band_hash AND b.spec_id != a.spec_id
+                    WHERE a.spec_id = ?
+                ) a
+                JOIN page_fingerprints b ON b.spec_id = a.spec_id AND b.page_index = a.other_page_index
+            """, (spec_id,))
+            rows = await cursor.fetchall()
+            return [
+                {**dict(row), "other_minhash": json.loads(row['other_minhash'])}
+                for row in rows
+            ]
+
+    async def get_classification_results_by_custom_id(self, custom_ids: List[str]) -> Dict[str, Dict]:
+        """Latest classification row per custom_id, with the section title"""
+        found = {}
+        async with self.reader() as conn:
+            for i in range(0, len(custom_ids), 500):
+                chunk = custom_ids[i:i + 500]
+                cursor = await conn.execute(f"""
+                    SELECT c.custom_id, c.is_primary, c.confidence, c.reasoning, c.referenced_sections,
+                           s.section_title
+                    FROM classification c
+                    JOIN sections s ON s.id = c.section_id
+                    WHERE c.custom_id IN ({','.join('?' * len(chunk))})
+                    ORDER BY c.id
+                """, chunk)
+                for row in await cursor.fetchall():
+                    found[row['custom_id']] = {
+                        "section_title": row['section_title'],
+                        "reasoning": row['reasoning'],
+                        "confidence": row['confidence'],
+                        "is_primary": bool(row['is_primary']),
+                        "referenced_sections": json.loads(row['referenced_sections'] or '[]'),
+                    }
+        return found
+
+    async def get_section_summaries_for_specs(self, spec_section_pairs: List[tuple]) -> Dict[tuple, Dict]:
+        """Section summaries keyed by (spec_id, section_number)"""
+        found = {}
+        async with self.reader() as conn:
+            for spec_id, section_number in set(spec_section_pairs):
+                cursor = await conn.execute("""
+                    SELECT * FROM section_summaries WHERE spec_id = ? AND section_number = ?
+                    ORDER BY id DESC LIMIT 1
+                """, (spec_id, section_number))
+                row = await cursor.fetchone()
+                if row:
+                    summary = dict(row)
+                    for field in (*SUMMARY_LIST_FIELDS, 'pages_summarized', 'pages_not_summarized'):
+                        summary[field] = json.loads(summary[field] or '[]')
+                    found[(spec_id, section_number)] = summary
+        return found
+
 db = ModuDB()
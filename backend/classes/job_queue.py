@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+from classes.db import db as default_db, ModuDB
+from classes.progress import progress_hub
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+DEFAULT_PER_SPEC_LIMIT = 2  # e.g. a spec's summary run alongside its classification retry
+DEFAULT_MAX_ACTIVE = 6  # running jobs across all specs
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_POLL_INTERVAL = 5
+DEFAULT_RETRY_DELAY = 30  # seconds before the first retry of a failed attempt, doubled per attempt
+DEFAULT_WAIT_TIMEOUT = 26 * 3600  # batches end within 24h; a job still waiting after this is failed
+
+# Returned by a handler whose job stays active until something else calls complete()/fail(),
+# e.g. a batch job that is finished by its batch watcher callback
+JOB_WAITING = "waiting"
+
+JobHandler = Callable[[Dict], Awaitable[Any]]
+
+
+class JobQueue:
+    """
+    SQLite-backed job queue for long-running spec pipelines.
+
+    Workers lease jobs from the jobs table and heartbeat the lease while the handler runs. A job
+    whose lease expires (e.g. the server died mid-run) is picked up again, and handlers read
+    job["progress"] - written with checkpoint() - to resume instead of starting over. Running jobs
+    count towards a global limit and a per-spec limit, so several large specs uploaded together
+    share the workers instead of all submitting at once. Waiting jobs hold no worker and do not
+    count, but are failed once they have waited wait_timeout seconds.
+
+    A handler may settle its own job with complete()/fail(); the worker then leaves it alone,
+    whether the handler returns or raises afterwards.
+    """
+
+    def __init__(
+        self,
+        database: ModuDB = default_db,
+        workers: int = DEFAULT_WORKERS,
+        per_spec_limit: int = DEFAULT_PER_SPEC_LIMIT,
+        max_active: int = DEFAULT_MAX_ACTIVE,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        retry_delay: float = DEFAULT_RETRY_DELAY,
+        wait_timeout: float = DEFAULT_WAIT_TIMEOUT,
+    ):
+        self.db = database
+        self.workers = workers
+        self.per_spec_limit = per_spec_limit
+        self.max_active = max_active
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self.wait_timeout = wait_timeout
+
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._handlers: Dict[str, JobHandler] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    # ---------- Registration ----------
+
+    def register(self, kind: str, handler: JobHandler):
+        self._handlers[kind] = handler
+
+    async def enqueue(
+        self,
+        kind: str,
+        spec_id: str,
+        payload: dict,
+        max_attempts: int = 3,
+        dedupe_key: str = None,
+        delay: float = 0
+    ) -> int:
+        """Queue a job; payload must be JSON-serializable. Returns the job id."""
+        job_id = await self.db.enqueue_job(
+            kind=kind,
+            spec_id=spec_id,
+            payload=payload,
+            available_at=time.time() + delay,
+            max_attempts=max_attempts,
+            dedupe_key=dedupe_key,
+        )
+        logger.info(f"Queued {kind} job {job_id} for {spec_id}")
+        self._wake()
+        return job_id
+
+    async def checkpoint(self, job_id: int, progress: dict):
+        await self.db.update_job_progress(job_id, progress)
+
+    async def complete(self, job_id: Optional[int]):
+        if job_id is None:
+            return
+        await self.db.set_job_status(job_id, "complete")
+        logger.info(f"Job {job_id} complete")
+        self._wake()
+
+    async def fail(self, job_id: Optional[int], error: str):
+        if job_id is None:
+            return
+        await self.db.set_job_status(job_id, "failed", error=error)
+        logger.error(f"Job {job_id} failed: {error}")
+        self._wake()
+
+    # ---------- Lifecycle ----------
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Job queue started with {self.workers} worker(s), owner {self.owner}")
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info("Job queue stopped")
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # ---------- Workers ----------
+
+    async def _worker(self):
+        while True:
+            try:
+                await self._expire_waiting()
+                job = await self.db.claim_job(
+                    owner=self.owner,
+                    now=time.time(),
+                    lease_seconds=self.lease_seconds,
+                    per_spec_limit=self.per_spec_limit,
+                    max_active=self.max_active,
+                )
+            except Exception as e:
+                logger.error(f"Failed to claim job: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run_job(job)
+
+    async def _expire_waiting(self):
+        error = "Timed out waiting for its batches"
+        for job_id in await self.db.expire_waiting_jobs(time.time(), error=error):
+            logger.error(f"Job {job_id} failed: timed out waiting for its batches")
+            job = await self.db.get_job(job_id)
+            if job:
+                progress_hub.publish(job["spec_id"], "error", terminal=True, error=error, job_id=job_id)
+
+    async def _heartbeat(self, job_id: int):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await self.db.extend_job_lease(job_id, self.owner, time.time() + self.lease_seconds):
+                logger.warning(f"Lost lease on job {job_id}")
+                return
+
+    async def _run_job(self, job: dict):
+        job_id, kind = job["id"], job["kind"]
+        handler = self._handlers.get(kind)
+        if handler is None:
+            await self.db.set_job_status(job_id, "failed", error=f"No handler registered for {kind} jobs")
+            return
+        if job["attempts"] > job["max_attempts"]:
+            await self.fail(job_id, job.get("error") or "Exceeded max attempts")
+            return
+
+        logger.info(f"Running {kind} job {job_id} for {job['spec_id']} (attempt {job['attempts']})")
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            result = await handler(job)
+            # Status changes below only apply while the job is still running, so a job the
+            # handler already completed or failed is never reopened
+            if result == JOB_WAITING:
+                await self.db.set_job_status(
+                    job_id, "waiting", lease_expires_at=time.time() + self.wait_timeout, expected_status="running")
+            elif await self.db.set_job_status(job_id, "complete", expected_status="running"):
+                logger.info(f"Job {job_id} complete")
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back without spending an attempt
+            await self.db.set_job_status(job_id, "queued", release_attempt=True, expected_status="running")
+            raise
+        except Exception as e:
+            if job["attempts"] < job["max_attempts"]:
+                delay = self.retry_delay * 2 ** (job["attempts"] - 1)
+                if await self.db.set_job_status(
+                        job_id, "queued", error=str(e), available_at=time.time() + delay, expected_status="running"):
+                    logger.warning(f"{kind} job {job_id} failed, retrying in {delay:.0f}s: {e}")
+                else:
+                    logger.warning(f"{kind} job {job_id} raised after it was settled, not retrying: {e}")
+            elif await self.db.set_job_status(job_id, "failed", error=str(e), expected_status="running"):
+                logger.error(f"Job {job_id} failed: {e}")
+        finally:
+            heartbeat.cancel()
+            self._wake()
+
+
+job_queue = JobQueue()
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import os
+from typing import AsyncIterator, Optional
+from classes.anthropic import Anthropic
+from classes.rate_limiter import rate_limiter
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REALTIME = "realtime"
+BATCH = "batch"
+
+DEFAULT_REALTIME_MAX_REQUESTS = int(os.getenv("LLM_REALTIME_MAX_REQUESTS", "40"))
+DEFAULT_SLA_SECONDS = float(os.getenv("LLM_SLA_SECONDS", "0")) or None
+REALTIME_REQUEST_SECONDS = 30  # typical latency of one structured-output request over a few PDF pages
+BATCH_EXPECTED_SECONDS = 3600  # most batches end within the hour; the API allows up to 24h
+
+
+class LLMScheduler:
+    """
+    Chooses between realtime calls and the Message Batches API for a set of built requests.
+
+    Up to realtime_max_requests go realtime: a small spec finishes in seconds instead of waiting
+    on a batch. Larger sets go to a batch at half the price, unless an SLA is set that a batch is
+    not expected to meet and the rate limiter lets realtime calls clear the requests within it. Realtime calls
+    share the process-wide rate limiter with every other Claude call.
+    """
+
+    def __init__(
+        self,
+        anthropic: Optional[Anthropic] = None,
+        realtime_max_requests: int = DEFAULT_REALTIME_MAX_REQUESTS,
+        sla_seconds: Optional[float] = DEFAULT_SLA_SECONDS,
+        realtime_request_seconds: float = REALTIME_REQUEST_SECONDS,
+        batch_expected_seconds: float = BATCH_EXPECTED_SECONDS,
+    ):
+        self.anthropic = anthropic or Anthropic()
+        self.realtime_max_requests = realtime_max_requests
+        self.sla_seconds = sla_seconds
+        self.realtime_request_seconds = realtime_request_seconds
+        self.batch_expected_seconds = batch_expected_seconds
+
+        self.realtime_runs = 0
+        self.batch_runs = 0
+
+    def estimate_realtime_seconds(self, request_count: int) -> float:
+        """Wall time for realtime calls to clear request_count requests, bounded by concurrency and rate"""
+        by_concurrency = request_count / rate_limiter.concurrency * self.realtime_request_seconds
+        by_rate = (request_count / rate_limiter.requests_per_minute) * 60
+        return max(by_concurrency, by_rate)
+
+    def choose_mode(self, request_count: int, sla_seconds: Optional[float] = None) -> str:
+        sla_seconds = sla_seconds if sla_seconds is not None else self.sla_seconds
+        if request_count <= self.realtime_max_requests:
+            mode = REALTIME
+        elif (sla_seconds is not None and sla_seconds < self.batch_expected_seconds
+              and self.estimate_realtime_seconds(request_count) <= sla_seconds):
+            mode = REALTIME
+        else:
+            mode = BATCH
+
+        if mode == REALTIME:
+            self.realtime_runs += 1
+        else:
+            self.batch_runs += 1
+        logger.info(f"Scheduling {request_count} request(s) as {mode}")
+        return mode
+
+    async def run_realtime(self, requests: list[dict]) -> AsyncIterator[dict]:
+        """Run requests realtime, yielding parsed results in completion order"""
+        tasks = [asyncio.create_task(self.anthropic.run_request(request)) for request in requests]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "realtime_max_requests": self.realtime_max_requests,
+            "sla_seconds": self.sla_seconds,
+            "realtime_runs": self.realtime_runs,
+            "batch_runs": self.batch_runs,
+            "rate_limiter": rate_limiter.stats(),
+        }
+
+
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,241 @@
+import hashlib
+import dotenv
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+dotenv.load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "modu_object_cache")
+DEFAULT_MAX_MB = 2048
+DEFAULT_REVALIDATE_AFTER = 3600  # seconds an entry is trusted before the ETag is re-checked
+DEFAULT_RESCAN_INTERVAL = 60  # seconds between directory scans that pick up other processes' writes
+DEFAULT_CACHEABLE_PATTERNS = ("/original_pages/",)
+
+
+@dataclass
+class CacheEntry():
+    key: Optional[str]  # None until this process looks up an entry another process wrote
+    etag: Optional[str]
+    path: str
+    size: int
+    validated_at: float
+
+
+class ObjectCache:
+    """
+    Size-bounded, disk-backed LRU cache for S3 object bodies, keyed by S3 key + ETag.
+
+    Bodies live in cache_dir as <sha256(key)>.bin with the ETag in a <sha256(key)>.etag sidecar, so
+    entries written by one process (e.g. a detection worker) are visible to others. The index is
+    rebuilt from the directory at start-up and every rescan_interval seconds on store, so max_bytes
+    bounds the bodies in cache_dir across processes; entries this process has not used are evicted
+    oldest first, before its own LRU order. The hit/miss/eviction counters are per process.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024,
+        revalidate_after: float = DEFAULT_REVALIDATE_AFTER,
+        cacheable_patterns: tuple[str, ...] = DEFAULT_CACHEABLE_PATTERNS,
+        rescan_interval: float = DEFAULT_RESCAN_INTERVAL,
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after
+        self.cacheable_patterns = cacheable_patterns
+        self.rescan_interval = rescan_interval
+
+        # Keyed by sha256(key), the file name, so bodies found on disk can be indexed before their key is known
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._total_bytes = 0
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.revalidations = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._lock:
+            self._scan()
+
+    # ---------- Helpers ----------
+
+    def is_cacheable(self, key: str) -> bool:
+        return any(pattern in key for pattern in self.cacheable_patterns)
+
+    def _digest(self, key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _base_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, self._digest(key))
+
+    def _pop(self, digest: str):
+        entry = self._entries.pop(digest, None)
+        if entry is not None:
+            self._total_bytes -= entry.size
+
+    def _load_from_disk(self, key: str) -> Optional[CacheEntry]:
+        """Adopt an entry another process wrote for this key."""
+        base = self._base_path(key)
+        try:
+            with open(f"{base}.etag", "r") as f:
+                etag = f.read()
+            size = os.path.getsize(f"{base}.bin")
+            mtime = os.path.getmtime(f"{base}.bin")
+        except OSError:
+            return None
+        return CacheEntry(key=key, etag=etag, path=f"{base}.bin", size=size, validated_at=mtime)
+
+    def _scan(self):
+        """
+        Rebuild the index from the bodies in cache_dir, then evict down to max_bytes. Bodies not yet
+        indexed go first, oldest first; entries whose body another process removed are dropped.
+        """
+        on_disk = {}
+        with os.scandir(self.cache_dir) as files:
+            for file in files:
+                if not file.name.endswith(".bin"):
+                    continue
+                try:
+                    stat = file.stat()
+                except OSError:
+                    continue
+                on_disk[file.name[:-len(".bin")]] = (stat.st_mtime, stat.st_size)
+
+        entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        for digest in sorted(on_disk.keys() - self._entries.keys(), key=lambda digest: on_disk[digest][0]):
+            mtime, size = on_disk[digest]
+            path = os.path.join(self.cache_dir, f"{digest}.bin")
+            entries[digest] = CacheEntry(key=None, etag=None, path=path, size=size, validated_at=mtime)
+        for digest, entry in self._entries.items():
+            if digest in on_disk:
+                entry.size = on_disk[digest][1]
+                entries[digest] = entry
+
+        self._entries = entries
+        self._total_bytes = sum(entry.size for entry in entries.values())
+        self._scanned_at = time.monotonic()
+        self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._total_bytes -= entry.size
+            self.evictions += 1
+            for path in (entry.path, entry.path[:-len(".bin")] + ".etag"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    # ---------- Public API ----------
+
+    def lookup(self, key: str) -> Optional[CacheEntry]:
+        digest = self._digest(key)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or entry.key is None:
+                self._pop(digest)
+                entry = self._load_from_disk(key)
+                if entry is None:
+                    return None
+                self._entries[digest] = entry
+                self._total_bytes += entry.size
+                self._evict()
+                if digest not in self._entries:
+                    # Larger than max_bytes on its own
+                    return None
+            self._entries.move_to_end(digest)
+            return entry
+
+    def needs_revalidation(self, entry: CacheEntry) -> bool:
+        return time.time() - entry.validated_at > self.revalidate_after
+
+    def mark_validated(self, entry: CacheEntry):
+        entry.validated_at = time.time()
+        self.revalidations += 1
+
+    def read(self, entry: CacheEntry) -> Optional[bytes]:
+        """Memory-mapped read of a cached body. Returns None if the file disappeared."""
+        try:
+            with open(entry.path, "rb") as f:
+                if entry.size == 0:
+                    data = b""
+                else:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        data = mm[:]
+        except (OSError, ValueError):
+            self.discard(entry.key)
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def store(self, key: str, etag: str, data: bytes) -> CacheEntry:
+        base = self._base_path(key)
+        path = f"{base}.bin"
+
+        # Write to temp files and rename so readers in other processes never see a partial body
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        fd, tmp_etag_path = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, "w") as f:
+            f.write(etag)
+        os.replace(tmp_etag_path, f"{base}.etag")
+
+        entry = CacheEntry(key=key, etag=etag, path=path, size=len(data), validated_at=time.time())
+        digest = self._digest(key)
+        with self._lock:
+            self._pop(digest)
+            self._entries[digest] = entry
+            self._total_bytes += entry.size
+            if time.monotonic() - self._scanned_at > self.rescan_interval:
+                self._scan()
+            else:
+                self._evict()
+        return entry
+
+    def discard(self, key: str):
+        with self._lock:
+            self._pop(self._digest(key))
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "revalidations": self.revalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "cache_dir": self.cache_dir,
+            }
+
+
+object_cache = ObjectCache(
+    cache_dir=os.environ.get("OBJECT_CACHE_DIR", DEFAULT_CACHE_DIR),
+    max_bytes=int(os.environ.get("OBJECT_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024,
+)
@@ -0,0 +1,58 @@
+import hashlib
+import re
+import zlib
+from typing import Optional
+import numpy as np
+
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16  # 16 bands of 4 rows: pages above ~0.5 Jaccard usually share a band
+SHINGLE_WORDS = 5
+MIN_WORDS = 30  # pages with less text (blank, drawings, scans without OCR) are not fingerprinted
+NEAR_DUPLICATE_THRESHOLD = 0.9  # estimated Jaccard similarity for a page to count as a near duplicate
+
+_PRIME = np.uint64(4294967291)  # largest prime below 2^32, so a * h + b stays inside uint64
+_rng = np.random.default_rng(0x5EED)  # fixed seed: signatures must be comparable across processes and runs
+_A = _rng.integers(1, int(_PRIME), NUM_PERMUTATIONS, dtype=np.uint64)[:, None]
+_B = _rng.integers(0, int(_PRIME), NUM_PERMUTATIONS, dtype=np.uint64)[:, None]
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_page_words(text: str) -> list[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def minhash_signature(words: list[str]) -> list[int]:
+    """MinHash over word shingles, one 32-bit universal hash per permutation"""
+    shingles = {
+        " ".join(words[i:i + SHINGLE_WORDS])
+        for i in range(max(1, len(words) - SHINGLE_WORDS + 1))
+    }
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((_A * hashes + _B) % _PRIME).min(axis=1).tolist()
+
+
+def page_fingerprint(text: str) -> Optional[dict]:
+    """Normalized text hash plus MinHash signature, or None for pages with too little text to compare"""
+    words = normalize_page_words(text)
+    if len(words) < MIN_WORDS:
+        return None
+    return {
+        "text_hash": hashlib.sha256(" ".join(words).encode("utf-8")).hexdigest(),
+        "minhash": minhash_signature(words),
+    }
+
+
+def lsh_bands(signature: list[int]) -> list[str]:
+    rows = len(signature) // LSH_BANDS
+    return [
+        hashlib.blake2b(
+            f"{band}:{','.join(map(str, signature[band * rows:(band + 1) * rows]))}".encode("utf-8"),
+            digest_size=8
+        ).hexdigest()
+        for band in range(LSH_BANDS)
+    ]
+
+
+def estimate_similarity(signature_a: list[int], signature_b: list[int]) -> float:
+    return sum(a == b for a, b in zip(signature_a, signature_b)) / len(signature_a)
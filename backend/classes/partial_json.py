@@ -0,0 +1,74 @@
+import json
+from typing import Iterable
+
+
+class StreamingArrayParser:
+    """
+    Pulls completed elements out of top-level array fields of a JSON object while it is still
+    being generated, e.g. each requirement finding as soon as its closing brace arrives.
+
+    feed() takes the next chunk of text and returns [(field, element)] for every element of a
+    watched array that completed within it. Only the element being read is buffered.
+    """
+
+    def __init__(self, fields: Iterable[str]):
+        self.fields = set(fields)
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.string_chars: list[str] = []
+        self.last_string = None  # most recent string at depth 1, the key once a ':' follows
+        self.current_key = None
+        self.array_field = None  # watched array currently open at depth 2
+        self.element: list[str] = []
+
+    def feed(self, text: str) -> list[tuple[str, object]]:
+        completed = []
+        for char in text:
+            if self.array_field is not None:
+                # Commas, whitespace and the closing bracket between elements are not part of one
+                between_elements = not self.in_string and self.depth == 2 and (char in ",]" or char.isspace())
+                if not between_elements:
+                    self.element.append(char)
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        self.last_string = "".join(self.string_chars)
+                elif self.depth == 1:
+                    self.string_chars.append(char)
+                continue
+
+            if char == '"':
+                self.in_string = True
+                self.string_chars = []
+            elif char == ":" and self.depth == 1:
+                self.current_key = self.last_string
+            elif char in "{[":
+                self.depth += 1
+                if char == "[" and self.depth == 2 and self.current_key in self.fields:
+                    self.array_field = self.current_key
+                    self.element = []
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 1 and self.array_field is not None:
+                    completed.extend(self._flush())
+                    self.array_field = None
+            elif char == "," and self.depth == 2 and self.array_field is not None:
+                completed.extend(self._flush())
+        return completed
+
+    def _flush(self) -> list[tuple[str, object]]:
+        raw = "".join(self.element).strip()
+        self.element = []
+        if not raw:
+            return []
+        try:
+            return [(self.array_field, json.loads(raw))]
+        except json.JSONDecodeError:
+            return []
@@ -60,6 +60,31 @@ class PDFPageConverter(OCRQualityChecker):
         """Return True if the page has any images."""
         return len(page.get_images(full=True)) > 0
 
+    def extract_page_text(
+        self,
+        page: fitz.Page,
+        page_index: int,
+        total_pages: int,
+        dpi: int = 200,
+        grayscale: bool = False
+    ) -> str:
+        """
+        Text for a page as pdf_page_converter_generator would yield it (native text, or OCR text for
+        pages without usable text), without rasterizing pages that only need their text layer.
+        """
+        text = self.get_text(page)
+        if self._passes_quality(*self._text_quality_metrics(text)):
+            return text
+
+        ocr_text = self.ocr_quality_assurance(
+            page,
+            page_index,
+            total_pages,
+            dpi_start=dpi,
+            grayscale=grayscale
+        )
+        return ocr_text["text"] if ocr_text["passes"] else ""
+
     # ---------- Core generator ----------
 
     def pdf_page_converter_generator(
@@ -204,8 +229,7 @@ class PDFPageConverter(OCRQualityChecker):
         doc = fitz.open()
         for page_index in page_indices:
             key = f"{spec_id}/original_pages/page_{page_index:04d}.pdf"
-            response = await s3_client.get_object(Bucket=s3.bucket_name, Key=key)
-            page_bytes = await response["Body"].read()
+            page_bytes = await s3.get_object_with_client(key, s3_client)
             src = fitz.open(stream=page_bytes, filetype="pdf")
             doc.insert_pdf(src)
             src.close()
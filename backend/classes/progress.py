@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Dict, Optional, Set
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETENTION_SECONDS = 600  # how long a finished spec's events stay available to late subscribers
+DEFAULT_KEEPALIVE_SECONDS = 15
+
+
+class ProgressHub:
+    """
+    In-process fan-out of pipeline progress events, keyed by spec_id.
+
+    The latest event per stage is kept as a snapshot, so a client that connects late (or
+    reconnects) first receives the current state and then live events. A terminal event ends every
+    subscription for that spec.
+    """
+
+    def __init__(
+        self,
+        retention_seconds: float = DEFAULT_RETENTION_SECONDS,
+        keepalive_seconds: float = DEFAULT_KEEPALIVE_SECONDS,
+    ):
+        self.retention_seconds = retention_seconds
+        self.keepalive_seconds = keepalive_seconds
+        self._snapshots: Dict[str, Dict[str, dict]] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def publish(self, spec_id: str, stage: str, terminal: bool = False, **data):
+        event = {
+            "spec_id": spec_id,
+            "stage": stage,
+            "terminal": terminal,
+            "timestamp": time.time(),
+            **data,
+        }
+        self._snapshots.setdefault(spec_id, {})[stage] = event
+        for queue in self._subscribers.get(spec_id, ()):
+            queue.put_nowait(event)
+
+        if terminal:
+            try:
+                asyncio.get_running_loop().call_later(self.retention_seconds, self._forget, spec_id, event)
+            except RuntimeError:
+                pass
+
+    def snapshot(self, spec_id: str) -> Dict[str, dict]:
+        return dict(self._snapshots.get(spec_id, {}))
+
+    async def subscribe(self, spec_id: str) -> AsyncIterator[Optional[dict]]:
+        """Yield the current snapshot, then live events. None is yielded as a keepalive tick."""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(spec_id, set()).add(queue)
+        try:
+            for event in self.snapshot(spec_id).values():
+                yield event
+                if event["terminal"]:
+                    return
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=self.keepalive_seconds)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+                if event["terminal"]:
+                    return
+        finally:
+            subscribers = self._subscribers.get(spec_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[spec_id]
+
+    def _forget(self, spec_id: str, terminal_event: dict):
+        # A newer run for the same spec may have published since; only drop our own snapshot
+        snapshot = self._snapshots.get(spec_id)
+        if snapshot and snapshot.get(terminal_event["stage"]) is terminal_event:
+            del self._snapshots[spec_id]
+
+
+progress_hub = ProgressHub()
@@ -0,0 +1,47 @@
+from typing import Optional
+
+# Shortest prompt prefix the API writes to the prompt cache for Sonnet models; below it cache_control is ignored
+MIN_CACHEABLE_PROMPT_TOKENS = 1024
+
+
+class PromptCacheStats:
+    """
+    Prompt caching accounting from the usage block of every response, realtime and batch.
+    input_tokens in usage counts only the uncached part of the prompt, so the share of the prompt
+    served from the cache is cache_read / (input + cache_read + cache_creation). Counters are per process.
+    """
+
+    def __init__(self):
+        self.requests = {"realtime": 0, "batch": 0}
+        self.requests_with_cache_read = {"realtime": 0, "batch": 0}
+        self.input_tokens = {"realtime": 0, "batch": 0}
+        self.cache_read_input_tokens = {"realtime": 0, "batch": 0}
+        self.cache_creation_input_tokens = {"realtime": 0, "batch": 0}
+
+    def record(self, usage: Optional[dict], source: str = "batch"):
+        if not usage:
+            return
+        cache_read = usage.get("cache_read_input_tokens") or 0
+        self.requests[source] += 1
+        self.requests_with_cache_read[source] += 1 if cache_read else 0
+        self.input_tokens[source] += usage.get("input_tokens") or 0
+        self.cache_read_input_tokens[source] += cache_read
+        self.cache_creation_input_tokens[source] += usage.get("cache_creation_input_tokens") or 0
+
+    def summary(self, source: str) -> dict:
+        prompt_tokens = (
+            self.input_tokens[source] + self.cache_read_input_tokens[source] + self.cache_creation_input_tokens[source])
+        return {
+            "requests": self.requests[source],
+            "requests_with_cache_read": self.requests_with_cache_read[source],
+            "input_tokens": self.input_tokens[source],
+            "cache_read_input_tokens": self.cache_read_input_tokens[source],
+            "cache_creation_input_tokens": self.cache_creation_input_tokens[source],
+            "cached_prompt_share": round(self.cache_read_input_tokens[source] / prompt_tokens, 4) if prompt_tokens else None,
+        }
+
+    def stats(self) -> dict:
+        return {source: self.summary(source) for source in self.requests}
+
+
+prompt_cache_stats = PromptCacheStats()
@@ -0,0 +1,192 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+DEFAULT_CONCURRENCY = int(os.getenv("LLM_REALTIME_CONCURRENCY", "8"))
+DEFAULT_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REALTIME_RPM", "1000"))
+DEFAULT_INPUT_TOKENS_PER_MINUTE = int(os.getenv("LLM_INPUT_TPM", "450000"))
+DEFAULT_OUTPUT_TOKENS_PER_MINUTE = int(os.getenv("LLM_OUTPUT_TPM", "90000"))
+
+# Lower runs first: someone waiting on a route beats background jobs
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+
+class TokenBucket:
+    """Refills continuously to capacity over one minute. The level may go negative when actual usage exceeds the reservation."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def clamp(self, amount: float) -> float:
+        # A single request larger than the bucket would otherwise wait forever
+        return min(amount, self.capacity)
+
+    def seconds_until(self, amount: float) -> float:
+        return max(0.0, (amount - self.level) / self.rate)
+
+
+class Reservation:
+    """Tokens taken for one request; settle() corrects the buckets once actual usage is known"""
+
+    def __init__(self, limiter: "RateLimiter", input_tokens: float, output_tokens: float):
+        self.limiter = limiter
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.settled = False
+
+    def settle(self, usage: Optional[dict]):
+        """Usage from the response. Cache reads do not count toward the input limit, cache writes do."""
+        if self.settled or not usage:
+            return
+        self.settled = True
+        actual_input = (usage.get("input_tokens") or 0) + (usage.get("cache_creation_input_tokens") or 0)
+        actual_output = usage.get("output_tokens") or 0
+        self.limiter._adjust(self.input_tokens - actual_input, self.output_tokens - actual_output)
+
+
+class RateLimiter:
+    """
+    Process-wide limiter shared by every realtime Claude call and token count.
+
+    Requests wait in a priority queue (lowest priority value first, FIFO within a priority) until
+    there is a free concurrency slot and the requests, input token and output token buckets can
+    cover the request's estimate. Output is reserved at max_tokens, as the API does, and refunded
+    when the response reports actual usage. A 429 or 529 pauses everyone for the retry-after period.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        requests_per_minute: int = DEFAULT_REQUESTS_PER_MINUTE,
+        input_tokens_per_minute: int = DEFAULT_INPUT_TOKENS_PER_MINUTE,
+        output_tokens_per_minute: int = DEFAULT_OUTPUT_TOKENS_PER_MINUTE,
+    ):
+        self.concurrency = concurrency
+        self.requests_per_minute = requests_per_minute
+        self.requests = TokenBucket(requests_per_minute)
+        self.input_tokens = TokenBucket(input_tokens_per_minute)
+        self.output_tokens = TokenBucket(output_tokens_per_minute)
+
+        self._condition = asyncio.Condition()
+        self._queue: list[tuple[int, int]] = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+
+        self.in_flight = 0
+        self.started = 0
+        self.waited_seconds = 0.0
+        self.rate_limit_pauses = 0
+
+    # ---------- Scheduling ----------
+
+    def _seconds_until_available(self, input_tokens: float, output_tokens: float) -> Optional[float]:
+        """0 when the request can start now, the wait otherwise; None while every slot is busy"""
+        if self.in_flight >= self.concurrency:
+            return None
+        now = time.monotonic()
+        for bucket in (self.requests, self.input_tokens, self.output_tokens):
+            bucket.refill(now)
+        return max(
+            self._paused_until - now,
+            self.requests.seconds_until(1),
+            self.input_tokens.seconds_until(input_tokens),
+            self.output_tokens.seconds_until(output_tokens),
+            0.0,
+        )
+
+    async def acquire(self, input_tokens: float = 0, output_tokens: float = 0, priority: int = PRIORITY_INTERACTIVE) -> Reservation:
+        input_tokens = self.input_tokens.clamp(input_tokens)
+        output_tokens = self.output_tokens.clamp(output_tokens)
+        entry = (priority, next(self._sequence))
+        started_waiting = time.monotonic()
+
+        async with self._condition:
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    delay = None
+                    if self._queue[0] == entry:
+                        delay = self._seconds_until_available(input_tokens, output_tokens)
+                        if delay == 0:
+                            break
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._condition.notify_all()
+                raise
+
+            heapq.heappop(self._queue)
+            self.requests.level -= 1
+            self.input_tokens.level -= input_tokens
+            self.output_tokens.level -= output_tokens
+            self.in_flight += 1
+            self.started += 1
+            self.waited_seconds += time.monotonic() - started_waiting
+            # The next in line may be able to start too
+            self._condition.notify_all()
+
+        return Reservation(self, input_tokens, output_tokens)
+
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    @asynccontextmanager
+    async def slot(self, input_tokens: float = 0, output_tokens: float = 0, priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[Reservation]:
+        reservation = await self.acquire(input_tokens, output_tokens, priority)
+        try:
+            yield reservation
+        finally:
+            await self.release()
+
+    def _adjust(self, input_tokens: float, output_tokens: float):
+        self.input_tokens.level = min(self.input_tokens.capacity, self.input_tokens.level + input_tokens)
+        self.output_tokens.level = min(self.output_tokens.capacity, self.output_tokens.level + output_tokens)
+
+    async def pause(self, seconds: float):
+        """Hold every queued request for seconds, e.g. the retry-after of a 429"""
+        async with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self.rate_limit_pauses += 1
+            self._condition.notify_all()
+
+    # ---------- Metrics ----------
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        for bucket in (self.requests, self.input_tokens, self.output_tokens):
+            bucket.refill(now)
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "queued": len(self._queue),
+            "started": self.started,
+            "waited_seconds": round(self.waited_seconds, 1),
+            "rate_limit_pauses": self.rate_limit_pauses,
+            "paused_for": round(max(0.0, self._paused_until - now), 1),
+            "available": {
+                "requests": int(self.requests.level),
+                "input_tokens": int(self.input_tokens.level),
+                "output_tokens": int(self.output_tokens.level),
+            },
+        }
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import AsyncIterator, Dict, List, Optional
+from classes.db import db as default_db, ModuDB
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bump to invalidate every cached response, e.g. when results are parsed differently
+RESPONSE_CACHE_VERSION = 1
+
+DEFAULT_TTL_DAYS = 30
+DEFAULT_MAX_MB = 512
+DEFAULT_EVICT_EVERY = 500  # stored responses between eviction passes
+
+
+class ResponseCache:
+    """
+    Persistent cache of Claude responses, keyed by a hash of everything that shapes the answer:
+    cache version, model, max_tokens, system prompt, output schema and the content sent.
+
+    Document blocks that point at presigned URLs are keyed by the content hash of the object
+    behind the URL (its S3 ETag), never by the URL itself, so a retry or regeneration of the same
+    pages hits the cache even though the signed URLs differ. Entries expire after ttl_seconds and
+    the least recently used are evicted once the table grows past max_bytes. Hit/miss counters are
+    per process.
+    """
+
+    def __init__(
+        self,
+        database: ModuDB = default_db,
+        ttl_seconds: float = DEFAULT_TTL_DAYS * 24 * 3600,
+        max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024,
+        evict_every: int = DEFAULT_EVICT_EVERY,
+        enabled: bool = os.getenv("LLM_RESPONSE_CACHE", "1") != "0",
+    ):
+        self.db = database
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self.enabled = enabled
+
+        self._stores_since_evict = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.saved_input_tokens = 0
+        self.saved_output_tokens = 0
+
+    # ---------- Keys ----------
+
+    def _normalize_content(self, value, source_hashes: Dict[str, str]):
+        """Drop cache_control markers and swap URL sources for content hashes; None if a URL has no hash"""
+        if isinstance(value, list):
+            items = [self._normalize_content(item, source_hashes) for item in value]
+            return None if any(item is None for item in items) else items
+        if not isinstance(value, dict):
+            return value
+
+        if value.get("type") == "url":
+            content_hash = source_hashes.get(value.get("url"))
+            return {"type": "content_hash", "hash": content_hash} if content_hash else None
+
+        normalized = {}
+        for k, v in value.items():
+            if k == "cache_control":
+                continue
+            v = self._normalize_content(v, source_hashes)
+            if v is None:
+                return None
+            normalized[k] = v
+        return normalized
+
+    def make_key(
+        self,
+        model: str,
+        max_tokens: int,
+        system_prompt,
+        schema: dict,
+        content_blocks: List[dict],
+        source_hashes: Optional[Dict[str, str]] = None,
+        options: Optional[dict] = None
+    ) -> Optional[str]:
+        """Cache key for a request, or None when it cannot be cached (a URL source without a content hash)"""
+        content = self._normalize_content(content_blocks, source_hashes or {})
+        system = self._normalize_content(system_prompt, {})
+        if content is None or system is None:
+            return None
+
+        key_material = json.dumps({
+            "version": RESPONSE_CACHE_VERSION,
+            "model": model,
+            "max_tokens": max_tokens,
+            "system": hashlib.sha256(json.dumps(system, sort_keys=True).encode("utf-8")).hexdigest(),
+            "schema": hashlib.sha256(json.dumps(schema, sort_keys=True).encode("utf-8")).hexdigest(),
+            "content": hashlib.sha256(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest(),
+            "options": options or {},
+        }, sort_keys=True)
+        return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+    # ---------- Lookups ----------
+
+    async def get_many(self, cache_keys: List[str]) -> Dict[str, dict]:
+        """Cached entries (response, input_tokens, output_tokens) by key; counts hits and misses"""
+        if not self.enabled or not cache_keys:
+            return {}
+
+        now = time.time()
+        found = await self.db.get_llm_responses(list(set(cache_keys)), now - self.ttl_seconds)
+        if found:
+            await self.db.touch_llm_responses(list(found), now)
+
+        hits = sum(1 for key in cache_keys if key in found)
+        self.hits += hits
+        self.misses += len(cache_keys) - hits
+        for key in cache_keys:
+            if key in found:
+                self.saved_input_tokens += found[key]["input_tokens"]
+                self.saved_output_tokens += found[key]["output_tokens"]
+        return found
+
+    async def get(self, cache_key: Optional[str]) -> Optional[dict]:
+        if cache_key is None:
+            return None
+        return (await self.get_many([cache_key])).get(cache_key)
+
+    async def iter_results(self, cache_keys: Dict[str, str]) -> AsyncIterator[dict]:
+        """
+        Yield cached responses for {custom_id: cache_key} shaped like parsed batch results. An entry
+        that expired since it was looked up comes back errored, so the normal retry path re-runs it.
+        """
+        found = await self.get_many(list(cache_keys.values()))
+        for custom_id, cache_key in cache_keys.items():
+            entry = found.get(cache_key)
+            if entry is None:
+                yield {"custom_id": custom_id, "type": "errored", "error": "Cached response expired"}
+                continue
+            yield {
+                "custom_id": custom_id,
+                "content": entry["response"],
+                "usage": {"input_tokens": entry["input_tokens"], "output_tokens": entry["output_tokens"]},
+                "cached": True,
+            }
+
+    # ---------- Stores ----------
+
+    def entry_from_result(self, item: dict, cache_key: Optional[str]) -> Optional[dict]:
+        """Cache entry for a parsed batch result; None for errored, truncated or already cached results"""
+        if not cache_key or item.get("cached") or "content" not in item:
+            return None
+        if item.get("stop_reason") != "end_turn" or "raw" in item["content"]:
+            return None
+        usage = item.get("usage") or {}
+        return {
+            "cache_key": cache_key,
+            "model": item.get("model") or "",
+            "response": item["content"],
+            "input_tokens": usage.get("input_tokens", 0),
+            "output_tokens": usage.get("output_tokens", 0),
+        }
+
+    async def put_many(self, entries: List[dict]):
+        """entries: dicts with cache_key, model, response, input_tokens, output_tokens"""
+        entries = [entry for entry in entries if entry.get("cache_key")]
+        if not self.enabled or not entries:
+            return
+
+        await self.db.put_llm_responses(entries, time.time())
+        self.stores += len(entries)
+        self._stores_since_evict += len(entries)
+        if self._stores_since_evict >= self.evict_every:
+            await self.evict()
+
+    async def put(self, cache_key: Optional[str], model: str, response: dict, input_tokens: int = 0, output_tokens: int = 0):
+        await self.put_many([{
+            "cache_key": cache_key,
+            "model": model,
+            "response": response,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+        }])
+
+    async def evict(self) -> int:
+        self._stores_since_evict = 0
+        evicted = await self.db.evict_llm_responses(time.time() - self.ttl_seconds, self.max_bytes)
+        self.evictions += evicted
+        if evicted:
+            logger.info(f"Evicted {evicted} cached LLM response(s)")
+        return evicted
+
+    # ---------- Metrics ----------
+
+    async def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "saved_input_tokens": self.saved_input_tokens,
+            "saved_output_tokens": self.saved_output_tokens,
+            **await self.db.get_llm_response_totals(),
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+response_cache = ResponseCache()
@@ -1,8 +1,11 @@
 from botocore.config import Config
+from botocore.exceptions import ClientError
 from quart.datastructures import FileStorage
-from typing import Optional, AsyncGenerator
+from typing import Callable, Optional, AsyncGenerator
 from classes.pdf_page_converter import PDFPageConverter
 from classes.typed_dicts import HybridPage, PdfPageConverterResult
+from classes.object_cache import object_cache
+from classes.page_fingerprint import page_fingerprint
 import aioboto3
 import os
 import dotenv
@@ -13,6 +16,10 @@ import asyncio
 import threading
 import base64
 import io
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
 from PIL import Image
 
 dotenv.load_dotenv()
@@ -20,12 +27,97 @@ dotenv.load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+MULTIPART_THRESHOLD = 16 * 1024 * 1024  # files at or below this go up in a single put_object
+MULTIPART_PART_SIZE = 16 * 1024 * 1024  # S3 minimum is 5MB for every part but the last
+MULTIPART_CONCURRENCY = 4  # parts in flight per file, so at most PART_SIZE * CONCURRENCY is held in memory
+
+
+def split_pdf_page_range(pdf_path: str, start_index: int, end_index: int) -> dict:
+    """
+    Process pool worker: split pages [start_index, end_index) of the PDF at pdf_path into
+    standalone single-page PDFs. garbage=3 drops unused objects and merges duplicated shared
+    resources (fonts, images) so each page only carries what it references. Each page's text is
+    fingerprinted on the way for cross-spec duplicate detection, and its size features (text
+    characters, images, page area in square inches, PDF bytes) are kept for token estimation.
+    """
+    start_time = time.perf_counter()
+    pages: list[tuple[int, bytes]] = []
+    fingerprints: list[dict] = []
+    page_features: list[dict] = []
+
+    src = fitz.open(pdf_path)
+    try:
+        for page_index in range(start_index, end_index):
+            doc = fitz.open()
+            doc.insert_pdf(src, from_page=page_index, to_page=page_index)
+            # no_new_id keeps the bytes (and so the S3 ETag) identical when the same PDF is split again
+            page_bytes = doc.tobytes(garbage=3, deflate=True, no_new_id=True)
+            pages.append((page_index, page_bytes))
+            doc.close()
+
+            page = src[page_index]
+            text = page.get_text()
+            fingerprint = page_fingerprint(text)
+            if fingerprint:
+                fingerprints.append({"page_index": page_index, **fingerprint})
+            page_features.append({
+                "page_index": page_index,
+                "chars": len(text),
+                "images": len(page.get_images()),
+                "area": round(page.rect.width * page.rect.height / (72 * 72), 2),
+                "bytes": len(page_bytes),
+            })
+    finally:
+        src.close()
+
+    return {
+        "pages": pages,
+        "fingerprints": fingerprints,
+        "page_features": page_features,
+        "seconds": time.perf_counter() - start_time,
+    }
+
+
+def write_temp_pdf(pdf: bytes) -> str:
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        tmp.write(pdf)
+        return tmp.name
+
+
+def read_file_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def read_file_range(path: str, offset: int, size: int) -> bytes:
+    with open(path, "rb") as f:
+        return os.pread(f.fileno(), size, offset)
+
+
+def merge_pdf_files(paths: list[str], out_path: str) -> str:
+    """Concatenate local PDFs into out_path; used when a spec is uploaded as several files"""
+    merged_doc = fitz.open()
+    try:
+        for path in paths:
+            with fitz.open(path) as src_doc:
+                merged_doc.insert_pdf(src_doc)
+        merged_doc.save(out_path, garbage=1)
+    finally:
+        merged_doc.close()
+    return out_path
+
+
+def pdf_page_count(pdf_path: str) -> int:
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
 
 class S3Bucket(PDFPageConverter):
     def __init__(self):
         super().__init__()
         self.bucket_name = os.environ.get("BUCKET_NAME")
         self._session = aioboto3.Session()
+        self.object_cache = object_cache
 
     def s3_client(self):
         return self._session.client(
@@ -82,11 +174,8 @@ class S3Bucket(PDFPageConverter):
 
     async def pdf_page_to_png(self, key: str, s3_client: any) -> str:
         doc = None
-        body = None
         try:
-            response = await s3_client.get_object(Bucket=self.bucket_name, Key=key)
-            body = response["Body"]
-            pdf_bytes = await body.read()
+            pdf_bytes = await self.get_object_with_client(key, s3_client)
 
             doc = fitz.open(stream=pdf_bytes, filetype="pdf")
             page = doc.load_page(0)
@@ -111,8 +200,6 @@ class S3Bucket(PDFPageConverter):
         finally:
             if doc is not None:
                 doc.close()
-            if body is not None:
-                body.close()
 
     # ---------- Image compression ----------
 
@@ -142,13 +229,50 @@ class S3Bucket(PDFPageConverter):
 
     # ---------- Page retrieval ----------
 
-    async def get_object_with_client(self, key: str, s3_client: any):
-        response = await s3_client.get_object(Bucket=self.bucket_name, Key=key)
+    async def _read_object_response(self, response: dict) -> bytes:
         body = response["Body"]
         data = await body.read()
         body.close()
         return data
 
+    async def get_object_with_client(self, key: str, s3_client: any):
+        cache = self.object_cache
+        if cache is None or not cache.is_cacheable(key):
+            response = await s3_client.get_object(Bucket=self.bucket_name, Key=key)
+            return await self._read_object_response(response)
+
+        entry = cache.lookup(key)
+        if entry is not None:
+            if not cache.needs_revalidation(entry):
+                data = await asyncio.to_thread(cache.read, entry)
+                if data is not None:
+                    return data
+            else:
+                # Conditional GET: a 304 means the cached body still matches the object's ETag
+                try:
+                    response = await s3_client.get_object(Bucket=self.bucket_name, Key=key, IfNoneMatch=entry.etag)
+                except ClientError as e:
+                    if e.response.get("Error", {}).get("Code") not in ("304", "NotModified"):
+                        raise
+                    cache.mark_validated(entry)
+                    data = await asyncio.to_thread(cache.read, entry)
+                    if data is not None:
+                        return data
+                else:
+                    data = await self._read_object_response(response)
+                    cache.record_miss()
+                    await asyncio.to_thread(cache.store, key, response["ETag"], data)
+                    return data
+
+        cache.record_miss()
+        response = await s3_client.get_object(Bucket=self.bucket_name, Key=key)
+        data = await self._read_object_response(response)
+        await asyncio.to_thread(cache.store, key, response["ETag"], data)
+        return data
+
+    def cache_stats(self) -> dict:
+        return self.object_cache.stats() if self.object_cache is not None else {}
+
     async def get_text_page_with_client(
         self,
         spec_id: str,
@@ -191,9 +315,8 @@ class S3Bucket(PDFPageConverter):
         if page_index < 0:
             raise ValueError("Page index must be greater than or equal to 0")
 
-        spec_check = await self.get_original_pdf_with_client(spec_id, s3_client)
-        if spec_check["status_code"] != 200:
-            raise ValueError(spec_check["data"])
+        if not await self.check_pdf_exists_with_client(spec_id, s3_client):
+            raise ValueError("No original PDFs found")
 
         text_result, image_result = await asyncio.gather(
             self.get_text_page_with_client(spec_id, page_index, s3_client, prefix),
@@ -261,6 +384,87 @@ class S3Bucket(PDFPageConverter):
             "status_code": 200
         }
 
+    async def upload_file_with_client(
+        self,
+        path: str,
+        key: str,
+        content_type: str,
+        s3_client: any,
+        part_size: int = MULTIPART_PART_SIZE,
+        concurrency: int = MULTIPART_CONCURRENCY
+    ) -> dict:
+        """
+        Upload a local file without reading it into memory whole. Files above MULTIPART_THRESHOLD
+        are sent as a multipart upload, with up to `concurrency` parts read and uploaded at once.
+        A failed multipart upload is aborted so no orphaned parts are left behind.
+        """
+        size = os.path.getsize(path)
+        if size <= MULTIPART_THRESHOLD:
+            body = await asyncio.to_thread(read_file_bytes, path)
+            return await self.put_object_with_client(key, body, content_type, s3_client)
+
+        upload = await s3_client.create_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=key,
+            ContentType=content_type,
+            ServerSideEncryption="AES256"
+        )
+        upload_id = upload["UploadId"]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def upload_part(part_number: int, offset: int) -> dict:
+            async with semaphore:
+                body = await asyncio.to_thread(read_file_range, path, offset, min(part_size, size - offset))
+                response = await s3_client.upload_part(
+                    Bucket=self.bucket_name,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=body
+                )
+                return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+        try:
+            parts = await asyncio.gather(*[
+                upload_part(part_number, offset)
+                for part_number, offset in enumerate(range(0, size, part_size), start=1)
+            ])
+            await s3_client.complete_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts}
+            )
+            logger.info(f"Uploaded {key} in {len(parts)} parts ({size / 1024 / 1024:.1f}MB)")
+            return {"message": "Object uploaded successfully", "status_code": 200}
+        except Exception as e:
+            logger.error(f"Error in multipart upload of {key}: {e}")
+            try:
+                await s3_client.abort_multipart_upload(Bucket=self.bucket_name, Key=key, UploadId=upload_id)
+            except Exception as abort_error:
+                logger.error(f"Error aborting multipart upload of {key}: {abort_error}")
+            return {"message": f"Error uploading object: {str(e)}", "status_code": 400}
+
+    async def upload_original_pdf_files_with_client(self, paths: list[str], spec_id: str, s3: any) -> dict:
+        """Same as upload_original_pdf_with_client for uploads already spooled to local files"""
+        successes: int = 0
+        for i, path in enumerate(paths):
+            result = await self.upload_file_with_client(
+                path, f"{spec_id}/original/{i+1}", "application/pdf", s3)
+            if result["status_code"] != 200:
+                logger.error(f"Error uploading original PDF {i+1} to S3 bucket: {result['message']}")
+                return {
+                    "message": f"Error uploading original PDF {i+1} to S3 bucket: {result['message']}",
+                    "status_code": 400
+                }
+            logger.info(f"Uploaded original PDF {i+1} to S3 bucket")
+            successes += 1
+        return {
+            "message": f"{successes}/{len(paths)} original PDFs uploaded to S3 bucket",
+            "spec_id": spec_id,
+            "status_code": 200
+        }
+
     async def get_original_pdf_with_client(self, spec_id: str, s3_client: any) -> dict:
         if not spec_id:
             raise ValueError("Spec ID is required")
@@ -309,29 +513,118 @@ class S3Bucket(PDFPageConverter):
             count += len(page.get("Contents", []))
         return count
 
-    async def upload_original_pdf_pages(self, pdf: bytes, spec_id: str, s3_client) -> dict:
-        src = fitz.open(stream=pdf, filetype="pdf")
-        total_pages = src.page_count
-
-        async def upload_page(page_index: int):
-            doc = fitz.open()
-            doc.insert_pdf(src, from_page=page_index, to_page=page_index)
-            page_bytes = doc.tobytes()
-            doc.close()
-
-            key = f"{spec_id}/original_pages/page_{page_index:04d}.pdf"
-            await s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=key,
-                Body=page_bytes,
-                ContentType="application/pdf"
-            )
-            logger.info(f"Uploaded original PDF page {page_index} to S3 bucket")
+    async def upload_original_pdf_pages(
+        self,
+        pdf: Optional[bytes],
+        spec_id: str,
+        s3_client,
+        workers: int = 4,
+        shard_size: int = 50,
+        upload_concurrency: int = 32,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        pdf_path: Optional[str] = None,
+        executor: Optional[Executor] = None,
+    ) -> dict:
+        """
+        Split the PDF into single-page PDFs and upload them to {spec_id}/original_pages/.
+
+        PyMuPDF work runs in a process pool over page-range shards so the event loop stays free.
+        At most workers * 2 shards are in flight, and finished pages are streamed through a bounded
+        queue to upload_concurrency uploaders. on_progress(pages_done, total_pages) is called as
+        each page upload finishes. Pass pdf_path instead of pdf for a PDF already on local disk;
+        the workers open it directly and the file is left in place. Pass executor to split in a
+        process pool shared with other work (it is not shut down here); workers still bounds the
+        shards in flight.
+        The result includes the page fingerprints (see classes/page_fingerprint.py) and page
+        features (see classes/token_estimator.py) for the caller to store.
+        """
+        start_time = time.perf_counter()
+        loop = asyncio.get_running_loop()
+
+        owns_pdf_path = pdf_path is None
+        if owns_pdf_path:
+            pdf_path = await asyncio.to_thread(write_temp_pdf, pdf)
+        try:
+            total_pages = await asyncio.to_thread(pdf_page_count, pdf_path)
+            shards = [(start, min(start + shard_size, total_pages))
+                      for start in range(0, total_pages, shard_size)]
 
-        await asyncio.gather(*[upload_page(page_index) for page_index in range(total_pages)])
+            queue: asyncio.Queue = asyncio.Queue(maxsize=upload_concurrency * 2)
+            STOP = object()
+            failed_pages: list[int] = []
+            fingerprints: list[dict] = []
+            page_features: list[dict] = []
+            pages_done = 0
+            split_worker_seconds = 0.0
+            split_done_at = start_time
+
+            async def producer():
+                nonlocal split_done_at
+                pool = executor or ProcessPoolExecutor(max_workers=workers)
+                try:
+                    in_flight = deque()
+                    for start_index, end_index in shards:
+                        in_flight.append(loop.run_in_executor(
+                            pool, split_pdf_page_range, pdf_path, start_index, end_index))
+                        if len(in_flight) >= workers * 2:
+                            await drain(await in_flight.popleft())
+                    while in_flight:
+                        await drain(await in_flight.popleft())
+                    split_done_at = time.perf_counter()
+                finally:
+                    if executor is None:
+                        # Joining the worker processes would block the event loop
+                        pool.shutdown(wait=False, cancel_futures=True)
+                    for _ in range(upload_concurrency):
+                        await queue.put(STOP)
+
+            async def drain(shard: dict):
+                nonlocal split_worker_seconds
+                split_worker_seconds += shard["seconds"]
+                fingerprints.extend(shard["fingerprints"])
+                page_features.extend(shard["page_features"])
+                for page in shard["pages"]:
+                    await queue.put(page)
+
+            async def uploader():
+                nonlocal pages_done
+                while True:
+                    item = await queue.get()
+                    if item is STOP:
+                        break
+                    page_index, page_bytes = item
+                    key = f"{spec_id}/original_pages/page_{page_index:04d}.pdf"
+                    result = await self.put_object_with_client(key, page_bytes, "application/pdf", s3_client)
+                    if result["status_code"] != 200:
+                        failed_pages.append(page_index)
+                    pages_done += 1
+                    if on_progress:
+                        on_progress(pages_done, total_pages)
+
+            await asyncio.gather(producer(), *(uploader() for _ in range(upload_concurrency)))
+        finally:
+            if owns_pdf_path:
+                os.remove(pdf_path)
+
+        end_time = time.perf_counter()
+        timings = {
+            "split_wall_seconds": round(split_done_at - start_time, 3),
+            "split_worker_seconds": round(split_worker_seconds, 3),
+            "upload_tail_seconds": round(end_time - split_done_at, 3),
+            "total_seconds": round(end_time - start_time, 3),
+        }
+        logger.info(
+            f"Uploaded {total_pages - len(failed_pages)}/{total_pages} original PDF pages for {spec_id} "
+            f"in {len(shards)} shard(s): {timings}")
 
-        src.close()
-        return {"total_pages": total_pages, "status_code": 200}
+        return {
+            "total_pages": total_pages,
+            "failed_pages": sorted(failed_pages),
+            "fingerprints": fingerprints,
+            "page_features": page_features,
+            "timings": timings,
+            "status_code": 200 if not failed_pages else 400
+        }
 
     # ---------- Page uploads ----------
 
@@ -535,6 +828,19 @@ class S3Bucket(PDFPageConverter):
 
     # ---------- S3 object listing ----------
 
+    async def get_object_etags_with_client(self, prefixes: list[str], s3_client: any) -> dict[str, str]:
+        """
+        ETags of every object under the given prefixes, one paginated listing per prefix. For the
+        single-part uploads used here the ETag is the MD5 of the body, so it doubles as a content hash.
+        """
+        etags: dict[str, str] = {}
+        paginator = s3_client.get_paginator("list_objects_v2")
+        for prefix in set(prefixes):
+            async for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+                for item in page.get("Contents", []):
+                    etags[item["Key"]] = item["ETag"].strip('"')
+        return etags
+
     async def get_objects_gen_with_client(self, s3_client: any, prefix: str = "") -> AsyncGenerator[list[dict], None]:
         paginator = s3_client.get_paginator("list_objects_v2")
         kwargs = {"Bucket": self.bucket_name}
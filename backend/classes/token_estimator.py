@@ -0,0 +1,285 @@
+import logging
+import os
+import re
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from classes.db import db as default_db, ModuDB
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Presigned URL of a split spec page, {spec_id}/original_pages/page_0001.pdf?X-Amz-...
+PAGE_URL_PATTERN = re.compile(r"/([0-9a-f-]{36})/original_pages/page_(\d{4})\.pdf")
+
+# Regression inputs per content type, after an intercept. "pdf" requests send split spec pages as
+# URL documents; "text" requests carry only text and images.
+FEATURES = {
+    "pdf": ("pages", "chars", "images", "area", "prompt_chars"),
+    "text": ("chars", "images"),
+}
+
+DEFAULT_MIN_SAMPLES = 30  # labelled samples before a content type is estimated from its own fit
+DEFAULT_MAX_SAMPLES = 5000  # most recent samples a fit uses
+DEFAULT_REFIT_EVERY = 200  # new labelled samples of a content type between refits
+MAX_CACHED_SPECS = 64  # specs whose page features are held in memory
+
+
+def prompt_tokens(usage: Optional[dict]) -> Optional[int]:
+    """Every prompt token of a response, whether it was billed as input, read from or written to the cache"""
+    if not usage or usage.get("input_tokens") is None:
+        return None
+    return (usage.get("input_tokens") or 0) + (usage.get("cache_read_input_tokens") or 0) + (
+        usage.get("cache_creation_input_tokens") or 0)
+
+
+class TokenEstimator:
+    """
+    Local estimate of a request's prompt tokens, learned from the usage Claude reports so batch
+    planning and rate limiting never wait on the count_tokens endpoint.
+
+    A request is reduced to a few features: the split spec pages it sends (their text characters,
+    images and page area, recorded when the PDF was split) and the characters of its prompt and
+    text blocks. Batch requests are registered with their features before submission and labelled
+    with usage.input_tokens (plus cache reads and writes) when the results are read; realtime
+    requests are recorded as they complete. A non-negative least squares fit per content type is
+    refreshed every refit_every new samples. Until a content type has min_samples samples,
+    estimate() returns None and callers keep their flat per-page constants.
+    """
+
+    def __init__(
+        self,
+        database: ModuDB = default_db,
+        min_samples: int = int(os.getenv("TOKEN_ESTIMATOR_MIN_SAMPLES", DEFAULT_MIN_SAMPLES)),
+        max_samples: int = DEFAULT_MAX_SAMPLES,
+        refit_every: int = DEFAULT_REFIT_EVERY,
+    ):
+        self.db = database
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.refit_every = refit_every
+
+        self.page_features: Dict[str, Dict[int, dict]] = {}
+        self.coefficients: Dict[str, np.ndarray] = {}
+        self.fits: Dict[str, dict] = {}
+
+        # Batch usage by custom_id, written on flush()
+        self._usage: Dict[str, int] = {}
+        self._labelled_since_fit = {content_type: 0 for content_type in FEATURES}
+
+        self.registered = 0
+        self.labelled = 0
+
+    # ---------- Features ----------
+
+    async def load_pages(self, spec_id: str):
+        """Load the page features of a spec; needed before its requests can be featurized"""
+        if spec_id in self.page_features:
+            return
+        features = await self.db.get_page_features(spec_id)
+        if not features:
+            return
+        while len(self.page_features) >= MAX_CACHED_SPECS:
+            self.page_features.pop(next(iter(self.page_features)))
+        self.page_features[spec_id] = features
+
+    def page(self, url: str) -> Optional[dict]:
+        match = PAGE_URL_PATTERN.search(url or "")
+        if not match:
+            return None
+        return self.page_features.get(match.group(1), {}).get(int(match.group(2)))
+
+    def request_features(self, system_prompt: Any, content: Any) -> Optional[Tuple[str, Dict[str, float]]]:
+        """
+        (content_type, features) of a system prompt plus message content, or None when a document
+        is not a split spec page with known features.
+        """
+        totals = {"pages": 0, "chars": 0, "images": 0, "area": 0.0, "prompt_chars": 0}
+
+        def walk(value: Any) -> bool:
+            if isinstance(value, str):
+                totals["prompt_chars"] += len(value)
+                return True
+            if isinstance(value, list):
+                return all(walk(item) for item in value)
+            if not isinstance(value, dict):
+                return True
+            if value.get("type") == "document":
+                page = self.page((value.get("source") or {}).get("url"))
+                if page is None:
+                    return False
+                totals["pages"] += 1
+                totals["chars"] += page["chars"]
+                totals["images"] += page["images"]
+                totals["area"] += page["area"]
+                return True
+            if value.get("type") == "image":
+                totals["images"] += 1
+                return True
+            if "content" in value:
+                return walk(value["content"])
+            return walk(value.get("text", ""))
+
+        if not walk(system_prompt) or not walk(content):
+            return None
+        if totals["pages"]:
+            return "pdf", totals
+        return "text", {"chars": totals["prompt_chars"], "images": totals["images"]}
+
+    def vector(self, content_type: str, features: Dict[str, float]) -> np.ndarray:
+        return np.array([1.0, *(float(features.get(name, 0)) for name in FEATURES[content_type])])
+
+    # ---------- Estimates ----------
+
+    def estimate(self, content_type: str, features: Dict[str, float], conservative: bool = False) -> Optional[int]:
+        """
+        Fitted prompt tokens, or None while the content type is uncalibrated. conservative scales
+        the estimate up to the 95th percentile of actual / estimated seen in the fit.
+        """
+        coefficients = self.coefficients.get(content_type)
+        if coefficients is None:
+            return None
+        estimate = max(0.0, float(self.vector(content_type, features) @ coefficients))
+        if conservative:
+            estimate *= max(1.0, self.fits[content_type]["p95_ratio"])
+        return int(estimate)
+
+    def estimate_request(self, system_prompt: Any, content: Any, conservative: bool = False) -> Optional[int]:
+        featurized = self.request_features(system_prompt, content)
+        return self.estimate(*featurized, conservative=conservative) if featurized else None
+
+    def page_costs(self, spec_id: str, pages: Sequence[int]) -> Optional[List[int]]:
+        """
+        Conservative marginal tokens of each split spec page, for planning how many pages fit one
+        request. None while uncalibrated or when a page has no recorded features.
+        """
+        coefficients = self.coefficients.get("pdf")
+        spec_pages = self.page_features.get(spec_id, {})
+        if coefficients is None or any(page not in spec_pages for page in pages):
+            return None
+        margin = max(1.0, self.fits["pdf"]["p95_ratio"])
+        per_page = dict(zip(FEATURES["pdf"], coefficients[1:]))
+        return [
+            int(margin * (
+                per_page["pages"] + per_page["chars"] * spec_pages[page]["chars"]
+                + per_page["images"] * spec_pages[page]["images"] + per_page["area"] * spec_pages[page]["area"]))
+            for page in pages
+        ]
+
+    # ---------- Samples ----------
+
+    async def register(self, requests: Iterable[dict]):
+        """Store the features of batch requests about to be submitted; their usage arrives with the results"""
+        samples = []
+        for request in requests:
+            featurized = self.request_features(request["params"]["system"], request["params"]["messages"])
+            if featurized:
+                samples.append({"custom_id": request["custom_id"], "content_type": featurized[0], "features": featurized[1]})
+        if not samples:
+            return
+        try:
+            await self.db.save_token_samples(samples, time.time())
+            self.registered += len(samples)
+        except Exception as e:
+            logger.warning(f"Could not register token samples: {e}")
+
+    def record_usage(self, custom_id: Optional[str], usage: Optional[dict]):
+        """Buffer the usage of one batch result; written by flush()"""
+        tokens = prompt_tokens(usage)
+        if custom_id and tokens is not None:
+            self._usage[custom_id] = tokens
+
+    async def flush(self):
+        """Label registered samples with the buffered usage and refit content types that gathered enough new samples"""
+        if not self._usage:
+            return
+        usage, self._usage = self._usage, {}
+        try:
+            labelled = await self.db.set_token_sample_usage(usage)
+        except Exception as e:
+            logger.warning(f"Could not record token usage: {e}")
+            return
+        await self._labelled(labelled)
+
+    async def record(self, system_prompt: Any, content: Any, usage: Optional[dict], custom_id: Optional[str] = None):
+        """Record a completed realtime request in one step"""
+        tokens = prompt_tokens(usage)
+        featurized = self.request_features(system_prompt, content) if tokens is not None else None
+        if not featurized:
+            return
+        content_type, features = featurized
+        try:
+            await self.db.save_token_samples([{
+                "custom_id": custom_id or f"realtime-{uuid.uuid4().hex}",
+                "content_type": content_type,
+                "features": features,
+                "input_tokens": tokens,
+            }], time.time())
+        except Exception as e:
+            logger.warning(f"Could not record token sample: {e}")
+            return
+        await self._labelled({content_type: 1})
+
+    async def _labelled(self, labelled: Dict[str, int]):
+        stale = []
+        for content_type, count in labelled.items():
+            self.labelled += count
+            self._labelled_since_fit[content_type] += count
+            if self._labelled_since_fit[content_type] >= self.refit_every or (
+                    content_type not in self.coefficients and self._labelled_since_fit[content_type] >= self.min_samples):
+                stale.append(content_type)
+        if stale:
+            await self.fit(stale)
+
+    # ---------- Fitting ----------
+
+    def solve(self, X: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Least squares with non-negative coefficients: features that fit negative are dropped and the rest refit"""
+        active = np.ones(X.shape[1], dtype=bool)
+        while True:
+            coefficients = np.zeros(X.shape[1])
+            coefficients[active] = np.linalg.lstsq(X[:, active], y, rcond=None)[0]
+            negative = coefficients < 0
+            if not negative.any():
+                return coefficients
+            active &= ~negative
+
+    async def fit(self, content_types: Optional[Iterable[str]] = None):
+        """Fit every content type (or the given ones) with enough labelled samples"""
+        for content_type in content_types or FEATURES:
+            try:
+                samples = await self.db.get_token_samples(content_type, self.max_samples)
+            except Exception as e:
+                logger.warning(f"Could not load token samples: {e}")
+                return
+            self._labelled_since_fit[content_type] = 0
+            if len(samples) < self.min_samples:
+                continue
+
+            X = np.array([self.vector(content_type, sample["features"]) for sample in samples])
+            y = np.array([sample["input_tokens"] for sample in samples], dtype=float)
+            coefficients = self.solve(X, y)
+            ratio = y / np.maximum(X @ coefficients, 1.0)
+
+            self.coefficients[content_type] = coefficients
+            self.fits[content_type] = {
+                "samples": len(samples),
+                "mean_abs_pct_error": round(float(np.mean(np.abs(ratio - 1))), 4),
+                "p95_ratio": round(float(np.percentile(ratio, 95)), 4),
+                "coefficients": dict(zip(("intercept", *FEATURES[content_type]), np.round(coefficients, 4).tolist())),
+                "fitted_at": time.time(),
+            }
+            logger.info(f"Token estimator fit for {content_type}: {self.fits[content_type]}")
+
+    def stats(self) -> dict:
+        return {
+            "fits": self.fits,
+            "registered": self.registered,
+            "labelled": self.labelled,
+            "pending_usage": len(self._usage),
+            "specs_loaded": len(self.page_features),
+        }
+
+
+token_estimator = TokenEstimator()
@@ -1,3 +1,3 @@
-from .section_numbers import divisions_and_sections
+from .masterformat_table import divisions_and_sections
 
 __all__ = ["divisions_and_sections"]
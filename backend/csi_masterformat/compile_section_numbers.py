@@ -0,0 +1,8 @@
+# Packs section_numbers.py into section_numbers.bin. Run from the backend folder:
+#   python -m csi_masterformat.compile_section_numbers
+import os
+from .masterformat_table import ARTIFACT_PATH, compile_table
+
+if __name__ == "__main__":
+    compiled = compile_table()
+    print(f"Wrote {len(compiled.codes)} sections ({os.path.getsize(ARTIFACT_PATH):,} bytes) to {ARTIFACT_PATH}")
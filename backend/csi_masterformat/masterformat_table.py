@@ -0,0 +1,242 @@
+"""
+Compact, lazily loaded view of the MasterFormat 2020 section table.
+
+section_numbers.py stays the editable source. compile_table() packs it into section_numbers.bin:
+
+    header   b"MSF1", entry count, title blob size (little-endian uint32s), sha256 of section_numbers.py
+    codes    sorted uint32 section codes                   (003132 -> 313200, 002413.13 -> 241313)
+    offsets  uint32 start of each title in the blob, plus a final end offset
+    titles   UTF-8 title strings, concatenated
+
+divisions_and_sections reads the artifact on first access and keeps the
+divisions_and_sections[division][section] mapping interface of the original dict.
+
+If section_numbers.py no longer matches the digest in the artifact, the source is loaded instead.
+Regenerate after editing section_numbers.py (run from the backend folder):
+    python -m csi_masterformat.compile_section_numbers
+"""
+import hashlib
+import os
+import re
+import struct
+import sys
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_PATH = os.path.join(os.path.dirname(__file__), "section_numbers.bin")
+SOURCE_PATH = os.path.join(os.path.dirname(__file__), "section_numbers.py")
+
+MAGIC = b"MSF1"
+HEADER = struct.Struct("<4sII32s")
+
+SECTION_PATTERN = re.compile(r"^(\d{6})(?:\.(\d{2}))?$")
+DIVISION_SPAN = 10000 * 100  # codes per two-digit division
+
+
+def section_code(section: str) -> Optional[int]:
+    """Encode "003132" / "003132.12" as an integer code, or None if it isn't in table format."""
+    match = SECTION_PATTERN.match(section) if isinstance(section, str) else None
+    if not match:
+        return None
+    return int(match.group(1)) * 100 + int(match.group(2) or 0)
+
+
+def section_string(code: int) -> str:
+    base, subsection = divmod(code, 100)
+    return f"{base:06d}.{subsection:02d}" if subsection else f"{base:06d}"
+
+
+def _uint32_array(data: bytes) -> array:
+    values = array("I")
+    values.frombytes(data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def _uint32_bytes(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values = array("I", values)
+        values.byteswap()
+    return values.tobytes()
+
+
+class MasterFormatData:
+    """Sorted code array plus title string table."""
+
+    def __init__(self, codes: array, offsets: array, titles: bytes, source_digest: bytes = b""):
+        self.codes = codes
+        self.offsets = offsets
+        self.titles = titles
+        self.source_digest = source_digest
+
+    @classmethod
+    def from_dict(cls, table: dict, source_digest: bytes = b"") -> "MasterFormatData":
+        entries = []
+        for sections in table.values():
+            for section, title in sections.items():
+                code = section_code(section)
+                if code is None or section_string(code) != section:
+                    raise ValueError(f"Section number cannot be packed: {section}")
+                entries.append((code, title))
+        entries.sort()
+
+        codes = array("I")
+        offsets = array("I", [0])
+        blob = bytearray()
+        for code, title in entries:
+            codes.append(code)
+            blob += title.encode("utf-8")
+            offsets.append(len(blob))
+        return cls(codes, offsets, bytes(blob), source_digest)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "MasterFormatData":
+        magic, count, titles_size, source_digest = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a MasterFormat table artifact")
+        codes_start = HEADER.size
+        offsets_start = codes_start + count * 4
+        titles_start = offsets_start + (count + 1) * 4
+        return cls(
+            _uint32_array(data[codes_start:offsets_start]),
+            _uint32_array(data[offsets_start:titles_start]),
+            data[titles_start:titles_start + titles_size],
+            source_digest,
+        )
+
+    def to_bytes(self) -> bytes:
+        return (
+            HEADER.pack(MAGIC, len(self.codes), len(self.titles), self.source_digest)
+            + _uint32_bytes(self.codes)
+            + _uint32_bytes(self.offsets)
+            + self.titles
+        )
+
+    def index_of(self, code: int, lo: int = 0, hi: Optional[int] = None) -> int:
+        hi = len(self.codes) if hi is None else hi
+        i = bisect_left(self.codes, code, lo, hi)
+        return i if i < hi and self.codes[i] == code else -1
+
+    def title_at(self, i: int) -> str:
+        return self.titles[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+
+
+def source_digest() -> bytes:
+    with open(SOURCE_PATH, "rb") as f:
+        return hashlib.sha256(f.read()).digest()
+
+
+def compile_table(artifact_path: str = ARTIFACT_PATH) -> MasterFormatData:
+    """Pack section_numbers.py into the binary artifact."""
+    from .section_numbers import divisions_and_sections as source
+
+    data = MasterFormatData.from_dict(source, source_digest())
+    tmp_path = f"{artifact_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data.to_bytes())
+    os.replace(tmp_path, artifact_path)
+    return data
+
+
+def load_table(artifact_path: str = ARTIFACT_PATH) -> MasterFormatData:
+    """Read the artifact, falling back to the Python source if it is missing or stale."""
+    try:
+        with open(artifact_path, "rb") as f:
+            data = MasterFormatData.from_bytes(f.read())
+        if data.source_digest == source_digest():
+            return data
+        logger.warning("MasterFormat artifact does not match section_numbers.py, loading source")
+    except (OSError, ValueError, struct.error) as e:
+        logger.warning(f"Could not load MasterFormat artifact, loading source: {e}")
+
+    from .section_numbers import divisions_and_sections as source
+    return MasterFormatData.from_dict(source)
+
+
+class DivisionSections(Mapping):
+    """Read-only {section_number: title} view over one division's slice of the code array."""
+
+    def __init__(self, data: MasterFormatData, start: int, end: int):
+        self._data = data
+        self._start = start
+        self._end = end
+
+    def _index(self, section: str) -> int:
+        code = section_code(section)
+        if code is None:
+            return -1
+        return self._data.index_of(code, self._start, self._end)
+
+    def __getitem__(self, section: str) -> str:
+        i = self._index(section)
+        if i < 0:
+            raise KeyError(section)
+        return self._data.title_at(i)
+
+    def __contains__(self, section: object) -> bool:
+        return self._index(section) >= 0
+
+    def get(self, section: str, default=None):
+        i = self._index(section)
+        return self._data.title_at(i) if i >= 0 else default
+
+    def __iter__(self) -> Iterator[str]:
+        codes = self._data.codes
+        for i in range(self._start, self._end):
+            yield section_string(codes[i])
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+
+class MasterFormatTable(Mapping):
+    """Lazy {division: {section_number: title}} mapping backed by the compact artifact."""
+
+    def __init__(self, artifact_path: str = ARTIFACT_PATH):
+        self._artifact_path = artifact_path
+        self._data: Optional[MasterFormatData] = None
+        self._divisions: dict[str, DivisionSections] = {}
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict[str, DivisionSections]:
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    data = load_table(self._artifact_path)
+                    divisions = {}
+                    codes = data.codes
+                    i = 0
+                    while i < len(codes):
+                        division = codes[i] // DIVISION_SPAN
+                        end = bisect_left(codes, (division + 1) * DIVISION_SPAN, i)
+                        divisions[f"{division:02d}"] = DivisionSections(data, i, end)
+                        i = end
+                    self._divisions = divisions
+                    self._data = data
+        return self._divisions
+
+    def __getitem__(self, division: str) -> DivisionSections:
+        return self._load()[division]
+
+    def __contains__(self, division: object) -> bool:
+        return division in self._load()
+
+    def get(self, division: str, default=None):
+        return self._load().get(division, default)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._load())
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+
+divisions_and_sections = MasterFormatTable()
+
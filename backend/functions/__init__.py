@@ -2,7 +2,8 @@ from .section_spec_reqs import section_spec_requirements
 from .section_pages_detection import section_pages_detection
 from .section_classification import page_classification
 from .section_summary import section_summaries
-from .compliance_check import compliance_check, compare_compliance_runs
+from .compliance_check import compliance_check, compare_compliance_runs, save_compliance_run, stream_compliance_check
+from .spec_ingest import spec_ingest, spool_uploads
 
 __all__ = [
     "section_spec_requirements",
@@ -10,5 +11,9 @@ __all__ = [
     "page_classification",
     "section_summaries",
     "compliance_check",
-    "compare_compliance_runs"
+    "compare_compliance_runs",
+    "save_compliance_run",
+    "stream_compliance_check",
+    "spec_ingest",
+    "spool_uploads"
 ]
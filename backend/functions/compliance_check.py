@@ -1,10 +1,11 @@
 import logging
 import json
 import asyncio
-from typing import Optional, List
+from typing import AsyncIterator, Awaitable, Callable, Optional, List
 from classes import db, S3Bucket, Anthropic, make_spec_check_schema, make_compare_compliance_runs_schema
+from classes.partial_json import StreamingArrayParser
 from classes.base_models import RequirementFinding
-from prompts import SPEC_CHECK_PROMPT, SPEC_CHECK_DRAWINGS_PROMPT, COMPARE_COMPLIANCE_RUNS_PROMPT
+from prompts import SPEC_CHECK_PROMPT, SPEC_CHECK_DRAWINGS_PROMPT, SPEC_CHECK_CONTEXT, COMPARE_COMPLIANCE_RUNS_PROMPT
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -12,6 +13,14 @@ logger = logging.getLogger(__name__)
 s3 = S3Bucket()
 anthropic = Anthropic()
 
+STREAM_KEEPALIVE_SECONDS = 15
+# Array fields of the spec check streamed element by element, and the event type each element is sent as
+STREAMED_FIELDS = {
+    "requirement_findings": "requirement_finding",
+    "non_conformances": "non_conformance",
+}
+running_checks: set[asyncio.Task] = set()
+
 
 async def compliance_check(
     package_id: int,
@@ -20,7 +29,13 @@ async def compliance_check(
     section_number: str,
     submittals: list[dict],
     submittal_ids: Optional[List[int]],
+    on_event: Optional[Callable[[dict], Awaitable[None]]] = None,
 ) -> dict:
+    """
+    Review submittals against a spec section. on_event receives the streamed thinking and text
+    deltas, plus {"type": "requirement_finding" | "non_conformance", "item": ...} for each array
+    element as soon as it is complete.
+    """
     try:
 
         # Check if the submittals are only shop drawings
@@ -32,14 +47,13 @@ async def compliance_check(
         effort = "high"
         if is_drawing_only:
             logger.info("Submittals are only shop drawings")
-            system_prompt = anthropic.build_prompt(
-                SPEC_CHECK_DRAWINGS_PROMPT, {"section_number": section_number})
+            # Static system prompt, shared as a cached prefix by every compliance check
+            system_prompt = SPEC_CHECK_DRAWINGS_PROMPT
             # max_tokens = 16000
             # effort = "medium"
         else:
             logger.info("Submittals are not only shop drawings")
-            system_prompt = anthropic.build_prompt(
-                SPEC_CHECK_PROMPT, {"section_number": section_number})
+            system_prompt = SPEC_CHECK_PROMPT
             # max_tokens = 25000
             # effort = "high"
 
@@ -59,15 +73,26 @@ async def compliance_check(
 
         # s3_keys = []
         content_blocks = [
+            anthropic.text_block(anthropic.build_prompt(SPEC_CHECK_CONTEXT, {"section_number": section_number})),
             {"type": "text", "text": f"The following are the specification section {section_number} pages:"},
         ]
 
         # Get original pdf pages
+        source_hashes = {}
         async with s3.s3_client() as s3_client:
+            # Content hashes of the spec pages and submittals let the response cache ignore the signed URLs
+            etags = await s3.get_object_etags_with_client(
+                [f"{spec_id}/original_pages/"] +
+                [submittal.get("s3_key").rsplit("/", 1)[0] + "/" for submittal in submittals],
+                s3_client
+            )
+
             for group in summary_page_groups:
                 for page in group:
                     key = f"{spec_id}/original_pages/page_{page:04d}.pdf"
                     url = await s3.generate_presigned_url(key, s3_client)
+                    if key in etags:
+                        source_hashes[url] = etags[key]
 
                     block = anthropic.pdf_document_block_url(url)
                     content_blocks.append(block)
@@ -85,6 +110,8 @@ async def compliance_check(
             for submittal in submittals:
                 key = submittal.get("s3_key")
                 url = await s3.generate_presigned_url(key, s3_client)
+                if key in etags:
+                    source_hashes[url] = etags[key]
 
                 block = anthropic.pdf_document_block_url(url)
                 content_blocks.append(block)
@@ -96,6 +123,16 @@ async def compliance_check(
         # token_count = await anthropic.count_tokens_document(s3_keys, system_prompt)
         # logger.info(f"Token count: {token_count}")
 
+        parser = StreamingArrayParser(STREAMED_FIELDS)
+
+        async def _forward(event: dict):
+            await on_event(event)
+            if event["type"] == "text":
+                for field, item in parser.feed(event["text"]):
+                    await on_event({"type": STREAMED_FIELDS[field], "item": item})
+
+        forward_event = _forward if on_event else None
+
         logger.info("Sending request to Claude")
         claude_request = await anthropic.claude(
             content_blocks=content_blocks,
@@ -104,7 +141,9 @@ async def compliance_check(
             max_tokens=max_tokens,
             adaptive_thinking=is_drawing_only,
             effort=effort,
-            cache_system_prompt=True
+            cache_system_prompt=True,
+            source_hashes=source_hashes,
+            on_event=forward_event
         )
 
         if claude_request.get("status") == "success":
@@ -204,92 +243,126 @@ async def compliance_check(
         return {"status": "error", "error": str(e)}
 
 
-# async def stream_compliance_check(
-#     package_id: int,
-#     spec_id: str,
-#     section_id: int,
-#     section_number: str,
-#     submittals: list[dict],
-#     submittal_ids: Optional[List[int]],
-# ):
-#     queue = asyncio.Queue()
-
-#     async def on_delta(text: str):
-#         await queue.put({"type": "delta", "text": text})
-
-#     async def run_check():
-#         result = await compliance_check(
-#             package_id=package_id,
-#             spec_id=spec_id,
-#             section_id=section_id,
-#             section_number=section_number,
-#             submittals=submittals,
-#             submittal_ids=submittal_ids,
-#             on_delta=on_delta,
-#         )
-#         await queue.put({"type": "done", "result": result})
-
-#     task = asyncio.create_task(run_check())
-
-#     while True:
-#         try:
-#             item = await asyncio.wait_for(queue.get(), timeout=5)
-#         except asyncio.TimeoutError:
-#             logger.info("Stream timeout, sending keepalive")
-#             yield ": keepalive\n\n"
-#             continue
-#         except Exception as e:
-#             logger.error(f"Error in stream_compliance_check: {e}")
-#             yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
-#             break
-
-#         if item["type"] == "delta":
-#             yield f"data: {json.dumps(item)}\n\n"
-#         elif item["type"] == "done":
-#             result = item["result"]
-#             if result.get("status") == "success":
-#                 prev_runs = await db.get_compliance_runs(
-#                     package_id,
-#                     submittal_id=submittal_ids[0] if submittal_ids else None
-#                 )
-#                 if prev_runs:
-#                     latest = prev_runs[0]
-#                     await db.update_compliance_run(
-#                         compliance_run_id=latest.get("id"),
-#                         submittal_ids=result.get("submittal_ids"),
-#                         compliance_result=result.get("result"),
-#                         compliance_score=result.get(
-#                             "result").get("compliance_score"),
-#                         is_compliant=result.get("result").get("is_compliant"),
-#                         pipeline=result.get("pipeline"),
-#                         prompt_version=latest.get("prompt_version") + 1,
-#                         token_count=result.get("total_tokens"),
-#                     )
-#                 else:
-#                     await db.create_compliance_run(
-#                         package_id=package_id,
-#                         spec_id=spec_id,
-#                         section_id=section_id,
-#                         submittal_ids=result.get("submittal_ids"),
-#                         compliance_result=result.get("result"),
-#                         compliance_score=result.get(
-#                             "result").get("compliance_score"),
-#                         is_compliant=result.get("result").get("is_compliant"),
-#                         pipeline=result.get("pipeline"),
-#                         model="claude-sonnet-4-6",
-#                         token_count=result.get("total_tokens"),
-#                     )
-#                 await db.update_package_after_run(
-#                     package_id=package_id,
-#                     compliance_result=result.get("result"),
-#                     compliance_score=result.get(
-#                         "result").get("compliance_score"),
-#                     checked_submittal_ids=result.get("submittal_ids"),
-#                 )
-#                 yield f"data: {json.dumps({'type': 'done', 'result': result})}\n\n"
-#             else:
-#                 yield f"data: {json.dumps({'type': 'error', 'error': result.get('error')})}\n\n"
-#             break
+async def save_compliance_run(
+    package_id: int,
+    spec_id: str,
+    section_id: int,
+    submittal_ids: Optional[List[int]],
+    result: dict,
+) -> dict:
+    """Persist a successful compliance_check result as a new or re-run compliance run"""
+    run = {
+        "submittal_ids": result.get("submittal_ids"),
+        "compliance_result": result.get("result"),
+        "compliance_score": result.get("result").get("compliance_score"),
+        "is_compliant": result.get("result").get("is_compliant"),
+        "pipeline": result.get("pipeline"),
+        "token_count": result.get("total_tokens"),
+    }
+
+    if submittal_ids:
+        # Individual run — find by single submittal id
+        run_type = "individual"
+        prev_runs = await db.get_compliance_runs(package_id, submittal_id=submittal_ids[0])
+    else:
+        # Package/cumulative run — find by run_type
+        run_type = "package"
+        prev_runs = await db.get_compliance_runs(package_id, run_type="package")
+    prev_run = prev_runs[0] if prev_runs else None
+
+    if prev_run:
+        await db.update_compliance_run(
+            compliance_run_id=prev_run.get("id"),
+            run_type=run_type,
+            prompt_version=int(prev_run.get("prompt_version")) + 1,
+            **run,
+        )
+    else:
+        await db.create_compliance_run(
+            package_id=package_id,
+            spec_id=spec_id,
+            section_id=section_id,
+            run_type=run_type,
+            model="claude-sonnet-4-6",
+            **run,
+        )
+
+    if run_type == "package":
+        updated_package = await db.update_package_after_run(
+            package_id=package_id,
+            compliance_result=result.get("result"),
+            compliance_score=result.get("result").get("compliance_score"),
+            checked_submittal_ids=result.get("submittal_ids"),
+        )
+        if not updated_package:
+            return {"status": "error", "error": "Failed to update package after run"}
+
+    return {"status": "success"}
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_compliance_check(
+    package_id: int,
+    spec_id: str,
+    section_id: int,
+    section_number: str,
+    submittals: list[dict],
+    submittal_ids: Optional[List[int]],
+) -> AsyncIterator[str]:
+    """
+    Run compliance_check and yield Server-Sent Events: thinking and text deltas, each requirement
+    finding and non-conformance as soon as the model has finished writing it, then done with the
+    full result once the run is saved. The check runs as its own task, so a reviewer closing the
+    stream does not lose the run.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def run_check():
+        try:
+            result = await compliance_check(
+                package_id=package_id,
+                spec_id=spec_id,
+                section_id=section_id,
+                section_number=section_number,
+                submittals=submittals,
+                submittal_ids=submittal_ids,
+                on_event=queue.put,
+            )
+            if result.get("status") == "success":
+                saved = await save_compliance_run(package_id, spec_id, section_id, submittal_ids, result)
+                if saved.get("status") != "success":
+                    result = saved
+        except Exception as e:
+            logger.error(f"Error in stream_compliance_check: {e}")
+            result = {"status": "error", "error": str(e)}
+        await queue.put({"type": "done", "result": result})
+
+    task = asyncio.create_task(run_check())
+    # Hold a reference so the check survives a closed stream until it has been saved
+    running_checks.add(task)
+    task.add_done_callback(running_checks.discard)
+
+    while True:
+        try:
+            item = await asyncio.wait_for(queue.get(), timeout=STREAM_KEEPALIVE_SECONDS)
+        except asyncio.TimeoutError:
+            yield ": keepalive\n\n"
+            continue
+
+        if item["type"] != "done":
+            yield sse_event(item["type"], item)
+            continue
+
+        result = item["result"]
+        if result.get("status") == "success":
+            yield sse_event("done", {"type": "done", "compliance_check": result})
+        else:
+            yield sse_event("error", {"type": "error", "error": result.get("error")})
+        break
+
 
 async def compare_compliance_runs(
     package_id_1: int,
@@ -334,8 +407,7 @@ async def compare_compliance_runs(
             },
         ]
 
-        token_count = await anthropic.count_tokens_content_blocks(content_blocks, system_prompt)
-        logger.info(f"Token count: {token_count}")
+        logger.info(f"Estimated input tokens: {anthropic.estimate_input_tokens(system_prompt, content_blocks)}")
 
         claude_request = await anthropic.claude(
             content_blocks=content_blocks,
@@ -343,7 +415,8 @@ async def compare_compliance_runs(
             schema=make_compare_compliance_runs_schema(section_number),
             max_tokens=16000,
             effort="medium",
-            cache_system_prompt=True
+            # The prompt is far under the minimum cacheable prefix and comparisons are rare
+            cache_system_prompt=False
         )
 
         if claude_request.get("status") == "success":
@@ -0,0 +1,349 @@
+import asyncio
+import logging
+import os
+import time
+import zlib
+from collections import Counter
+from typing import Optional
+import numpy as np
+from classes import db
+from classes.page_fingerprint import normalize_page_words
+from .request_split import parse_custom_id
+from .section_pages_detection import (
+    CANDIDATE_PATTERN,
+    END_PATTERN,
+    FOOTER_PATTERN,
+    HEADER_PATTERN,
+    TOC_TITLE_PATTERN,
+    find_section_numbers,
+    is_valid_section,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PAGE_CLASSIFIER = os.getenv("PAGE_CLASSIFIER", "1") != "0"
+# Precision the auto-label thresholds must reach on held-out specs, for primary and reference alike
+TARGET_PRECISION = float(os.getenv("PAGE_CLASSIFIER_PRECISION", "0.98"))
+MIN_TRAINING_LABELS = int(os.getenv("PAGE_CLASSIFIER_MIN_LABELS", "500"))
+MAX_TRAINING_LABELS = 20000  # most recent Claude verdicts trained on
+RETRAIN_SECONDS = 24 * 3600
+
+HASH_BITS = 18
+PAGE_TEXT_CHARS = 3000  # per page; the header and start of the body carry the signal
+RANGE_PAGES = 2  # leading pages of a range featurized, like the first pages Claude leans on
+EDGE_LINES = 3  # lines at the top and bottom of a page where headers and running footers sit
+VALIDATION_SHARE = 0.25  # of specs, held out to pick the thresholds
+MIN_THRESHOLD_SUPPORT = 20  # held-out predictions needed on the confident side of a threshold
+EPOCHS = 80
+LEARNING_RATE = 0.5
+L2 = 1e-6
+
+
+# ---------- Features ----------
+
+def hash_token(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8")) & ((1 << HASH_BITS) - 1)
+
+
+def bucket(count: int) -> str:
+    return "0" if count == 0 else "1" if count == 1 else "2-3" if count < 4 else "4-7" if count < 8 else "8+"
+
+
+def page_bag(text: str) -> Counter:
+    """Hashed unigrams and bigrams of the start of a page, section numbers folded into one token; independent of the section"""
+    masked = CANDIDATE_PATTERN.sub(" sectionnumber ", text[:PAGE_TEXT_CHARS])
+    words = normalize_page_words(masked)
+    return Counter(hash_token(token) for token in (*words, *(f"{a} {b}" for a, b in zip(words, words[1:]))))
+
+
+def section_tokens(section_number: str, text: str) -> list[str]:
+    """Tokens for how a page mentions the section being classified versus other sections"""
+    tokens = []
+    lines = [line for line in text.splitlines() if line.strip()]
+    self_mentions = 0
+    others = set()
+    for line_index, line in enumerate(lines):
+        place = "top" if line_index < EDGE_LINES else "bottom" if line_index >= len(lines) - EDGE_LINES else "body"
+        for match in CANDIDATE_PATTERN.finditer(line):
+            section = is_valid_section(match.group(0))
+            if not section:
+                continue
+            tag = "self" if section == section_number else "other"
+            if tag == "self":
+                self_mentions += 1
+            else:
+                others.add(section)
+            before = normalize_page_words(line[:match.start()])[-2:]
+            after = normalize_page_words(line[match.end():])[:1]
+            tokens += [f"{tag}:{place}", *(f"{tag}:before:{word}" for word in before), *(f"{tag}:after:{word}" for word in after)]
+
+        for pattern, name in ((HEADER_PATTERN, "header"), (END_PATTERN, "end")):
+            if match := pattern.match(line):
+                section = match.group(1) and is_valid_section(match.group(1))
+                tokens.append(f"{name}:{'self' if section == section_number else 'other' if section else 'unnumbered'}")
+        if place != "body" and (match := FOOTER_PATTERN.search(line)):
+            tokens.append(f"footer:{'self' if is_valid_section(match.group(1)) == section_number else 'other'}")
+        if line_index < EDGE_LINES * 2 and TOC_TITLE_PATTERN.search(line):
+            tokens.append("toc_title")
+
+    tokens += [f"self_mentions:{bucket(self_mentions)}", f"other_sections:{bucket(len(others))}"]
+    return tokens
+
+
+def featurize(section_number: str, texts: list[str], bags: Optional[list[Counter]] = None) -> tuple[np.ndarray, np.ndarray]:
+    """Sparse feature vector (hashed indices, values) of a section over the texts of its page range"""
+    counts = Counter({hash_token(f"range_pages:{bucket(len(texts))}"): 1})
+    for position, text in enumerate(texts[:RANGE_PAGES]):
+        counts.update(bags[position] if bags else page_bag(text))
+        counts.update(hash_token(f"s:{token}") for token in section_tokens(section_number, text))
+
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    values = np.log1p(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))
+    return indices, values / (np.linalg.norm(values) or 1.0)
+
+
+def stack(rows: list[tuple[np.ndarray, np.ndarray]]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(row ids, column indices, values) of a list of sparse rows"""
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    row_ids = np.repeat(np.arange(len(rows)), [len(indices) for indices, _ in rows])
+    return row_ids, np.concatenate([indices for indices, _ in rows]), np.concatenate([values for _, values in rows])
+
+
+# ---------- Model ----------
+
+class LogisticModel:
+    """L2-regularized logistic regression over hashed sparse features, full-batch Adagrad, classes balanced"""
+
+    def __init__(self, epochs: int = EPOCHS, learning_rate: float = LEARNING_RATE, l2: float = L2):
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.weights = np.zeros(1 << HASH_BITS)
+        self.bias = 0.0
+
+    def fit(self, rows: list[tuple[np.ndarray, np.ndarray]], labels: np.ndarray) -> "LogisticModel":
+        row_ids, columns, values = stack(rows)
+        labels = labels.astype(float)
+        positives = max(labels.sum(), 1.0)
+        negatives = max(len(labels) - labels.sum(), 1.0)
+        sample_weights = np.where(labels == 1, len(labels) / (2 * positives), len(labels) / (2 * negatives))
+
+        squared = np.zeros_like(self.weights)
+        squared_bias = 0.0
+        for _ in range(self.epochs):
+            errors = (self._probabilities(row_ids, columns, values, len(rows)) - labels) * sample_weights / len(rows)
+            gradient = np.bincount(columns, weights=errors[row_ids] * values, minlength=len(self.weights))
+            gradient += self.l2 * self.weights
+            squared += gradient ** 2
+            self.weights -= self.learning_rate * gradient / (np.sqrt(squared) + 1e-8)
+            bias_gradient = errors.sum()
+            squared_bias += bias_gradient ** 2
+            self.bias -= self.learning_rate * bias_gradient / (np.sqrt(squared_bias) + 1e-8)
+        return self
+
+    def _probabilities(self, row_ids, columns, values, count: int) -> np.ndarray:
+        scores = np.bincount(row_ids, weights=self.weights[columns] * values, minlength=count) + self.bias
+        return 1.0 / (1.0 + np.exp(-np.clip(scores, -30, 30)))
+
+    def predict(self, rows: list[tuple[np.ndarray, np.ndarray]]) -> np.ndarray:
+        """Probability that each row is the section's primary content"""
+        return self._probabilities(*stack(rows), len(rows))
+
+
+def loosest_threshold(scores: np.ndarray, correct: np.ndarray, target_precision: float) -> Optional[float]:
+    """
+    The lowest score at which everything scored at or above it is labelled with target_precision
+    while taking at most 1 - target_precision of the other class, so a rare class is not given
+    away just because the common one is precise by default.
+    """
+    order = np.argsort(-scores, kind="stable")
+    counts = np.arange(1, len(order) + 1)
+    hits = np.cumsum(correct[order])
+    allowed_misses = (1 - target_precision) * (len(correct) - correct.sum())
+    acceptable = (counts >= MIN_THRESHOLD_SUPPORT) & (hits >= target_precision * counts) & (counts - hits <= allowed_misses)
+    if not acceptable.any():
+        return None
+    return float(scores[order[np.flatnonzero(acceptable)[-1]]])
+
+
+def choose_thresholds(probabilities: np.ndarray, labels: np.ndarray, target_precision: float = TARGET_PRECISION) -> dict:
+    """
+    Auto-label thresholds picked on held-out data: primary at p >= high, reference at p <= low.
+    None for a side that never reaches target_precision.
+    """
+    high = loosest_threshold(probabilities, labels == 1, target_precision)
+    low = loosest_threshold(-probabilities, labels == 0, target_precision)
+    low = None if low is None else -low
+
+    # Overlapping thresholds would label one range both ways; keep the side decided more often
+    if high is not None and low is not None and low >= high:
+        if (probabilities >= high).sum() >= (probabilities <= low).sum():
+            low = None
+        else:
+            high = None
+    return {"high": high, "low": low}
+
+
+def auto_labels(probabilities: np.ndarray, thresholds: dict) -> np.ndarray:
+    """1 primary, 0 reference, -1 left to Claude"""
+    labels = np.full(len(probabilities), -1)
+    if thresholds.get("low") is not None:
+        labels[probabilities <= thresholds["low"]] = 0
+    if thresholds.get("high") is not None:
+        labels[probabilities >= thresholds["high"]] = 1
+    return labels
+
+
+def evaluate(probabilities: np.ndarray, labels: np.ndarray, thresholds: dict) -> dict:
+    """Precision and recall of the auto-labels against Claude's verdicts, and the share of requests avoided"""
+    predicted = auto_labels(probabilities, thresholds)
+    metrics = {"samples": len(labels), "requests_avoided": round(float((predicted >= 0).mean()), 4) if len(labels) else 0.0}
+    for value, name in ((1, "primary"), (0, "reference")):
+        labelled = predicted == value
+        actual = labels == value
+        metrics[name] = {
+            "auto_labelled": int(labelled.sum()),
+            "precision": round(float((labelled & actual).sum() / labelled.sum()), 4) if labelled.any() else None,
+            "recall": round(float((labelled & actual).sum() / actual.sum()), 4) if actual.any() else None,
+        }
+    metrics["accuracy_at_0.5"] = round(float(((probabilities >= 0.5) == (labels == 1)).mean()), 4) if len(labels) else None
+    return metrics
+
+
+def split_by_spec(spec_ids: list[str], share: float = VALIDATION_SHARE) -> np.ndarray:
+    """True for samples of held-out specs; specs are never split, or near-duplicate pages would leak"""
+    return np.array([zlib.crc32(spec_id.encode("utf-8")) % 1000 < share * 1000 for spec_id in spec_ids])
+
+
+# ---------- Service ----------
+
+class PageClassifier:
+    """
+    Local pre-filter for classification, trained on the verdicts Claude has already given.
+
+    Each (section, page range) is reduced to hashed word features of its first pages plus tokens
+    for how those pages mention the section versus other sections (headers, END OF SECTION,
+    running footers, the words around each mention). A logistic regression is fit on Claude's
+    verdicts; the auto-label thresholds are the loosest that reach TARGET_PRECISION on held-out
+    specs. Ranges predicted beyond them are labelled locally, everything else goes to Claude.
+    Training reads only source='llm' rows, so local labels never feed back into the model.
+    """
+
+    def __init__(self):
+        self.model: Optional[LogisticModel] = None
+        self.thresholds: dict = {"high": None, "low": None}
+        self.metrics: dict = {}
+        self.trained_at: Optional[float] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def load_dataset(self, limit: int = MAX_TRAINING_LABELS) -> tuple[list[tuple[str, str, list[str]]], np.ndarray]:
+        """([(spec_id, section_number, page texts)], labels) from Claude's stored verdicts"""
+        samples, labels = [], []
+        by_spec: dict[str, list[dict]] = {}
+        for row in await db.get_classification_labels(limit):
+            by_spec.setdefault(row["spec_id"], []).append(row)
+        for spec_id, rows in by_spec.items():
+            texts = await db.get_page_texts(spec_id)
+            for row in rows:
+                pages = parse_custom_id(row["custom_id"])[2]
+                samples.append((spec_id, row["section_number"], [texts.get(page, "") for page in pages]))
+                labels.append(1 if row["is_primary"] else 0)
+        return samples, np.array(labels)
+
+    def fit(self, samples: list[tuple[str, str, list[str]]], labels: np.ndarray) -> dict:
+        """Train on the specs outside the validation split and pick thresholds on the rest; returns the held-out metrics"""
+        rows = [featurize(section_number, texts) for _, section_number, texts in samples]
+        held_out = split_by_spec([spec_id for spec_id, _, _ in samples])
+        if held_out.all() or not held_out.any():
+            raise ValueError("Training labels need at least two specs on each side of the validation split")
+
+        model = LogisticModel().fit([row for row, out in zip(rows, held_out) if not out], labels[~held_out])
+        probabilities = model.predict([row for row, out in zip(rows, held_out) if out])
+        thresholds = choose_thresholds(probabilities, labels[held_out])
+
+        self.model, self.thresholds = model, thresholds
+        self.metrics = evaluate(probabilities, labels[held_out], thresholds)
+        self.trained_at = time.time()
+        return self.metrics
+
+    async def train(self) -> Optional[dict]:
+        samples, labels = await self.load_dataset()
+        if len(samples) < MIN_TRAINING_LABELS or len(set(labels.tolist())) < 2:
+            logger.info(f"Page classifier not trained: {len(samples)} usable label(s), need {MIN_TRAINING_LABELS} of both kinds")
+            self.trained_at = time.time()
+            return None
+        try:
+            metrics = await asyncio.to_thread(self.fit, samples, labels)
+        except ValueError as e:
+            logger.info(f"Page classifier not trained: {e}")
+            self.trained_at = time.time()
+            return None
+        logger.info(f"Page classifier trained on {len(samples)} label(s), thresholds {self.thresholds}, held out: {metrics}")
+        return metrics
+
+    async def ensure_trained(self):
+        """Train on first use and again once the model is RETRAIN_SECONDS old"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.trained_at is None or time.time() - self.trained_at > RETRAIN_SECONDS:
+                await self.train()
+
+    async def classify(self, spec_id: str, sections: dict[str, dict], groups: list[dict]) -> dict[str, dict]:
+        """
+        {custom_id: content} shaped like a classification response for the per-section groups of
+        group_classification_requests the model is confident about.
+        """
+        await self.ensure_trained()
+        if self.model is None or (self.thresholds["high"] is None and self.thresholds["low"] is None) or not groups:
+            return {}
+        texts = await db.get_page_texts(spec_id)
+        if not texts:
+            return {}
+
+        members = [
+            (division, section_number, custom_id, group["pages"])
+            for group in groups
+            for division, section_number, custom_id in group["members"]
+        ]
+
+        def predict():
+            bags: dict[int, Counter] = {}
+            rows = []
+            for _, section_number, _, pages in members:
+                for page in pages[:RANGE_PAGES]:
+                    if page not in bags:
+                        bags[page] = page_bag(texts.get(page, ""))
+                page_texts = [texts.get(page, "") for page in pages]
+                rows.append(featurize(section_number, page_texts, [bags[page] for page in pages[:RANGE_PAGES]]))
+            return self.model.predict(rows)
+
+        probabilities = await asyncio.to_thread(predict)
+        labels = auto_labels(probabilities, self.thresholds)
+
+        results = {}
+        for (division, section_number, custom_id, pages), probability, label in zip(members, probabilities, labels):
+            if label < 0:
+                continue
+            referenced = {number for page in pages for number in find_section_numbers(texts.get(page, ""))}
+            results[custom_id] = {
+                "section_title": sections.get(division, {}).get(section_number, {}).get("title", ""),
+                "reasoning": f"Local page classifier, p(primary) = {probability:.3f}",
+                "pages_analyzed": pages,
+                "confidence": round(float(probability if label else 1 - probability), 4),
+                "is_primary": bool(label),
+                "referenced_sections": sorted(referenced - {section_number}),
+                "classified_by": "page_classifier",
+            }
+
+        if results:
+            logger.info(f"Page classifier labelled {len(results)}/{len(members)} page range(s) of {spec_id} locally")
+        return results
+
+    def stats(self) -> dict:
+        return {"trained_at": self.trained_at, "thresholds": self.thresholds, "held_out": self.metrics}
+
+
+page_classifier = PageClassifier()
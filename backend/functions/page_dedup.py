@@ -0,0 +1,126 @@
+import logging
+from typing import AsyncIterator
+from classes import db
+from classes.db import SUMMARY_LIST_FIELDS
+from classes.page_fingerprint import estimate_similarity, NEAR_DUPLICATE_THRESHOLD
+from .request_split import parse_custom_id
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAX_EQUIVALENTS = 5  # earlier specs tried per request before giving up on reuse
+
+
+async def find_duplicate_pages(spec_id: str) -> dict[int, list[tuple[float, str, int]]]:
+    """Exact and near-duplicate pages in other specs: {page_index: [(similarity, spec_id, page_index)]}, best first"""
+    fingerprints = await db.get_page_fingerprints(spec_id)
+    if not fingerprints:
+        return {}
+
+    matches: dict[int, list[tuple[float, str, int]]] = {}
+    for candidate in await db.find_duplicate_page_candidates(spec_id):
+        fingerprint = fingerprints.get(candidate["page_index"])
+        if fingerprint is None:
+            continue
+        if candidate["other_text_hash"] == fingerprint["text_hash"]:
+            similarity = 1.0
+        else:
+            similarity = estimate_similarity(fingerprint["minhash"], candidate["other_minhash"])
+        if similarity >= NEAR_DUPLICATE_THRESHOLD:
+            matches.setdefault(candidate["page_index"], []).append(
+                (similarity, candidate["other_spec_id"], candidate["other_page_index"]))
+
+    for page_matches in matches.values():
+        page_matches.sort(reverse=True)
+    return matches
+
+
+def equivalent_custom_ids(custom_id: str, matches: dict[int, list[tuple[float, str, int]]]) -> list[tuple[str, str, list[int]]]:
+    """
+    Requests in earlier specs that covered the same section over duplicate pages, in the same order:
+    [(spec_id, custom_id, page indices)]
+    """
+    division, safe_section_number, pages, is_multi = parse_custom_id(custom_id)
+    if any(page not in matches for page in pages):
+        return []
+
+    matched = {page: {(other_spec_id, other_page) for _, other_spec_id, other_page in matches[page]} for page in pages}
+    equivalents = []
+    for _, other_spec_id, other_start in matches[pages[0]]:
+        other_pages = [other_start + offset for offset in range(len(pages))]
+        if not all((other_spec_id, other_page) in matched[page] for page, other_page in zip(pages, other_pages)):
+            continue
+
+        if is_multi:
+            other_custom_id = f"{division}-{safe_section_number}-{other_spec_id}-{other_pages[0]}-{other_pages[-1]}"
+        else:
+            other_custom_id = f"{division}-{safe_section_number}-{other_spec_id}-{other_pages[0]}"
+        equivalents.append((other_spec_id, other_custom_id, other_pages))
+        if len(equivalents) >= MAX_EQUIVALENTS:
+            break
+    return equivalents
+
+
+async def reusable_classification_results(spec_id: str, custom_ids: list[str]) -> dict[str, dict]:
+    """Classification results of earlier specs for requests whose pages are all duplicates: {custom_id: content}"""
+    matches = await find_duplicate_pages(spec_id)
+    if not matches:
+        return {}
+
+    equivalents = {custom_id: equivalent_custom_ids(custom_id, matches) for custom_id in custom_ids}
+    prior_results = await db.get_classification_results_by_custom_id(
+        [other_custom_id for options in equivalents.values() for _, other_custom_id, _ in options])
+
+    reused = {}
+    for custom_id, options in equivalents.items():
+        for _, other_custom_id, _ in options:
+            if other_custom_id in prior_results:
+                reused[custom_id] = {
+                    **prior_results[other_custom_id],
+                    "pages_analyzed": parse_custom_id(custom_id)[2],
+                    "classified_by": "reused",
+                }
+                break
+
+    if reused:
+        logger.info(f"Reusing {len(reused)}/{len(custom_ids)} classification result(s) from duplicate pages for {spec_id}")
+    return reused
+
+
+async def reusable_summary_results(spec_id: str, custom_ids: list[str]) -> dict[str, dict]:
+    """
+    Summaries of earlier specs for requests whose pages are all duplicates: {custom_id: content}.
+    A summary is only reused when the earlier section was summarized from exactly the matching pages.
+    """
+    matches = await find_duplicate_pages(spec_id)
+    if not matches:
+        return {}
+
+    equivalents = {custom_id: equivalent_custom_ids(custom_id, matches) for custom_id in custom_ids}
+    prior_summaries = await db.get_section_summaries_for_specs([
+        (other_spec_id, parse_custom_id(custom_id)[1].replace("_", "."))
+        for custom_id, options in equivalents.items()
+        for other_spec_id, _, _ in options
+    ])
+
+    reused = {}
+    for custom_id, options in equivalents.items():
+        section_number = parse_custom_id(custom_id)[1].replace("_", ".")
+        for other_spec_id, _, other_pages in options:
+            summary = prior_summaries.get((other_spec_id, section_number))
+            if summary and sorted(summary["pages_summarized"]) == other_pages:
+                reused[custom_id] = {
+                    field: summary[field]
+                    for field in ("section_number", "section_title", "overview", *SUMMARY_LIST_FIELDS)
+                }
+                break
+
+    if reused:
+        logger.info(f"Reusing {len(reused)}/{len(custom_ids)} summary result(s) from duplicate pages for {spec_id}")
+    return reused
+
+
+async def iter_reused_results(reused: dict[str, dict]) -> AsyncIterator[dict]:
+    """Reused results shaped like parsed batch results"""
+    for custom_id, content in reused.items():
+        yield {"custom_id": custom_id, "content": content, "reused": True}
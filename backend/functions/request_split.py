@@ -0,0 +1,70 @@
+import logging
+from typing import Callable, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Page ranges too large for one context window are sent as sub-requests {custom_id}-1, {custom_id}-2, ...
+# and reduced back into one result for {custom_id} once every part is in. Only multi-page ranges are
+# ever split, so a part id has exactly one more '-' field than a multi-page id of the same kind.
+MULTI_PAGE_FIELDS = 9  # {division}-{section}-{spec uuid, 5 fields}-{start}-{end}
+MULTI_SECTION_MULTI_PAGE_FIELDS = 8  # m-{spec uuid, 5 fields}-{start}-{end}
+
+
+def multi_page_fields(fields: list[str]) -> int:
+    """Number of '-' fields in a whole multi-page range id of the same kind as fields"""
+    return MULTI_SECTION_MULTI_PAGE_FIELDS if fields[0] == "m" else MULTI_PAGE_FIELDS
+
+
+def parse_custom_id(custom_id: str) -> tuple[str, str, list[int], bool]:
+    """(division, section number with _, page indices, is multi-page) from a whole-range request custom_id"""
+    fields = custom_id.split('-')
+    is_multi = len(fields) == multi_page_fields(fields)
+    start_index = int(fields[-2] if is_multi else fields[-1])
+    end_index = int(fields[-1])
+    return fields[0], fields[1], list(range(start_index, end_index + 1)), is_multi
+
+
+def split_part_custom_id(custom_id: str, part: int) -> str:
+    return f"{custom_id}-{part}"
+
+
+def parse_split_custom_id(custom_id: str) -> tuple[str, Optional[int]]:
+    """(custom_id of the whole range, part number) for a sub-request; (custom_id, None) for anything else"""
+    fields = custom_id.split('-')
+    if len(fields) == multi_page_fields(fields) + 1:
+        return '-'.join(fields[:-1]), int(fields[-1])
+    return custom_id, None
+
+
+def reduce_split_results(
+    custom_id: str,
+    parts: list[tuple[int, dict]],
+    reduce_contents: Callable[[list[dict]], dict]
+) -> dict:
+    """
+    One parsed result for custom_id from the results of its parts. Any errored or unparseable part
+    fails the whole range, so the normal retry path re-runs (and re-plans) it.
+    """
+    parts = sorted(parts, key=lambda part: part[0])
+    errored = [
+        item for _, item in parts
+        if item.get("type") == "errored" or "content" not in item or "raw" in item["content"]
+    ]
+    if errored:
+        return {"custom_id": custom_id, "type": "errored", "error": errored[0].get("error") or "Unparseable split result"}
+
+    logger.info(f"Reducing {len(parts)} split result(s) into {custom_id}")
+    return {"custom_id": custom_id, "content": reduce_contents([item["content"] for _, item in parts])}
+
+
+def unique(values: list) -> list:
+    """Values in first-seen order without repeats"""
+    seen = set()
+    result = []
+    for value in values:
+        key = repr(value)
+        if key not in seen:
+            seen.add(key)
+            result.append(value)
+    return result
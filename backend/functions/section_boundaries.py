@@ -0,0 +1,124 @@
+import logging
+import os
+from typing import AsyncIterator, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Page ranges scored at or above this are labelled locally, the rest still go to Claude
+BOUNDARY_CONFIDENCE_THRESHOLD = float(os.getenv("BOUNDARY_CONFIDENCE_THRESHOLD", "0.9"))
+BOUNDARY_SCORING = os.getenv("BOUNDARY_SCORING", "1") != "0"
+
+HEADER_CONFIDENCE = 0.95  # the section's own header or running footer is on the pages
+TOC_CONFIDENCE = 0.95  # every page is a table of contents
+OTHER_SECTION_CONFIDENCE = 0.9  # every page carries another section's header or footer
+BODY_CONFIDENCE = 0.75  # inside the section's body by position only, left to Claude by default
+
+
+def section_body_pages(signals: dict[int, dict], last_page: int) -> dict[int, str]:
+    """
+    The section whose body each page falls in: from its header (or running footer) until
+    END OF SECTION, the next section's header or a TOC page.
+    """
+    body = {}
+    current = None
+    for page in range(last_page + 1):
+        signal = signals.get(page, {})
+        if signal.get("toc"):
+            current = None
+            continue
+
+        headers, footers = signal.get("headers", []), signal.get("footers", [])
+        if headers:
+            current = headers[-1]
+        elif footers and current not in footers:
+            current = footers[0]
+        if current:
+            body[page] = current
+
+        # A marker closes the section unless a header after it opened the next one
+        if signal.get("ends") and (not headers or headers[-1] in signal["ends"]):
+            current = None
+    return body
+
+
+def score_page_range(section_number: str, pages: list[int], signals: dict[int, dict], body: dict[int, str]) -> tuple[Optional[bool], float, str]:
+    """(is_primary, confidence, reasoning) for one section over one page range; is_primary None when undecided"""
+    def is_toc(page: int) -> bool:
+        return bool(signals.get(page, {}).get("toc"))
+
+    def owners(page: int) -> set[str]:
+        signal = signals.get(page, {})
+        return set(signal.get("headers", [])) | set(signal.get("footers", []))
+
+    explicit = [page for page in pages if not is_toc(page) and section_number in owners(page)]
+    if explicit:
+        return True, HEADER_CONFIDENCE, f"Section header or running footer for {section_number} on page(s) {explicit}"
+
+    if all(is_toc(page) for page in pages):
+        return False, TOC_CONFIDENCE, "Table of contents page(s), which only list the section"
+
+    if all(is_toc(page) or (owners(page) and body.get(page) != section_number) for page in pages):
+        others = sorted({owner for page in pages for owner in owners(page)})
+        return False, OTHER_SECTION_CONFIDENCE, f"Page(s) carry the header or running footer of section(s) {others}"
+
+    if any(body.get(page) == section_number for page in pages):
+        return True, BODY_CONFIDENCE, f"Page(s) fall between the header of {section_number} and its end"
+
+    return None, 0.0, "No boundary signals for this section"
+
+
+def local_classification_results(
+    sections: dict[str, dict],
+    groups: list[dict],
+    page_signals: Optional[dict],
+    threshold: float = BOUNDARY_CONFIDENCE_THRESHOLD
+) -> dict[str, dict]:
+    """
+    Classify page ranges from boundary signals (see section_pages_detection.page_signals) where
+    they are conclusive: {custom_id: content} shaped like a classification response, for the
+    per-section groups of group_classification_requests. Ranges scored below threshold are left
+    out and go to Claude as before.
+    """
+    if not page_signals:
+        return {}
+    # Job payloads round-trip through JSON, which turns the page indices into strings
+    signals = {int(page): signal for page, signal in page_signals.items()}
+
+    page_sections: dict[int, set[str]] = {}
+    for division in sections.values():
+        for section_number, section in division.items():
+            for page in [page for multi in section.get("multi", []) for page in range(multi[0], multi[-1] + 1)] + section.get("single", []):
+                page_sections.setdefault(page, set()).add(section_number)
+
+    last_page = max([*signals, *page_sections, 0])
+    body = section_body_pages(signals, last_page)
+
+    results = {}
+    for group in groups:
+        for division, section_number, custom_id in group["members"]:
+            is_primary, confidence, reasoning = score_page_range(section_number, group["pages"], signals, body)
+            if is_primary is None or confidence < threshold:
+                continue
+            results[custom_id] = {
+                "section_title": sections.get(division, {}).get(section_number, {}).get("title", ""),
+                "reasoning": reasoning,
+                "pages_analyzed": group["pages"],
+                "confidence": confidence,
+                "is_primary": is_primary,
+                "referenced_sections": sorted(
+                    {other for page in group["pages"] for other in page_sections.get(page, ())} - {section_number}),
+                "classified_by": "boundary_scoring",
+            }
+
+    if results:
+        primary = sum(1 for content in results.values() if content["is_primary"])
+        logger.info(f"Boundary scoring classified {len(results)} page range(s) locally: {primary} primary, "
+                    f"{len(results) - primary} reference")
+    return results
+
+
+async def iter_local_results(local: dict[str, dict]) -> AsyncIterator[dict]:
+    """Locally classified results shaped like parsed batch results"""
+    for custom_id, content in local.items():
+        yield {"custom_id": custom_id, "content": content, "local": True}
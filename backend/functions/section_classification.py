@@ -1,19 +1,36 @@
-from typing import Any, Dict
+from typing import Any, AsyncIterator, Dict
 from dotenv import load_dotenv
 from pydantic import BaseModel
-from typing import Callable, Type, List
-from prompts import CLASSIFICATION_PROMPT
+from typing import Callable, Collection, Optional, Type, List
+from prompts import (
+    CLASSIFICATION_PROMPT,
+    CLASSIFICATION_CONTEXT,
+    MULTI_SECTION_CLASSIFICATION_PROMPT,
+    MULTI_SECTION_CLASSIFICATION_CONTEXT
+)
 import logging
-import asyncio
+import re
 import time
 import os
 import resend
 from .section_summary import section_summaries
+from .page_dedup import reusable_classification_results, iter_reused_results
+from .section_boundaries import local_classification_results, iter_local_results, BOUNDARY_SCORING
+from .page_classifier import page_classifier, PAGE_CLASSIFIER
+from .request_split import split_part_custom_id, parse_custom_id, parse_split_custom_id, reduce_split_results, unique
 from classes import (
     S3Bucket,
     Anthropic,
     db,
+    batch_watcher,
+    job_queue,
+    progress_hub,
+    response_cache,
+    llm_scheduler,
+    token_estimator,
+    JOB_WAITING,
     make_classification_schema,
+    make_multi_section_classification_schema,
     PDFPageConverter
 )
 
@@ -25,6 +42,11 @@ logger = logging.getLogger(__name__)
 anthropic = Anthropic()
 pdf_converter = PDFPageConverter()
 
+SAVE_CHUNK_SIZE = 500  # classification results persisted per transaction
+
+# Sections detected on the same page range are classified together in one request
+MULTI_SECTION_CLASSIFICATION = os.getenv("MULTI_SECTION_CLASSIFICATION", "1") != "0"
+
 
 def send_mail(spec_id: str, completion_time: float) -> Dict:
     resend.api_key = os.getenv("RESEND_API_KEY")
@@ -49,7 +71,128 @@ def format_time(seconds: float) -> str:
         return f"{seconds/3600:.2f} hours"
 
 
-async def save_classification_results(spec_id: str, batch_results: list[list[dict]]) -> dict[str, Any]:
+def section_custom_id(division: str, section_number: str, spec_id: str, pages: list[int]) -> str:
+    safe_section_number = section_number.replace(".", "_")
+    if len(pages) > 1:
+        return f'{division}-{safe_section_number}-{spec_id}-{pages[0]}-{pages[-1]}'
+    return f'{division}-{safe_section_number}-{spec_id}-{pages[0]}'
+
+
+def group_classification_requests(
+    sections: dict[str, dict],
+    spec_id: str,
+    multi_section: bool = MULTI_SECTION_CLASSIFICATION,
+    exclude: Optional[Collection[str]] = None
+) -> list[dict]:
+    """
+    Plan one request per group: {"custom_id", "pages", "members": [(division, section_number, section_custom_id)]}.
+
+    With multi_section, every section detected on the same page range shares one request
+    (custom_id m-{spec_id}-{start}[-{end}]). A range with a single candidate section, and every
+    range when multi_section is off, keeps the per-section request and custom_id. Sections whose
+    custom_id is in exclude (e.g. reused results) are left out. The plan is deterministic, so the
+    batch handler can rebuild it to fan results out.
+    """
+    exclude = exclude or ()
+    units: list[tuple[str, str, list[int]]] = []
+    for division_number, division in sections.items():
+        for section_number, section in division.items():
+            for multi in section.get("multi", []):
+                units.append((division_number, section_number, list(range(multi[0], multi[-1] + 1))))
+            for single in section.get("single", []):
+                units.append((division_number, section_number, [single]))
+
+    by_range: dict[tuple, list[tuple[str, str, str]]] = {}
+    for division_number, section_number, pages in units:
+        custom_id = section_custom_id(division_number, section_number, spec_id, pages)
+        if custom_id in exclude:
+            continue
+        # Without multi_section every section is its own group
+        range_key = (pages[0], pages[-1]) if multi_section else (custom_id,)
+        by_range.setdefault(range_key, []).append((division_number, section_number, custom_id))
+
+    groups = []
+    for members in by_range.values():
+        _, _, first_custom_id = members[0]
+        pages = parse_custom_id(first_custom_id)[2]
+        if len(members) == 1:
+            custom_id = first_custom_id
+        elif len(pages) > 1:
+            custom_id = f"m-{spec_id}-{pages[0]}-{pages[-1]}"
+        else:
+            custom_id = f"m-{spec_id}-{pages[0]}"
+        groups.append({"custom_id": custom_id, "pages": pages, "members": members})
+    return groups
+
+
+def normalize_section_number(section_number: str) -> str:
+    return re.sub(r"[^0-9a-z]", "", str(section_number).lower())
+
+
+def split_section_results(custom_id: str, content: dict, group: Optional[dict]) -> list[tuple[str, Optional[dict]]]:
+    """
+    Fan a multi-section result out into (section custom_id, content) pairs shaped like single-section
+    results. A section the model left out of its answer comes back with None content.
+    """
+    if not group or len(group["members"]) == 1:
+        return [(custom_id, content)]
+
+    # Section numbers are matched on their digits and letters only: the schema no longer pins the
+    # exact strings, and "23 05 00" and "230500" are the same section
+    verdicts = {
+        normalize_section_number(verdict.get("section_number", "")): verdict
+        for verdict in content.get("sections", [])
+    }
+    pages_analyzed = content.get("pages_analyzed") or group["pages"]
+    results = []
+    for _, section_number, member_custom_id in group["members"]:
+        verdict = verdicts.get(normalize_section_number(section_number))
+        results.append((member_custom_id, {**verdict, "section_number": section_number, "pages_analyzed": pages_analyzed}
+                        if verdict is not None else None))
+    return results
+
+
+def reduce_classification_parts(contents: list[dict]) -> dict:
+    """
+    One verdict from the verdicts on consecutive parts of a split range: primary if any part found
+    the section body, with that part's title; pages and referenced sections are unioned.
+    """
+    if "sections" in contents[0]:
+        by_section: dict[str, list[dict]] = {}
+        for content in contents:
+            for verdict in content.get("sections", []):
+                by_section.setdefault(normalize_section_number(verdict.get("section_number", "")), []).append(verdict)
+        return {
+            "pages_analyzed": unique([page for content in contents for page in content.get("pages_analyzed", [])]),
+            "sections": [reduce_classification_parts(verdicts) for verdicts in by_section.values()],
+        }
+
+    primary = [content for content in contents if content.get("is_primary")]
+    lead = primary[0] if primary else contents[0]
+    return {
+        **lead,
+        "is_primary": bool(primary),
+        # A primary verdict needs one confident part, a reference verdict needs every part to agree
+        "confidence": max(c.get("confidence", 0) for c in primary) if primary else min(c.get("confidence", 0) for c in contents),
+        "reasoning": " ".join(content.get("reasoning", "") for content in contents),
+        "pages_analyzed": unique([page for content in contents for page in content.get("pages_analyzed", [])]),
+        "referenced_sections": unique([ref for content in contents for ref in content.get("referenced_sections", [])]),
+    }
+
+
+async def save_classification_results(
+    spec_id: str,
+    batch_results: list[AsyncIterator[dict]],
+    cache_keys: Optional[dict[str, str]] = None,
+    multi_section_groups: Optional[dict[str, dict]] = None
+) -> dict[str, Any]:
+    """
+    Consume streamed batch results, persisting every SAVE_CHUNK_SIZE items in one transaction.
+    Parts of a range split to fit the context window are reduced into one result for the range.
+    Results of multi-section requests (multi_section_groups, by custom_id) are fanned out into one
+    result per section under the section's own custom_id, so everything downstream is unchanged.
+    """
+    multi_section_groups = multi_section_groups or {}
     total_divisions: set[str] = set()
     total_sections: set[str] = set()
     sections_with_primary_count: int = 0
@@ -58,71 +201,121 @@ async def save_classification_results(spec_id: str, batch_results: list[list[dic
 
     errors: int = 0
     failed_custom_ids = set()
+    classification_items: list[dict] = []
+    cache_entries: list[dict] = []
+
+    async def flush():
+        nonlocal errors
+        # Manual summary flags wait until every chunk is in, a later chunk may hold the primary page
+        applied = await db.apply_classification_results(spec_id, classification_items, mark_manual=False)
+        for section_number in applied["missing_sections"]:
+            logger.error(
+                f"Failed to update section pages for {section_number} - section not found")
+            errors += 1
+        classification_items.clear()
+        await response_cache.put_many(cache_entries)
+        cache_entries.clear()
+
+    async def add_section_result(custom_id: str, content: dict):
+        nonlocal sections_with_primary_count, sections_with_reference_count
+        split_custom_id = custom_id.split('-')
+
+        division = split_custom_id[0]
+        section_number = split_custom_id[1].replace("_", ".")
+        is_primary = content.get('is_primary', False)
 
-    for batch in batch_results:
-        for item in batch:
-            custom_id = item.get('custom_id', '')
+        custom_id_length = len(split_custom_id)
 
-            logger.info(f"BATCH ITEM: {item}")
-            if item.get('type') == 'errored':
-                logger.error(f"Errored for {custom_id}: {item.get('error')}")
-                errors += 1
+        # If there are multiple pages analyzed, use the start and end index of the last page
+        start_index = split_custom_id[-2] if custom_id_length == 9 else split_custom_id[-1]
+        end_index = split_custom_id[-1]
+
+        full_range = [page for page in range(
+            int(start_index), int(end_index) + 1)]
+
+        if is_primary:
+            sections_with_primary_count += 1
+            if division not in sections_with_primary:
+                sections_with_primary[division] = {}
+            if section_number not in sections_with_primary[division]:
+                sections_with_primary[division][section_number] = {
+                    "multi": [], "single": []}
+
+            if len(full_range) > 1:
+                sections_with_primary[division][section_number]["multi"].append(
+                    full_range)
+            else:
+                sections_with_primary[division][section_number]["single"].append(
+                    full_range[0])
+        else:
+            sections_with_reference_count += 1
+
+        total_divisions.add(division)
+        total_sections.add(section_number)
+
+        classification_items.append({
+            "section_number": section_number,
+            "custom_id": custom_id,
+            "is_primary": is_primary,
+            "pages": full_range,
+            "result": content,
+        })
+        if len(classification_items) >= SAVE_CHUNK_SIZE:
+            await flush()
+
+    async def add_result(custom_id: str, item: dict):
+        nonlocal errors
+        group = multi_section_groups.get(custom_id)
+
+        if item.get('type') == 'errored':
+            logger.error(f"Errored for {custom_id}: {item.get('error')}")
+            errors += 1
+            if group:
+                failed_custom_ids.update(member[2] for member in group["members"])
+            else:
                 failed_custom_ids.add(custom_id)
+            return
+
+        for section_custom_id, content in split_section_results(custom_id, item.get('content'), group):
+            if content is None:
+                logger.error(f"No verdict for {section_custom_id} in multi-section result {custom_id}")
+                errors += 1
+                failed_custom_ids.add(section_custom_id)
                 continue
+            await add_section_result(section_custom_id, content)
 
-            split_custom_id = custom_id.split('-')
+    # Parts of ranges split to fit the context window, by the range's custom_id, reduced once all are in
+    split_results: dict[str, list[tuple[int, dict]]] = {}
 
-            content = item.get('content')
-            division = split_custom_id[0]
-            section_number = split_custom_id[1].replace("_", ".")
-            is_primary = content.get('is_primary', False)
+    for batch in batch_results:
+        async for item in batch:
+            custom_id = item.get('custom_id', '')
 
-            custom_id_length = len(split_custom_id)
+            logger.debug(f"BATCH ITEM: {item}")
 
-            # If there are multiple pages analyzed, use the start and end index of the last page
-            start_index = split_custom_id[-2] if custom_id_length == 9 else split_custom_id[-1]
-            end_index = split_custom_id[-1]
+            cache_entry = response_cache.entry_from_result(item, (cache_keys or {}).get(custom_id))
+            if cache_entry:
+                cache_entries.append(cache_entry)
 
-            full_range = [page for page in range(
-                int(start_index), int(end_index) + 1)]
+            range_custom_id, part = parse_split_custom_id(custom_id)
+            if part is not None:
+                split_results.setdefault(range_custom_id, []).append((part, item))
+                continue
 
-            if is_primary:
-                sections_with_primary_count += 1
-                if division not in sections_with_primary:
-                    sections_with_primary[division] = {}
-                if section_number not in sections_with_primary[division]:
-                    sections_with_primary[division][section_number] = {
-                        "multi": [], "single": []}
+            await add_result(custom_id, item)
 
-                if len(full_range) > 1:
-                    sections_with_primary[division][section_number]["multi"].append(
-                        full_range)
-                else:
-                    sections_with_primary[division][section_number]["single"].append(
-                        full_range[0])
-            else:
-                sections_with_reference_count += 1
+    for range_custom_id, parts in split_results.items():
+        await add_result(range_custom_id, reduce_split_results(range_custom_id, parts, reduce_classification_parts))
 
-            total_divisions.add(division)
-            total_sections.add(section_number)
+    if classification_items or cache_entries:
+        await flush()
 
-            result = await db.update_section_pages(
-                spec_id=spec_id,
-                section_number=section_number,
-                primary_pages=full_range if is_primary else [],
-                reference_pages=full_range if not is_primary else []
-            )
-            section_id = result.get('section_id')
-            if section_id:
-                await db.save_classification_result(
-                    section_id=section_id,
-                    custom_id=custom_id,
-                    result=content
-                )
-            else:
-                logger.error(
-                    f"Failed to update section pages for {section_number} - no section_id returned")
-                errors += 1
+    primary_sections = {
+        section_number
+        for division in sections_with_primary.values()
+        for section_number in division
+    }
+    await db.mark_sections_manual(spec_id, sorted(total_sections - primary_sections))
 
     await db.update_project(
         spec_id=spec_id,
@@ -134,15 +327,6 @@ async def save_classification_results(spec_id: str, batch_results: list[list[dic
         errors=errors
     )
 
-    for section_number in total_sections:
-        division = section_number[:2]
-        if division not in sections_with_primary or section_number not in sections_with_primary[division]:
-            await db.update_section_summary_status(
-                spec_id=spec_id,
-                section_number=section_number,
-                summary_status="manual"
-            )
-
     logger.info(f"failed_custom_ids: {failed_custom_ids}")
     return {
         "failed_custom_ids": list(failed_custom_ids),
@@ -151,63 +335,67 @@ async def save_classification_results(spec_id: str, batch_results: list[list[dic
 
 
 async def build_classification_requests(
-    sections: dict[int, dict],
+    groups: list[dict],
     spec_id: str,
     system_prompt: str,
     dynamic_schema: Callable[[str], Type[BaseModel]],
     s3: S3Bucket,
     s3_client: any,
     model: str = "claude-sonnet-4-6",
-    max_tokens: int = 16000
-) -> list[dict]:
+    max_tokens: int = 16000,
+    multi_section_prompt: str = MULTI_SECTION_CLASSIFICATION_PROMPT,
+    multi_section_schema: Callable[[list[str]], Type[BaseModel]] = make_multi_section_classification_schema,
+    context_prompt: str = CLASSIFICATION_CONTEXT,
+    multi_section_context: str = MULTI_SECTION_CLASSIFICATION_CONTEXT
+) -> tuple[list[dict], dict[str, str]]:
+    """
+    Build one request per group from group_classification_requests. Returns the requests plus
+    {presigned url: page content hash} for the response cache.
+
+    System prompts and schemas are the same for every request, the section numbers and pages go
+    into a text block after the documents, so the whole batch shares one cached prompt prefix.
+    """
     requests = []
-
-    for division_number, division in sections.items():
-        for section_number, section in division.items():
-            for multi in section.get("multi", []):
-                start_index, end_index = multi[0], multi[-1]
-                page_indices = list[int](range(start_index, end_index + 1))
-
-                safe_section_number = section_number.replace(".", "_")
-                custom_id = f'{division_number}-{safe_section_number}-{spec_id}-{start_index}-{end_index}'
-
-                content_blocks = []
-                for page in page_indices:
-                    key = f"{spec_id}/original_pages/page_{page:04d}.pdf"
-                    url = await s3.generate_presigned_url(key, s3_client)
-                    content_blocks.append(anthropic.pdf_document_block_url(url))
-
-                request = await anthropic.build_claude_request(
-                    custom_id,
-                    content_blocks,
-                    system_prompt=anthropic.build_prompt(system_prompt, {
-                        "section_number": section_number, "pages_analyzed": page_indices}),
-                    schema=dynamic_schema(section_number),
-                    model=model,
-                    max_tokens=max_tokens
-                )
-                requests.append(request)
-
-            for single in section.get("single", []):
-                safe_section_number = section_number.replace(".", "_")
-                custom_id = f'{division_number}-{safe_section_number}-{spec_id}-{single}'
-
-                key = f"{spec_id}/original_pages/page_{single:04d}.pdf"
+    source_hashes: dict[str, str] = {}
+    etags = await s3.get_object_etags_with_client([f"{spec_id}/original_pages/"], s3_client)
+    await token_estimator.load_pages(spec_id)
+
+    for group in groups:
+        section_numbers = [section_number for _, section_number, _ in group["members"]]
+        if len(section_numbers) == 1:
+            prompt, context_template, schema = system_prompt, context_prompt, dynamic_schema(section_numbers[0])
+        else:
+            prompt, context_template, schema = multi_section_prompt, multi_section_context, multi_section_schema(section_numbers)
+
+        # Ranges too large for one context window go out as {custom_id}-1, -2, ... and are reduced on save
+        page_splits = anthropic.plan_page_splits(
+            group["pages"], prompt, max_tokens, page_costs=token_estimator.page_costs(spec_id, group["pages"]))
+        for part, page_indices in enumerate(page_splits, start=1):
+            content_blocks = []
+            for page in page_indices:
+                key = f"{spec_id}/original_pages/page_{page:04d}.pdf"
                 url = await s3.generate_presigned_url(key, s3_client)
-                content_blocks = [anthropic.pdf_document_block_url(url)]
-
-                request = await anthropic.build_claude_request(
-                    custom_id,
-                    content_blocks,
-                    system_prompt=anthropic.build_prompt(system_prompt, {
-                        "section_number": section_number, "pages_analyzed": [single]}),
-                    schema=dynamic_schema(section_number),
-                    model=model,
-                    max_tokens=max_tokens
-                )
-                requests.append(request)
+                if key in etags:
+                    source_hashes[url] = etags[key]
+                content_blocks.append(anthropic.pdf_document_block_url(url))
+
+            content_blocks.append(anthropic.text_block(anthropic.build_prompt(context_template, {
+                "section_number": section_numbers[0],
+                "section_numbers": ", ".join(section_numbers),
+                "pages_analyzed": page_indices,
+            })))
+
+            request = await anthropic.build_claude_request(
+                group["custom_id"] if len(page_splits) == 1 else split_part_custom_id(group["custom_id"], part),
+                content_blocks,
+                system_prompt=prompt,
+                schema=schema,
+                model=model,
+                max_tokens=max_tokens
+            )
+            requests.append(request)
 
-    return requests
+    return requests, source_hashes
 
 
 def structure_failed_custom_ids(failed_custom_ids: list[str]):
@@ -243,47 +431,213 @@ def structure_failed_custom_ids(failed_custom_ids: list[str]):
     return divisions_and_sections
 
 
-async def page_classification(spec_id: str, divisions_and_sections: dict[str, dict[str, List[int]]], retry: int = 0, max_retries: int = 3):
-    """Background task to classify all sections"""
-    s3 = S3Bucket()
-    start_time = time.time()
+async def page_classification(
+    spec_id: str,
+    divisions_and_sections: dict[str, dict[str, List[int]]],
+    retry: int = 0,
+    max_retries: int = 3,
+    start_time: float = None,
+    dedupe_key: str = None,
+    multi_section: bool = MULTI_SECTION_CLASSIFICATION,
+    page_signals: Optional[dict[int, dict]] = None
+) -> int:
+    """
+    Queue a classification run for spec_id; returns the job id. page_signals are the boundary
+    signals from section detection; ranges they settle are classified without Claude.
+    """
+    return await job_queue.enqueue(
+        kind="classification",
+        spec_id=spec_id,
+        payload={
+            "divisions_and_sections": divisions_and_sections,
+            "retry": retry,
+            "max_retries": max_retries,
+            "start_time": start_time or time.time(),
+            "multi_section": multi_section,
+            "page_signals": page_signals or {},
+        },
+        dedupe_key=dedupe_key
+    )
 
+
+async def run_classification_job(job: dict) -> str:
+    """Job handler: classify the spec's sections, publishing a terminal error event once the last attempt fails"""
     try:
-        logger.info(f"Starting background classification for {spec_id}")
-
-        batch_ids = []
-        batch_results = []
-
-        async with s3.s3_client() as s3_client:
-            requests = await build_classification_requests(
-                sections=divisions_and_sections,
-                spec_id=spec_id,
-                system_prompt=CLASSIFICATION_PROMPT,
-                dynamic_schema=make_classification_schema,
-                s3=s3,
-                s3_client=s3_client,
-                model="claude-sonnet-4-6",
-                max_tokens=16000
-            )
+        return await submit_classification(job)
+    except Exception as e:
+        final = job["attempts"] >= job["max_attempts"]
+        progress_hub.publish(job["spec_id"], "error", terminal=final, error=str(e), attempt=job["attempts"])
+        raise
+
+
+async def submit_classification(job: dict) -> str:
+    """
+    Build and submit classification batches, then hand them to the batch watcher.
 
-        batches = anthropic.split_batch(requests)
-        for batch in batches:
+    Each submitted batch is checkpointed, so a resumed attempt skips the requests already
+    submitted and re-attaches to the recorded batch ids instead of paying for them twice.
+    """
+    s3 = S3Bucket()
+    job_id = job["id"]
+    spec_id = job["spec_id"]
+    payload = job["payload"]
+    progress = dict(job["progress"])
+    batch_ids = list(progress.get("batch_ids", []))
+    submitted_requests = progress.get("submitted_requests", 0)
+
+    logger.info(f"Starting background classification for {spec_id}")
+
+    # Reuse and the response cache are consulted once per job and the answer checkpointed, so a
+    # resumed attempt submits exactly the requests the first attempt could not answer locally
+    checkpointed = "cache_keys" in progress
+    if checkpointed or submitted_requests:
+        reused = progress.get("reused", {})
+        local = progress.get("local", {})
+    else:
+        section_groups = group_classification_requests(payload["divisions_and_sections"], spec_id, multi_section=False)
+        # Sections over pages duplicated from an earlier spec take that spec's results
+        reused = await reusable_classification_results(spec_id, [
+            member_custom_id
+            for group in section_groups
+            for _, _, member_custom_id in group["members"]
+        ])
+        # Ranges with conclusive headers, footers or TOC pages are labelled without Claude
+        local = local_classification_results(
+            payload["divisions_and_sections"],
+            [group for group in section_groups if group["custom_id"] not in reused],
+            payload.get("page_signals")
+        ) if BOUNDARY_SCORING else {}
+        # The model trained on earlier verdicts labels the ranges it is confident about
+        if PAGE_CLASSIFIER:
+            local.update(await page_classifier.classify(
+                spec_id,
+                payload["divisions_and_sections"],
+                [group for group in section_groups if group["custom_id"] not in reused and group["custom_id"] not in local]
+            ))
+
+    groups = group_classification_requests(
+        payload["divisions_and_sections"], spec_id, payload.get("multi_section", False), exclude={**reused, **local})
+
+    async with s3.s3_client() as s3_client:
+        requests, source_hashes = await build_classification_requests(
+            groups=groups,
+            spec_id=spec_id,
+            system_prompt=CLASSIFICATION_PROMPT,
+            dynamic_schema=make_classification_schema,
+            s3=s3,
+            s3_client=s3_client,
+            model="claude-sonnet-4-6",
+            max_tokens=16000
+        )
+
+    if not requests and not reused and not local:
+        logger.info(f"No sections to classify for {spec_id}")
+        return None
+
+    if not checkpointed:
+        progress["reused"], progress["local"], progress["cache_keys"], progress["cached"] = reused, local, {}, []
+        if not submitted_requests:
+            _, progress["cache_keys"], progress["cached"] = await anthropic.partition_cached_requests(
+                requests, source_hashes)
+        await job_queue.checkpoint(job_id, progress)
+    cached = set(progress["cached"])
+    requests_to_submit = [request for request in requests if request["custom_id"] not in cached]
+    logger.info(
+        f"Classification for {spec_id}: {len(requests)} request(s) for "
+        f"{sum(len(group['members']) for group in groups)} section page range(s), "
+        f"{len(cached)} cached, {len(reused)} reused, {len(local)} classified locally")
+
+    if submitted_requests:
+        logger.info(
+            f"Resuming classification job {job_id}: {submitted_requests} requests already in {len(batch_ids)} batch(es)")
+
+    context = {
+        "job_id": job_id,
+        "retry": payload["retry"],
+        "max_retries": payload["max_retries"],
+        "start_time": payload["start_time"],
+    }
+
+    remaining = requests_to_submit[submitted_requests:]
+    # Small runs go realtime and finish in seconds; once a batch is submitted the job stays on batches
+    if remaining and not batch_ids and llm_scheduler.choose_mode(len(remaining)) == "realtime":
+        if await finish_classification_now(spec_id, [llm_scheduler.run_realtime(remaining)], context):
+            progress_hub.publish(spec_id, "classification_submitted", terminal=True, batches=0, realtime=True,
+                                 requests=len(remaining), cached=len(cached), reused=len(reused), local=len(local))
+        return None
+
+    if remaining:
+        # Features of each request are stored now and labelled with its usage when the results are read
+        await token_estimator.register(remaining)
+        for batch in anthropic.split_batch(remaining):
             result = await anthropic.create_batch(batch)
+            if "batch_id" not in result:
+                raise RuntimeError(result.get("error"))
             batch_ids.append(result["batch_id"])
+            submitted_requests += len(batch)
+            progress.update(batch_ids=batch_ids, submitted_requests=submitted_requests)
+            await job_queue.checkpoint(job_id, progress)
+            progress_hub.publish(spec_id, "batches_submitted", batches=len(batch_ids),
+                                 requests=submitted_requests, total_requests=len(requests_to_submit))
+
+    if not batch_ids:
+        # Every request was answered from the response cache, reused or classified locally, nothing to wait for
+        if await finish_classification_now(spec_id, [], context):
+            progress_hub.publish(spec_id, "classification_submitted", terminal=True,
+                                 batches=0, requests=0, cached=len(cached), reused=len(reused), local=len(local))
+        return None
+
+    await batch_watcher.watch(
+        kind="classification",
+        spec_id=spec_id,
+        batch_ids=batch_ids,
+        context=context,
+        group_id=f"job-{job_id}"
+    )
+    progress_hub.publish(spec_id, "classification_submitted", terminal=True,
+                         batches=len(batch_ids), requests=submitted_requests, cached=len(cached), reused=len(reused),
+                         local=len(local))
+    return JOB_WAITING
 
-        poll_results = await asyncio.gather(*[anthropic.poll_and_fetch_batch_results(batch_id) for batch_id in batch_ids])
-        batch_results.extend(poll_results)
 
-        results = await save_classification_results(spec_id, batch_results)
+async def handle_classification_batches(spec_id: str, batch_results: list[AsyncIterator[dict]], context: dict):
+    """Batch watcher callback: persist results, queue summaries and retries, then finish the job"""
+    job_id = context.get("job_id")
+    retry = context.get("retry", 0)
+    max_retries = context.get("max_retries", 3)
+    start_time = context.get("start_time") or time.time()
+
+    try:
+        job = await db.get_job(job_id) if job_id else None
+        progress = job["progress"] if job else {}
+        cache_keys = progress.get("cache_keys", {})
+        cached_results = response_cache.iter_results(
+            {custom_id: cache_keys[custom_id] for custom_id in progress.get("cached", [])})
+
+        reused = progress.get("reused", {})
+        reused_results = iter_reused_results(reused)
+        local = progress.get("local", {})
+        local_results = iter_local_results(local)
+
+        payload = job["payload"] if job else {}
+        multi_section_groups = {
+            group["custom_id"]: group
+            for group in group_classification_requests(
+                payload.get("divisions_and_sections", {}), spec_id, payload.get("multi_section", False),
+                exclude={**reused, **local})
+        }
+
+        results = await save_classification_results(
+            spec_id, [*batch_results, cached_results, reused_results, local_results], cache_keys, multi_section_groups)
         failed_custom_ids = results.get("failed_custom_ids", set())
 
-        asyncio.create_task(
-            section_summaries(
-                spec_id,
-                results.get("sections_with_primary", {}),
-                retry,
-                max_retries
-            )
+        # Dedupe keys keep a re-dispatched group from queueing its follow-ups twice
+        await section_summaries(
+            spec_id,
+            results.get("sections_with_primary", {}),
+            retry,
+            max_retries,
+            dedupe_key=f"job-{job_id}-summary" if job_id else None
         )
 
         if failed_custom_ids and retry < max_retries:
@@ -291,13 +645,13 @@ async def page_classification(spec_id: str, divisions_and_sections: dict[str, di
                 f"Failed custom ids found: {failed_custom_ids}, retrying...")
             structured_failed_custom_ids = structure_failed_custom_ids(
                 failed_custom_ids)
-            asyncio.create_task(
-                page_classification(
-                    spec_id,
-                    structured_failed_custom_ids,
-                    retry + 1,
-                    max_retries
-                )
+            await page_classification(
+                spec_id,
+                structured_failed_custom_ids,
+                retry + 1,
+                max_retries,
+                start_time,
+                dedupe_key=f"job-{job_id}-retry" if job_id else None
             )
         else:
             completion_time = format_time(time.time() - start_time)
@@ -305,5 +659,31 @@ async def page_classification(spec_id: str, divisions_and_sections: dict[str, di
             logger.info(f"Classification complete for {spec_id}")
 
     except Exception as e:
+        # The batch watcher dispatches the group again; results already applied are skipped
         logger.error(f"Classification failed for {spec_id}: {e}")
-        return {"error": f"Classification failed for {spec_id}: {e}"}, 500
+        raise
+
+    await job_queue.complete(job_id)
+
+
+async def fail_classification_batches(spec_id: str, context: dict, error: str):
+    """Batch watcher on_failed callback: the group will not be dispatched again, so fail its job"""
+    await job_queue.fail(context.get("job_id"), error)
+    progress_hub.publish(spec_id, "error", terminal=True, error=error, job_id=context.get("job_id"))
+
+
+async def finish_classification_now(spec_id: str, batch_results: list[AsyncIterator[dict]], context: dict) -> bool:
+    """
+    Run the batch handler inline (realtime, or nothing to wait for); a failure fails the job instead of re-running it.
+    Returns whether the handler succeeded.
+    """
+    try:
+        await handle_classification_batches(spec_id, batch_results, context)
+    except Exception as e:
+        await fail_classification_batches(spec_id, context, str(e))
+        return False
+    return True
+
+
+batch_watcher.register("classification", handle_classification_batches, on_failed=fail_classification_batches)
+job_queue.register("classification", run_classification_job)
@@ -1,8 +1,13 @@
 import re
+import os
+import mmap
 import asyncio
 import fitz
+from functools import lru_cache
+from typing import Callable, Optional
 from classes import PDFPageConverter, S3Bucket
-from concurrent.futures import ProcessPoolExecutor
+from classes.s3_buckets import write_temp_pdf, pdf_page_count
+from concurrent.futures import Executor, ProcessPoolExecutor
 from csi_masterformat import divisions_and_sections
 import logging
 
@@ -21,6 +26,14 @@ def build_known_sections() -> set:
 
 KNOWN_SECTIONS = build_known_sections()
 
+# Prefix indexes built once at import so validation never scans KNOWN_SECTIONS
+KNOWN_BASE_SECTIONS = frozenset(
+    section for section in KNOWN_SECTIONS if len(section) == 6)
+KNOWN_SECTION_PREFIXES = frozenset(section[:4] for section in KNOWN_SECTIONS)
+
+# Candidate strings repeat heavily across pages (headers, footers, cross-references)
+NORMALIZED_CACHE_SIZE = 65536
+
 # Regex is still used to find candidates, but every match is validated against KNOWN_SECTIONS
 # Finds patterns such as 003132, 00 31 32, 00-31-32, 00.31.32, 003132.12, 003132.12a, 00 31 32.12b, etc.
 CANDIDATE_PATTERN = re.compile(
@@ -29,14 +42,36 @@ CANDIDATE_PATTERN = re.compile(
     r"(?:\.\d{1,2})?[A-Za-z]?"
     r"(?![0-9])"
 )
-
-
+SEPARATOR_PATTERN = re.compile(r"[\s\-]")
+NORMALIZE_PATTERN = re.compile(
+    r"^(\d{2})\.?(\d{2})\.?(\d{2})(?:\.(\d+))?([a-zA-Z]?)$")
+
+# ---------- Boundary signals ----------
+# Layout cues that tell a section's own pages from pages that only mention it; scored in section_boundaries.py
+
+SECTION_NUMBER = r"(\d{2}[\s.\-]?\d{2}[\s.\-]?\d{2}(?:\.\d{1,2})?[A-Za-z]?)"
+# "SECTION 03 30 00" or "SECTION 033000 - CAST-IN-PLACE CONCRETE" alone on a line; cross-references are mixed case or mid-sentence
+HEADER_PATTERN = re.compile(rf"^\s*SECTION\s+{SECTION_NUMBER}(?:\s*[-\u2013\u2014:]\s*(\S.*?))?\s*$")
+END_PATTERN = re.compile(rf"^\s*END\s+OF\s+SECTION\b(?:\s+{SECTION_NUMBER})?", re.IGNORECASE)
+# Running page numbers such as "03 30 00 - 5", alone or after the section title
+FOOTER_PATTERN = re.compile(rf"(?<![0-9]){SECTION_NUMBER}\s*[-\u2013\u2014]\s*\d{{1,3}}\s*$")
+TOC_TITLE_PATTERN = re.compile(r"TABLE\s+OF\s+CONTENTS", re.IGNORECASE)
+# A TOC entry: a section number at the start of a line followed by its title
+TOC_ENTRY_PATTERN = re.compile(rf"^\s*{SECTION_NUMBER}\s*[-\u2013\u2014:]?\s+([A-Za-z].*?)\s*$")
+# Dot leaders and page counts after a TOC title
+TITLE_TAIL_PATTERN = re.compile(r"\s*(?:\.{3,}.*|\s\d{1,4})$")
+FOOTER_LINES = 4  # non-empty lines at the top and bottom of a page searched for running page numbers
+TOC_MIN_ENTRIES = 8  # entry lines that make a page a TOC even without the title
+TOC_MIN_SECTIONS = 5  # listed sections before the TOC is trusted to bound detection
+TOC_PAGE_GAP = 1  # pages without entries allowed inside one TOC (e.g. a divider between its pages)
+
+
+@lru_cache(maxsize=NORMALIZED_CACHE_SIZE)
 def normalize_section_number(section: str) -> str:
     """Normalize any format (00 31 32, 00-31-32, 003132) to compact form (003132)."""
-    clean = re.sub(r"[\s\-]", "", section)
+    clean = SEPARATOR_PATTERN.sub("", section)
 
-    match = re.match(
-        r"^(\d{2})\.?(\d{2})\.?(\d{2})(?:\.(\d+))?([a-zA-Z]?)$", clean)
+    match = NORMALIZE_PATTERN.match(clean)
     if match:
         base = match.group(1) + match.group(2) + match.group(3)
         subsection = match.group(4)
@@ -51,6 +86,7 @@ def normalize_section_number(section: str) -> str:
     return None
 
 
+@lru_cache(maxsize=NORMALIZED_CACHE_SIZE)
 def is_valid_section(raw_match: str) -> str:
     """Normalize a regex match and return it only if it's a known MasterFormat section number."""
     normalized = normalize_section_number(raw_match)
@@ -59,17 +95,14 @@ def is_valid_section(raw_match: str) -> str:
 
     # Also check base6 without suffix (e.g. 003132 from 003132.12)
     if normalized and len(normalized) > 6:
-        base = normalized[:6]
-        if base in KNOWN_SECTIONS:
+        if normalized[:6] in KNOWN_BASE_SECTIONS:
             return normalized
 
     # If the normalized is not a known section, check if the first 4 characters are a known section
     elif normalized:
-        base = normalized[:4]
-        for section in KNOWN_SECTIONS:
-            if section.startswith(base):
-                logger.info(f"Found known section: {normalized}")
-                return normalized
+        if normalized[:4] in KNOWN_SECTION_PREFIXES:
+            logger.info(f"Found known section: {normalized}")
+            return normalized
     return None
 
 
@@ -80,38 +113,177 @@ def flatten(section_numbers: list[list[str]]):
     return flattened_list
 
 
+def find_section_numbers(text: str) -> list[str]:
+    section_numbers = []
+    for match in CANDIDATE_PATTERN.finditer(text):
+        validated = is_valid_section(match.group(0))
+        if validated:
+            section_numbers.append(validated)
+    return section_numbers
+
+
+def page_signals(text: str) -> dict:
+    """
+    Boundary signals of one page: section headers, END OF SECTION markers (the section number, or
+    "" when the marker has none), running page-number footers and whether it is a TOC page. TOC
+    pages also carry their entries as [section number, title]. Empty when the page has none of them.
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    headers, ends, footers, entries = [], [], [], []
+
+    for line in lines:
+        if match := HEADER_PATTERN.match(line):
+            if section := is_valid_section(match.group(1)):
+                headers.append([section, (match.group(2) or "").strip()])
+        elif match := END_PATTERN.match(line):
+            ends.append((match.group(1) and is_valid_section(match.group(1))) or "")
+        elif (match := TOC_ENTRY_PATTERN.match(line)) and (section := is_valid_section(match.group(1))):
+            entries.append([section, match.group(2).strip()])
+
+    band = lines[:FOOTER_LINES] + lines[FOOTER_LINES:][-FOOTER_LINES:]
+    for line in band:
+        if match := FOOTER_PATTERN.search(line):
+            if (section := is_valid_section(match.group(1))) and section not in footers:
+                footers.append(section)
+
+    is_toc = len(entries) + max(0, len(headers) - 1) >= TOC_MIN_ENTRIES or any(
+        TOC_TITLE_PATTERN.search(line) for line in lines[:FOOTER_LINES * 2])
+    if is_toc and len(headers) > 1:
+        # TOCs that list "SECTION 03 30 00 - TITLE" lines: only the first can be the page's own header
+        entries = headers[1:] + entries
+        headers = headers[:1]
+    entries = [[section, TITLE_TAIL_PATTERN.sub("", title)] for section, title in entries]
+
+    signals = {}
+    if headers:
+        signals["headers"] = [section for section, _ in headers]
+    if ends:
+        signals["ends"] = ends
+    if footers:
+        signals["footers"] = footers
+    if is_toc:
+        signals["toc"] = True
+        if entries:
+            signals["toc_entries"] = entries
+    return signals
+
+
+def table_of_contents(signals: dict[int, dict]) -> dict:
+    """
+    The spec's table of contents from the page signals: the pages of its first run of TOC pages
+    and the sections listed there, {section number: title} in listing order. Later TOC pages
+    (e.g. per-division contents) add sections but do not move where the TOC ends.
+    """
+    toc_pages = sorted(page for page, signal in signals.items() if signal.get("toc"))
+    pages = []
+    for page in toc_pages:
+        if pages and page - pages[-1] > TOC_PAGE_GAP + 1:
+            break
+        pages.append(page)
+
+    sections: dict[str, str] = {}
+    for page in toc_pages:
+        for section, title in signals[page].get("toc_entries", []):
+            sections.setdefault(section, title)
+    return {"pages": pages, "sections": sections}
+
+
+def bound_by_toc(section_numbers: dict[int, list[str]], signals: dict[int, dict]) -> tuple[dict[int, list[str]], dict]:
+    """
+    Keep only candidates the TOC supports: sections listed in it (or with their own header
+    somewhere) on pages after the TOC that are not themselves TOC pages. A section header is
+    always kept on its own page, so front matter before the TOC survives. Without a TOC listing
+    at least TOC_MIN_SECTIONS sections the candidates are returned unchanged.
+    Returns (candidates, table_of_contents).
+    """
+    toc = table_of_contents(signals)
+    if len(toc["sections"]) < TOC_MIN_SECTIONS:
+        return section_numbers, toc
+
+    headed = {section for signal in signals.values() for section in signal.get("headers", [])}
+    allowed = {section[:6] for section in (*toc["sections"], *headed)}
+    toc_end = toc["pages"][-1]
+
+    bounded = {}
+    for page_index, numbers in section_numbers.items():
+        signal = signals.get(page_index, {})
+        in_body = page_index > toc_end and not signal.get("toc")
+        bounded[page_index] = [
+            number for number in numbers
+            if number in signal.get("headers", ()) or (in_body and number[:6] in allowed)
+        ]
+
+    before = sum(len(set(numbers)) for numbers in section_numbers.values())
+    after = sum(len(set(numbers)) for numbers in bounded.values())
+    logger.info(f"TOC on page(s) {toc['pages']} lists {len(toc['sections'])} sections; "
+                f"page candidates cut from {before} to {after}")
+    return bounded, toc
+
+
+def worker_scan_pdf_range(pdf_path: str, start_index: int, end_index: int) -> dict:
+    """Scan pages [start_index, end_index) of the original PDF, memory-mapped from a local temp file."""
+    converter = PDFPageConverter()
+    section_numbers = {page_index: []
+                       for page_index in range(start_index, end_index)}
+    signals = {}
+    texts = {}
+
+    with open(pdf_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm)
+        doc = fitz.open(stream=view, filetype="pdf")
+        try:
+            total_pages = doc.page_count
+            for page_index in range(start_index, end_index):
+                page = doc.load_page(page_index)
+                text = converter.extract_page_text(page, page_index, total_pages)
+                if text:
+                    texts[page_index] = text
+                    section_numbers[page_index].extend(find_section_numbers(text))
+                    if page_signal := page_signals(text):
+                        signals[page_index] = page_signal
+        finally:
+            doc.close()
+            view.release()
+
+    return {"section_numbers": section_numbers, "signals": signals, "texts": texts}
+
+
 def worker_scan_shard(spec_id: str, start_index: int, end_index: int) -> dict:
     async def _run():
         s3 = S3Bucket()
         converter = PDFPageConverter()
         section_numbers = {page_index: []
                            for page_index in range(start_index, end_index)}
+        signals = {}
+        texts = {}
 
         async with s3.s3_client() as s3_client:
             for page_index in range(start_index, end_index):
                 key = f"{spec_id}/original_pages/page_{page_index:04d}.pdf"
-                response = await s3_client.get_object(Bucket=s3.bucket_name, Key=key)
-                page_bytes = await response["Body"].read()
+                page_bytes = await s3.get_object_with_client(key, s3_client)
 
                 for page in converter.pdf_page_converter_generator(pdf=page_bytes):
                     text = page.get("text") or ""
                     if not text:
                         continue
-                    for match in CANDIDATE_PATTERN.finditer(text):
-                        validated = is_valid_section(match.group(0))
-                        if validated:
-                            section_numbers[page_index].append(validated)
+                    texts[page_index] = texts.get(page_index, "") + text
+                    section_numbers[page_index].extend(find_section_numbers(text))
+                    if page_signal := page_signals(text):
+                        signals[page_index] = {**signals.get(page_index, {}), **page_signal}
 
-        return section_numbers
+        return {"section_numbers": section_numbers, "signals": signals, "texts": texts}
 
     return asyncio.run(_run())
 
 
-def contiguous_page_divider(page_indices: dict[str, list[int]]) -> dict:
+def contiguous_page_divider(page_indices: dict[str, list[int]], titles: Optional[dict[str, str]] = None) -> dict:
+    """titles (e.g. from the spec's TOC) take precedence over the MasterFormat titles"""
+    titles = titles or {}
     dict_indices: dict[list[int]] = {section: {
         "single": [],
         "multi": [],
-        "title": divisions_and_sections.get(section[0:2], {}).get(section, "Undocumented Section Number (MSF2020)")
+        "title": titles.get(section) or divisions_and_sections.get(section[0:2], {}).get(
+            section, "Undocumented Section Number (MSF2020)")
     } for section in page_indices.keys()}
 
     if not page_indices:
@@ -137,7 +309,7 @@ def contiguous_page_divider(page_indices: dict[str, list[int]]) -> dict:
     return dict_indices
 
 
-def section_page_dict(section_numbers: dict):
+def section_page_dict(section_numbers: dict, titles: Optional[dict[str, str]] = None):
     section_page_dict = {}
 
     for page_index, section_numbers in section_numbers.items():
@@ -153,7 +325,7 @@ def section_page_dict(section_numbers: dict):
             else:
                 section_page_dict[normalized_section_number] = [page_index]
 
-    results = contiguous_page_divider(section_page_dict)
+    results = contiguous_page_divider(section_page_dict, titles)
     return results
 
 # Nest key:value into divisions as master key ----> {division: {section: [page_indices]}}
@@ -167,28 +339,92 @@ def division_parser(section_pages: dict) -> dict:
     return divisions_dict
 
 
-async def section_pages_detection(spec_id: str, s3: S3Bucket, s3_client: any, workers: int = 6) -> dict:
-    total_pages = await s3.get_original_page_count_with_client(spec_id, s3_client)
-    print("TOTAL PAGES: ", total_pages)
-
-    divider = total_pages / workers
-    shards = [(int(divider * i), int(divider * (i + 1)))
-              for i in range(workers)]
-    loop = asyncio.get_running_loop()
-
-    with ProcessPoolExecutor(max_workers=workers) as executor:
-        futures = [
-            loop.run_in_executor(executor, worker_scan_shard,
-                                 spec_id, start_index, end_index)
-            for start_index, end_index in shards
-        ]
-        results = await asyncio.gather(*futures)
-        flattened_results = {k: v for d in results for k, v in d.items()}
-
-        divisions = division_parser(section_page_dict(flattened_results))
-
-        return {
-            "total_divisions": len(divisions.keys()),
-            "total_sections": len(flattened_results.keys()),
-            "divisions_and_sections": divisions
-        }
+async def section_pages_detection(
+    spec_id: str,
+    s3: S3Bucket,
+    s3_client: any,
+    workers: int = 6,
+    pdf: Optional[bytes] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    pdf_path: Optional[str] = None,
+    executor: Optional[Executor] = None
+) -> dict:
+    """
+    Detect which pages mention which section numbers, plus the boundary signals of each page
+    (see page_signals) for local scoring before classification and the page text for the
+    local page classifier.
+
+    If the original PDF bytes (or the path of a local copy) are passed in, workers scan page ranges
+    of the memory-mapped file. Otherwise each worker downloads the split pages from
+    {spec_id}/original_pages/.
+    on_progress(pages_scanned, total_pages) is called as each worker's page range finishes.
+    Pass executor to scan in a process pool shared with other work; it is not shut down here.
+    """
+    owns_pdf_path = pdf_path is None and pdf is not None
+    if owns_pdf_path:
+        pdf_path = await asyncio.to_thread(write_temp_pdf, pdf)
+    try:
+        if pdf_path:
+            total_pages = await asyncio.to_thread(pdf_page_count, pdf_path)
+        else:
+            total_pages = await s3.get_original_page_count_with_client(spec_id, s3_client)
+        logger.info(f"Detecting sections across {total_pages} pages for {spec_id}")
+
+        divider = total_pages / workers
+        shards = [(int(divider * i), int(divider * (i + 1)))
+                  for i in range(workers)]
+        loop = asyncio.get_running_loop()
+
+        pool = executor or ProcessPoolExecutor(max_workers=workers)
+        try:
+            if pdf_path:
+                futures = [
+                    loop.run_in_executor(pool, worker_scan_pdf_range,
+                                         pdf_path, start_index, end_index)
+                    for start_index, end_index in shards
+                ]
+            else:
+                futures = [
+                    loop.run_in_executor(pool, worker_scan_shard,
+                                         spec_id, start_index, end_index)
+                    for start_index, end_index in shards
+                ]
+
+            pages_scanned = 0
+
+            async def scanned(future, start_index: int, end_index: int):
+                nonlocal pages_scanned
+                result = await future
+                pages_scanned += end_index - start_index
+                if on_progress:
+                    on_progress(pages_scanned, total_pages)
+                return result
+
+            results = await asyncio.gather(*[
+                scanned(future, start_index, end_index)
+                for future, (start_index, end_index) in zip(futures, shards)
+            ])
+        finally:
+            if executor is None:
+                # Joining the worker processes would block the event loop
+                pool.shutdown(wait=False, cancel_futures=True)
+    finally:
+        if owns_pdf_path:
+            os.remove(pdf_path)
+
+    flattened_results = {k: v for d in results for k, v in d["section_numbers"].items()}
+    signals = {k: v for d in results for k, v in d["signals"].items()}
+    texts = {k: v for d in results for k, v in d["texts"].items()}
+
+    # The TOC bounds which sections are looked for and where, and names them
+    flattened_results, toc = bound_by_toc(flattened_results, signals)
+    divisions = division_parser(section_page_dict(flattened_results, toc["sections"]))
+
+    return {
+        "total_divisions": len(divisions.keys()),
+        "total_sections": len(flattened_results.keys()),
+        "divisions_and_sections": divisions,
+        "page_signals": signals,
+        "page_texts": texts,
+        "toc": {"pages": toc["pages"], "sections": len(toc["sections"])}
+    }
@@ -1,10 +1,9 @@
-from typing import Any, Dict
+from typing import Any, AsyncIterator, Dict
 from dotenv import load_dotenv
 from pydantic import BaseModel
-from typing import Callable, Type, List
-from prompts import SUMMARY_PROMPT
+from typing import Callable, Optional, Type, List
+from prompts import SUMMARY_PROMPT, SUMMARY_CONTEXT
 import logging
-import asyncio
 import time
 import os
 import resend
@@ -12,9 +11,18 @@ from classes import (
     S3Bucket,
     Anthropic,
     db,
+    batch_watcher,
+    job_queue,
+    response_cache,
+    llm_scheduler,
+    token_estimator,
+    JOB_WAITING,
     make_summary_schema,
     PDFPageConverter
 )
+from classes.db import SUMMARY_LIST_FIELDS
+from .page_dedup import reusable_summary_results, iter_reused_results
+from .request_split import split_part_custom_id, parse_split_custom_id, reduce_split_results, unique
 
 load_dotenv()
 
@@ -24,6 +32,8 @@ logger = logging.getLogger(__name__)
 anthropic = Anthropic()
 pdf_converter = PDFPageConverter()
 
+SAVE_CHUNK_SIZE = 200  # summary results consolidated and persisted per transaction
+
 
 def send_mail(spec_id: str, completion_time: float) -> Dict:
     resend.api_key = os.getenv("RESEND_API_KEY")
@@ -48,62 +58,107 @@ def format_time(seconds: float) -> str:
         return f"{seconds/3600:.2f} hours"
 
 
-async def save_summary_results(spec_id: str, batch_results: list[list[dict]]) -> dict[str, Any]:
+def reduce_summary_parts(contents: list[dict]) -> dict:
+    """One summary from the summaries of consecutive parts of a split range"""
+    return {
+        "section_number": next((c["section_number"] for c in contents if c.get("section_number")), ""),
+        "section_title": next((c["section_title"] for c in contents if c.get("section_title")), ""),
+        "overview": " ".join(unique([c.get("overview", "") for c in contents if c.get("overview")])),
+        **{field: unique([value for c in contents for value in c.get(field, [])]) for field in SUMMARY_LIST_FIELDS},
+    }
+
+
+async def save_summary_results(
+    spec_id: str,
+    batch_results: list[AsyncIterator[dict]],
+    cache_keys: Optional[dict[str, str]] = None
+) -> dict[str, Any]:
+    """
+    Consume streamed batch results, persisting consolidated summaries every SAVE_CHUNK_SIZE items.
+    Parts of a range split to fit the context window are reduced into one summary for the range.
+    """
     total_summaries = 0
     errors = 0
     failed_custom_ids = set()
     sections: dict[str, dict] = {}
+    chunk_items = 0
+    saved_sections: set[str] = set()
+    cache_entries: list[dict] = []
+
+    async def flush():
+        nonlocal total_summaries, errors
+        applied = await db.apply_summary_results(spec_id, sections, merge_sections=saved_sections)
+        for section_number in applied["missing_sections"]:
+            logger.error(f"Section not found for {section_number}")
+            errors += 1
+        for section_number in applied["saved"]:
+            if section_number not in saved_sections:
+                saved_sections.add(section_number)
+                total_summaries += 1
+        sections.clear()
+        await response_cache.put_many(cache_entries)
+        cache_entries.clear()
+
+    async def add_result(custom_id: str, item: dict):
+        nonlocal errors, chunk_items
+        if item.get('type') == 'errored':
+            logger.error(f"Errored for {custom_id}: {item.get('error')}")
+            errors += 1
+            failed_custom_ids.add(custom_id)
+            return
+
+        split_custom_id = custom_id.split('-')
+        content = item.get('content')
+        section_number = split_custom_id[1].replace("_", ".")
+
+        custom_id_length = len(split_custom_id)
+        start_index = split_custom_id[-2] if custom_id_length == 9 else split_custom_id[-1]
+        end_index = split_custom_id[-1]
+        pages_summarized = list(
+            range(int(start_index), int(end_index) + 1))
+
+        if section_number not in sections:
+            sections[section_number] = {
+                **content,
+                "pages_summarized": pages_summarized,
+                "pages_not_summarized": []
+            }
+        else:
+            # merge list fields
+            for field in SUMMARY_LIST_FIELDS:
+                sections[section_number][field] = sections[section_number].get(
+                    field, []) + content.get(field, [])
+            sections[section_number]['pages_summarized'] += pages_summarized
+
+        chunk_items += 1
+        if chunk_items >= SAVE_CHUNK_SIZE:
+            await flush()
+            chunk_items = 0
+
+    # Parts of ranges split to fit the context window, by the range's custom_id, reduced once all are in
+    split_results: dict[str, list[tuple[int, dict]]] = {}
 
     for batch in batch_results:
-        for item in batch:
+        async for item in batch:
             custom_id = item.get('custom_id', '')
 
-            if item.get('type') == 'errored':
-                logger.error(f"Errored for {custom_id}: {item.get('error')}")
-                errors += 1
-                failed_custom_ids.add(custom_id)
+            cache_entry = response_cache.entry_from_result(item, (cache_keys or {}).get(custom_id))
+            if cache_entry:
+                cache_entries.append(cache_entry)
+
+            range_custom_id, part = parse_split_custom_id(custom_id)
+            if part is not None:
+                split_results.setdefault(range_custom_id, []).append((part, item))
                 continue
 
-            split_custom_id = custom_id.split('-')
-            content = item.get('content')
-            section_number = split_custom_id[1].replace("_", ".")
-
-            custom_id_length = len(split_custom_id)
-            start_index = split_custom_id[-2] if custom_id_length == 9 else split_custom_id[-1]
-            end_index = split_custom_id[-1]
-            pages_summarized = list(
-                range(int(start_index), int(end_index) + 1))
-
-            if section_number not in sections:
-                sections[section_number] = {
-                    **content,
-                    "pages_summarized": pages_summarized,
-                    "pages_not_summarized": []
-                }
-            else:
-                # merge list fields
-                for field in ['key_requirements', 'materials', 'submittals', 'testing', 'related_sections']:
-                    sections[section_number][field] = sections[section_number].get(
-                        field, []) + content.get(field, [])
-                sections[section_number]['pages_summarized'] += pages_summarized
-
-    # now save each consolidated section
-    for section_number, summary in sections.items():
-        section = await db.get_section(spec_id, section_number)
-        section_id = section.get('id') if section else None
-
-        if section_id:
-            await db.save_section_summary(spec_id, {
-                **summary,
-                "section_id": section_id,
-                "section_number": section_number,
-            })
-            await db.update_section_title(section_id, summary.get('section_title', 'Undocumented Section Number (MSF2020)'))
-            await db.update_section_summary_status(spec_id, section_number)
-            total_summaries += 1
-        else:
-            logger.error(f"Section not found for {section_number}")
-            errors += 1
+            await add_result(custom_id, item)
+
+    for range_custom_id, parts in split_results.items():
+        await add_result(range_custom_id, reduce_split_results(range_custom_id, parts, reduce_summary_parts))
+
+    # now save the remaining consolidated sections
+    if sections or cache_entries:
+        await flush()
 
     logger.info(f"failed_custom_ids: {failed_custom_ids}")
     return {
@@ -121,35 +176,50 @@ async def build_summary_requests(
     s3: S3Bucket,
     s3_client: any,
     model: str = "claude-sonnet-4-6",
-    max_tokens: int = 16000
-) -> list[dict]:
+    max_tokens: int = 16000,
+    context_prompt: str = SUMMARY_CONTEXT
+) -> tuple[list[dict], dict[str, str]]:
+    """
+    Returns the requests plus {presigned url: page content hash} for the response cache.
+    The section number goes after the documents, keeping the system prompt a shared cached prefix.
+    """
     requests = []
+    source_hashes: dict[str, str] = {}
+    etags = await s3.get_object_etags_with_client([f"{spec_id}/original_pages/"], s3_client)
+    await token_estimator.load_pages(spec_id)
 
     for division_number, division in sections.items():
         for section_number, section in division.items():
             for multi in section.get("multi", []):
                 start_index, end_index = multi[0], multi[-1]
-                page_indices = list[int](range(start_index, end_index + 1))
 
                 safe_section_number = section_number.replace(".", "_")
                 custom_id = f'{division_number}-{safe_section_number}-{spec_id}-{start_index}-{end_index}'
 
-                content_blocks = []
-                for page in page_indices:
-                    key = f"{spec_id}/original_pages/page_{page:04d}.pdf"
-                    url = await s3.generate_presigned_url(key, s3_client)
-                    content_blocks.append(anthropic.pdf_document_block_url(url))
-
-                request = await anthropic.build_claude_request(
-                    custom_id,
-                    content_blocks,
-                    system_prompt=anthropic.build_prompt(system_prompt, {
-                        "section_number": section_number, "pages_analyzed": page_indices}),
-                    schema=dynamic_schema(section_number),
-                    model=model,
-                    max_tokens=max_tokens
-                )
-                requests.append(request)
+                # Ranges too large for one context window go out as {custom_id}-1, -2, ... and are reduced on save
+                pages = list(range(start_index, end_index + 1))
+                page_splits = anthropic.plan_page_splits(
+                    pages, system_prompt, max_tokens, page_costs=token_estimator.page_costs(spec_id, pages))
+                for part, page_indices in enumerate(page_splits, start=1):
+                    content_blocks = []
+                    for page in page_indices:
+                        key = f"{spec_id}/original_pages/page_{page:04d}.pdf"
+                        url = await s3.generate_presigned_url(key, s3_client)
+                        if key in etags:
+                            source_hashes[url] = etags[key]
+                        content_blocks.append(anthropic.pdf_document_block_url(url))
+                    content_blocks.append(anthropic.text_block(
+                        anthropic.build_prompt(context_prompt, {"section_number": section_number})))
+
+                    request = await anthropic.build_claude_request(
+                        custom_id if len(page_splits) == 1 else split_part_custom_id(custom_id, part),
+                        content_blocks,
+                        system_prompt=system_prompt,
+                        schema=dynamic_schema(section_number),
+                        model=model,
+                        max_tokens=max_tokens
+                    )
+                    requests.append(request)
 
             for single in section.get("single", []):
                 safe_section_number = section_number.replace(".", "_")
@@ -157,13 +227,17 @@ async def build_summary_requests(
 
                 key = f"{spec_id}/original_pages/page_{single:04d}.pdf"
                 url = await s3.generate_presigned_url(key, s3_client)
-                content_blocks = [anthropic.pdf_document_block_url(url)]
+                if key in etags:
+                    source_hashes[url] = etags[key]
+                content_blocks = [
+                    anthropic.pdf_document_block_url(url),
+                    anthropic.text_block(anthropic.build_prompt(context_prompt, {"section_number": section_number})),
+                ]
 
                 request = await anthropic.build_claude_request(
                     custom_id,
                     content_blocks,
-                    system_prompt=anthropic.build_prompt(
-                        system_prompt, {"section_number": section_number, "pages_analyzed": [single]}),
+                    system_prompt=system_prompt,
                     schema=dynamic_schema(section_number),
                     model=model,
                     max_tokens=max_tokens
@@ -171,7 +245,7 @@ async def build_summary_requests(
 
                 requests.append(request)
 
-    return requests
+    return requests, source_hashes
 
 
 def structure_failed_custom_ids(failed_custom_ids: list[str]):
@@ -207,38 +281,143 @@ def structure_failed_custom_ids(failed_custom_ids: list[str]):
     return divisions_and_sections
 
 
-async def section_summaries(spec_id: str, sections_with_summaries: dict[str, dict[str, List[int]]], retry: int = 0, max_retries: int = 3):
-    """Background task to classify all sections"""
+async def section_summaries(
+    spec_id: str,
+    sections_with_summaries: dict[str, dict[str, List[int]]],
+    retry: int = 0,
+    max_retries: int = 3,
+    start_time: float = None,
+    dedupe_key: str = None
+) -> int:
+    """Queue a summary run for spec_id; returns the job id"""
+    return await job_queue.enqueue(
+        kind="summary",
+        spec_id=spec_id,
+        payload={
+            "sections": sections_with_summaries,
+            "retry": retry,
+            "max_retries": max_retries,
+            "start_time": start_time or time.time(),
+        },
+        dedupe_key=dedupe_key
+    )
+
+
+async def run_summary_job(job: dict) -> str:
+    """
+    Job handler: build and submit summary batches, then hand them to the batch watcher.
+
+    Each submitted batch is checkpointed, so a resumed attempt skips the requests already
+    submitted and re-attaches to the recorded batch ids instead of paying for them twice.
+    """
     s3 = S3Bucket()
-    start_time = time.time()
+    job_id = job["id"]
+    spec_id = job["spec_id"]
+    payload = job["payload"]
+    progress = dict(job["progress"])
+    batch_ids = list(progress.get("batch_ids", []))
+    submitted_requests = progress.get("submitted_requests", 0)
+
+    logger.info(f"Starting background summary for {spec_id}")
+
+    async with s3.s3_client() as s3_client:
+        requests, source_hashes = await build_summary_requests(
+            sections=payload["sections"],
+            spec_id=spec_id,
+            system_prompt=SUMMARY_PROMPT,
+            dynamic_schema=make_summary_schema,
+            s3=s3,
+            s3_client=s3_client,
+            model="claude-sonnet-4-6",
+            max_tokens=16000
+        )
+
+    if not requests:
+        await db.update_project(spec_id, summary_status="complete")
+        logger.info(f"No sections to summarize for {spec_id}")
+        return None
+
+    # Reuse and the response cache are consulted once per job and the answer checkpointed, so a
+    # resumed attempt submits exactly the requests the first attempt could not answer locally
+    if "cache_keys" not in progress:
+        progress["cache_keys"], progress["cached"], progress["reused"] = {}, [], {}
+        if not submitted_requests:
+            # Requests over pages duplicated from an earlier spec take that spec's results
+            # (reuse is per whole range, a range split into parts is reused as one)
+            progress["reused"] = await reusable_summary_results(
+                spec_id, unique([parse_split_custom_id(request["custom_id"])[0] for request in requests]))
+            _, progress["cache_keys"], progress["cached"] = await anthropic.partition_cached_requests(
+                [request for request in requests
+                 if parse_split_custom_id(request["custom_id"])[0] not in progress["reused"]], source_hashes)
+        await job_queue.checkpoint(job_id, progress)
+    cached = set(progress["cached"]) | set(progress.get("reused", {}))
+    requests_to_submit = [
+        request for request in requests
+        if request["custom_id"] not in cached and parse_split_custom_id(request["custom_id"])[0] not in cached
+    ]
+
+    if submitted_requests:
+        logger.info(
+            f"Resuming summary job {job_id}: {submitted_requests} requests already in {len(batch_ids)} batch(es)")
+
+    context = {
+        "job_id": job_id,
+        "retry": payload["retry"],
+        "max_retries": payload["max_retries"],
+        "start_time": payload["start_time"],
+    }
 
-    try:
-        logger.info(f"Starting background summary for {spec_id}")
-
-        batch_ids = []
-        batch_results = []
-
-        async with s3.s3_client() as s3_client:
-            requests = await build_summary_requests(
-                sections=sections_with_summaries,
-                spec_id=spec_id,
-                system_prompt=SUMMARY_PROMPT,
-                dynamic_schema=make_summary_schema,
-                s3=s3,
-                s3_client=s3_client,
-                model="claude-sonnet-4-6",
-                max_tokens=16000
-            )
+    remaining = requests_to_submit[submitted_requests:]
+    # Small runs go realtime and finish in seconds; once a batch is submitted the job stays on batches
+    if remaining and not batch_ids and llm_scheduler.choose_mode(len(remaining)) == "realtime":
+        await finish_summary_now(spec_id, [llm_scheduler.run_realtime(remaining)], context)
+        return None
 
-        batches = anthropic.split_batch(requests)
-        for batch in batches:
+    if remaining:
+        # Features of each request are stored now and labelled with its usage when the results are read
+        await token_estimator.register(remaining)
+        for batch in anthropic.split_batch(remaining):
             result = await anthropic.create_batch(batch)
+            if "batch_id" not in result:
+                raise RuntimeError(result.get("error"))
             batch_ids.append(result["batch_id"])
+            submitted_requests += len(batch)
+            progress.update(batch_ids=batch_ids, submitted_requests=submitted_requests)
+            await job_queue.checkpoint(job_id, progress)
+
+    if not batch_ids:
+        # Every request was answered from the response cache, nothing to wait for
+        await finish_summary_now(spec_id, [], context)
+        return None
+
+    await batch_watcher.watch(
+        kind="summary",
+        spec_id=spec_id,
+        batch_ids=batch_ids,
+        context=context,
+        group_id=f"job-{job_id}"
+    )
+    return JOB_WAITING
+
+
+async def handle_summary_batches(spec_id: str, batch_results: list[AsyncIterator[dict]], context: dict):
+    """Batch watcher callback: persist summaries, queue retries, then finish the job"""
+    job_id = context.get("job_id")
+    retry = context.get("retry", 0)
+    max_retries = context.get("max_retries", 3)
+    start_time = context.get("start_time") or time.time()
 
-        poll_results = await asyncio.gather(*[anthropic.poll_and_fetch_batch_results(batch_id) for batch_id in batch_ids])
-        batch_results.extend(poll_results)
+    try:
+        job = await db.get_job(job_id) if job_id else None
+        progress = job["progress"] if job else {}
+        cache_keys = progress.get("cache_keys", {})
+        cached_results = response_cache.iter_results(
+            {custom_id: cache_keys[custom_id] for custom_id in progress.get("cached", [])})
+
+        reused_results = iter_reused_results(progress.get("reused", {}))
 
-        results = await save_summary_results(spec_id, batch_results)
+        results = await save_summary_results(
+            spec_id, [*batch_results, cached_results, reused_results], cache_keys)
         failed_custom_ids = results.get("failed_custom_ids", set())
 
         if failed_custom_ids and retry < max_retries:
@@ -246,13 +425,14 @@ async def section_summaries(spec_id: str, sections_with_summaries: dict[str, dic
                 f"Failed custom ids found: {failed_custom_ids}, retrying...")
             structured_failed_custom_ids = structure_failed_custom_ids(
                 failed_custom_ids)
-            asyncio.create_task(
-                section_summaries(
-                    spec_id,
-                    structured_failed_custom_ids,
-                    retry + 1,
-                    max_retries
-                )
+            # Dedupe key keeps a re-dispatched group from queueing the retry twice
+            await section_summaries(
+                spec_id,
+                structured_failed_custom_ids,
+                retry + 1,
+                max_retries,
+                start_time,
+                dedupe_key=f"job-{job_id}-retry" if job_id else None
             )
         else:
             await db.update_project(spec_id, summary_status="complete")
@@ -261,5 +441,25 @@ async def section_summaries(spec_id: str, sections_with_summaries: dict[str, dic
             logger.info(f"Summary complete for {spec_id} in {completion_time}")
 
     except Exception as e:
+        # The batch watcher dispatches the group again; summaries already applied are skipped
         logger.error(f"Summary failed for {spec_id}: {e} in {format_time(time.time() - start_time)}")
-        return {"error": f"Summary failed for {spec_id}: {e}"}, 500
+        raise
+
+    await job_queue.complete(job_id)
+
+
+async def fail_summary_batches(spec_id: str, context: dict, error: str):
+    """Batch watcher on_failed callback: the group will not be dispatched again, so fail its job"""
+    await job_queue.fail(context.get("job_id"), error)
+
+
+async def finish_summary_now(spec_id: str, batch_results: list[AsyncIterator[dict]], context: dict):
+    """Run the batch handler inline (realtime, or nothing to wait for); a failure fails the job instead of re-running it"""
+    try:
+        await handle_summary_batches(spec_id, batch_results, context)
+    except Exception as e:
+        await fail_summary_batches(spec_id, context, str(e))
+
+
+batch_watcher.register("summary", handle_summary_batches, on_failed=fail_summary_batches)
+job_queue.register("summary", run_summary_job)
@@ -0,0 +1,161 @@
+from dotenv import load_dotenv
+from quart.datastructures import FileStorage
+import logging
+import os
+import shutil
+import tempfile
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from classes import S3Bucket, db, job_queue, progress_hub
+from classes.s3_buckets import merge_pdf_files
+from csi_masterformat import divisions_and_sections
+from .section_pages_detection import section_pages_detection
+from .section_classification import page_classification
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+UPLOAD_SPOOL_DIR = os.getenv(
+    "UPLOAD_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "modu_uploads"))
+# Processes shared by the page split and section detection of one ingest job
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "6"))
+
+
+async def spool_uploads(files: list[FileStorage], spec_id: str) -> list[str]:
+    """
+    Write uploaded PDFs to local disk so the ingest job can outlive the request. The form parser
+    already spools large bodies to temporary files, so this copies file to file in chunks.
+    """
+    spool_dir = os.path.join(UPLOAD_SPOOL_DIR, spec_id)
+    os.makedirs(spool_dir, exist_ok=True)
+
+    paths = []
+    for i, file in enumerate(files):
+        path = os.path.join(spool_dir, f"original_{i+1}.pdf")
+        await file.save(path)
+        paths.append(path)
+    return paths
+
+
+async def spec_ingest(spec_id: str, upload_paths: list[str]) -> int:
+    """Queue the ingest pipeline for spooled uploads; returns the job id"""
+    progress_hub.publish(spec_id, "queued", files=len(upload_paths))
+    return await job_queue.enqueue(
+        kind="ingest",
+        spec_id=spec_id,
+        payload={"upload_paths": upload_paths},
+    )
+
+
+async def run_ingest_job(job: dict):
+    """
+    Job handler: upload the originals, split pages, detect sections, create the division and
+    section rows, then queue classification. Every step is safe to repeat, so a retried or
+    resumed attempt simply runs again from the top.
+
+    The splitter and detector work from the spooled files on local disk; the originals are only
+    uploaded to S3, never downloaded back.
+    """
+    spec_id = job["spec_id"]
+    payload = job["payload"]
+    upload_paths = payload["upload_paths"]
+    s3 = S3Bucket()
+
+    def pages_split(done: int, total: int):
+        progress_hub.publish(spec_id, "pages_split", done=done, total=total)
+
+    def pages_scanned(done: int, total: int):
+        progress_hub.publish(spec_id, "pages_scanned", done=done, total=total)
+
+    try:
+        async with s3.s3_client() as s3_client:
+            progress_hub.publish(spec_id, "uploading_original", files=len(upload_paths))
+            original_pdf_upload_result = await s3.upload_original_pdf_files_with_client(
+                paths=upload_paths, spec_id=spec_id, s3=s3_client)
+            if original_pdf_upload_result["status_code"] != 200:
+                raise RuntimeError(original_pdf_upload_result["message"])
+
+            logger.info(
+                f"Original PDF uploaded successfully to S3 bucket: {spec_id}")
+
+            if len(upload_paths) == 1:
+                pdf_path = upload_paths[0]
+            else:
+                pdf_path = await asyncio.to_thread(
+                    merge_pdf_files, upload_paths, os.path.join(os.path.dirname(upload_paths[0]), "merged.pdf"))
+
+            # Detection scans the same local file, so it runs alongside the page split/upload, in
+            # one process pool so the two together use at most INGEST_WORKERS processes
+            executor = ProcessPoolExecutor(max_workers=INGEST_WORKERS)
+            try:
+                split_task = asyncio.create_task(s3.upload_original_pdf_pages(
+                    pdf=None, spec_id=spec_id, s3_client=s3_client, on_progress=pages_split, pdf_path=pdf_path,
+                    workers=INGEST_WORKERS, executor=executor))
+                detect_task = asyncio.create_task(section_pages_detection(
+                    spec_id, s3, s3_client, workers=INGEST_WORKERS, on_progress=pages_scanned, pdf_path=pdf_path,
+                    executor=executor))
+                try:
+                    split_result, section_page_dict = await asyncio.gather(split_task, detect_task)
+                except BaseException:
+                    # Stop the other step rather than leave it uploading or scanning for a failed attempt
+                    split_task.cancel()
+                    detect_task.cancel()
+                    await asyncio.gather(split_task, detect_task, return_exceptions=True)
+                    raise
+            finally:
+                # Joining the worker processes would block the event loop
+                executor.shutdown(wait=False, cancel_futures=True)
+            if split_result["failed_pages"]:
+                raise RuntimeError(f"Failed to upload pages {split_result['failed_pages']}")
+
+        await db.save_page_fingerprints(spec_id, split_result["fingerprints"])
+        await db.save_page_features(spec_id, split_result["page_features"])
+        await db.save_page_texts(spec_id, section_page_dict["page_texts"])
+
+        total_divisions = 0
+        total_sections = 0
+        for division, sections in section_page_dict["divisions_and_sections"].items():
+            total_divisions += 1
+            division_title = divisions_and_sections[division][f"{division}0000"]
+            division_id = await db.create_division(spec_id, division, division_title)
+            for section_number, pages in sections.items():
+                total_sections += 1
+                section_title = pages.get(
+                    "title", "Undocumented Section Number (MSF2020)")
+
+                total_pages = sum(len(page) for page in pages.get("multi", []))
+                total_pages += len(pages.get("single", []))
+                pages["total_pages"] = total_pages
+
+                await db.create_section(spec_id, division, division_id, section_number, section_title, total_pages)
+
+        await db.update_project(
+            spec_id,
+            total_divisions=total_divisions,
+            total_sections=total_sections,
+        )
+        progress_hub.publish(spec_id, "sections_found",
+                             total_divisions=total_divisions, total_sections=total_sections)
+
+        classification_job_id = await page_classification(
+            spec_id,
+            section_page_dict["divisions_and_sections"],
+            dedupe_key=f"job-{job['id']}-classification",
+            page_signals=section_page_dict["page_signals"]
+        )
+        progress_hub.publish(spec_id, "classification_queued", job_id=classification_job_id)
+
+    except Exception as e:
+        final = job["attempts"] >= job["max_attempts"]
+        progress_hub.publish(spec_id, "error", terminal=final, error=str(e), attempt=job["attempts"])
+        if final:
+            shutil.rmtree(os.path.dirname(upload_paths[0]), ignore_errors=True)
+        raise
+
+    # The originals are in S3 now; the spool copy is only needed while the job can still be retried
+    shutil.rmtree(os.path.dirname(upload_paths[0]), ignore_errors=True)
+
+
+job_queue.register("ingest", run_ingest_job)
@@ -1,10 +1,16 @@
 from .prompts import (
     CLASSIFICATION_PROMPT,
+    MULTI_SECTION_CLASSIFICATION_PROMPT,
     SUMMARY_PROMPT,
     SPEC_CHECK_PROMPT,
     SPEC_CHECK_DRAWINGS_PROMPT,
-    COMPARE_COMPLIANCE_RUNS_PROMPT
+    COMPARE_COMPLIANCE_RUNS_PROMPT,
+    CLASSIFICATION_CONTEXT,
+    MULTI_SECTION_CLASSIFICATION_CONTEXT,
+    SUMMARY_CONTEXT,
+    SPEC_CHECK_CONTEXT
 )
 
-__all__ = ["CLASSIFICATION_PROMPT", "SUMMARY_PROMPT", "SPEC_CHECK_PROMPT",
-           "SPEC_CHECK_DRAWINGS_PROMPT", "COMPARE_COMPLIANCE_RUNS_PROMPT"]
+__all__ = ["CLASSIFICATION_PROMPT", "MULTI_SECTION_CLASSIFICATION_PROMPT", "SUMMARY_PROMPT", "SPEC_CHECK_PROMPT",
+           "SPEC_CHECK_DRAWINGS_PROMPT", "COMPARE_COMPLIANCE_RUNS_PROMPT",
+           "CLASSIFICATION_CONTEXT", "MULTI_SECTION_CLASSIFICATION_CONTEXT", "SUMMARY_CONTEXT", "SPEC_CHECK_CONTEXT"]
@@ -0,0 +1,18 @@
+import asyncio
+import pytest
+from classes.db import ModuDB
+
+
+@pytest.fixture
+def run_db(tmp_path):
+    """Run a coroutine function against a fresh, initialized database in its own event loop"""
+    def run(test):
+        async def main():
+            database = ModuDB(str(tmp_path / "test.db"))
+            await database.init_db()
+            try:
+                return await test(database)
+            finally:
+                await database.close()
+        return asyncio.run(main())
+    return run
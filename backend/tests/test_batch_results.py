@@ -0,0 +1,194 @@
+import json
+import time
+import pytest
+from classes.batch_watcher import BatchWatcher
+
+SPEC_ID = "spec-a"
+
+
+async def create_section(database, section_number="033000", total_pages=4) -> int:
+    await database.create_project(SPEC_ID, "Test project")
+    division_id = await database.create_division(SPEC_ID, "03", "Concrete")
+    return await database.create_section(SPEC_ID, "03", division_id, section_number, "Cast-in-place concrete", total_pages)
+
+
+def classification_item(custom_id, pages, is_primary=True):
+    return {
+        "section_number": "033000",
+        "custom_id": custom_id,
+        "is_primary": is_primary,
+        "pages": pages,
+        "result": {"is_primary": is_primary, "confidence": 0.9, "reasoning": "test", "pages_analyzed": pages},
+    }
+
+
+async def classification_rows(database, section_id):
+    async with database.reader() as conn:
+        cursor = await conn.execute("SELECT custom_id FROM classification WHERE section_id = ?", (section_id,))
+        return [row["custom_id"] for row in await cursor.fetchall()]
+
+
+# ---------- Idempotent apply ----------
+
+def test_apply_classification_results_is_idempotent(run_db):
+    async def test(database):
+        section_id = await create_section(database)
+        items = [classification_item("03-033000-a-1-2", [1, 2]), classification_item("03-033000-a-3", [3], False)]
+
+        first = await database.apply_classification_results(SPEC_ID, items)
+        second = await database.apply_classification_results(SPEC_ID, items)
+
+        section = await database.get_section_by_id(section_id)
+        assert json.loads(section["primary_pages"]) == [1, 2]
+        assert json.loads(section["reference_pages"]) == [3]
+        assert first["classifications_saved"] == 2
+        assert second["classifications_saved"] == 0
+        assert second["duplicates_skipped"] == 2
+        assert sorted(await classification_rows(database, section_id)) == ["03-033000-a-1-2", "03-033000-a-3"]
+    run_db(test)
+
+
+def test_apply_classification_results_dedupes_within_one_call(run_db):
+    async def test(database):
+        section_id = await create_section(database)
+        item = classification_item("03-033000-a-1", [1])
+        applied = await database.apply_classification_results(SPEC_ID, [item, item])
+        assert applied["classifications_saved"] == 1
+        assert json.loads((await database.get_section_by_id(section_id))["primary_pages"]) == [1]
+    run_db(test)
+
+
+def test_apply_summary_results_skips_summarized_pages(run_db):
+    async def test(database):
+        await create_section(database)
+        summary = {"section_title": "Concrete", "overview": "x", "key_requirements": ["a"], "pages_summarized": [1, 2]}
+
+        await database.apply_summary_results(SPEC_ID, {"033000": dict(summary)}, merge_sections=set())
+        applied = await database.apply_summary_results(SPEC_ID, {"033000": dict(summary)}, merge_sections=set())
+
+        assert applied["duplicates_skipped"] == 1
+        async with database.reader() as conn:
+            cursor = await conn.execute("SELECT key_requirements FROM section_summaries WHERE spec_id = ?", (SPEC_ID,))
+            rows = await cursor.fetchall()
+        assert [json.loads(row["key_requirements"]) for row in rows] == [["a"]]
+    run_db(test)
+
+
+# ---------- Batch watcher dispatch ----------
+
+class FakeAnthropic:
+    def __init__(self, results: dict):
+        self.results = results
+
+    async def iter_batch_results(self, results_url):
+        for item in self.results[results_url]:
+            yield item
+
+
+async def end_group(database, batches: dict, group_id="job-1"):
+    """Watch batches (batch_id -> results_url or None) and mark them ended"""
+    await database.add_watched_batches(group_id=group_id, kind="test", spec_id=SPEC_ID, batch_ids=list(batches),
+                                       context={"job_id": 1}, check_interval=1, next_check_at=time.time())
+    for batch_id, results_url in batches.items():
+        await database.update_watched_batch(batch_id, status="ended", results_url=results_url, processing_count=0)
+
+
+async def group_statuses(database, group_id="job-1"):
+    async with database.reader() as conn:
+        cursor = await conn.execute("SELECT status FROM watched_batches WHERE group_id = ?", (group_id,))
+        return {row["status"] for row in await cursor.fetchall()}
+
+
+async def dispatch(watcher):
+    await watcher._dispatch_ended_groups()
+    for task in list(watcher._dispatching.values()):
+        await task
+
+
+def test_dispatch_streams_results_and_marks_group(run_db):
+    async def test(database):
+        seen = []
+
+        async def handler(spec_id, batch_results, context):
+            for results in batch_results:
+                seen.extend([item async for item in results])
+
+        watcher = BatchWatcher(anthropic=FakeAnthropic({"url-1": [{"custom_id": "a"}]}), database=database)
+        watcher.register("test", handler)
+        await end_group(database, {"batch-1": "url-1"})
+        await dispatch(watcher)
+
+        assert seen == [{"custom_id": "a"}]
+        assert await group_statuses(database) == {"dispatched"}
+        assert await database.get_ended_batch_groups() == []
+    run_db(test)
+
+
+def test_dispatch_retries_handler_errors_then_fails_group(run_db):
+    async def test(database):
+        calls, failures = [], []
+
+        async def handler(spec_id, batch_results, context):
+            calls.append(context)
+            raise RuntimeError("database is locked")
+
+        async def on_failed(spec_id, context, error):
+            failures.append((spec_id, context["job_id"], error))
+
+        watcher = BatchWatcher(anthropic=FakeAnthropic({"url-1": []}), database=database,
+                               max_dispatch_attempts=3, dispatch_retry_delay=0)
+        watcher.register("test", handler, on_failed=on_failed)
+        await end_group(database, {"batch-1": "url-1"})
+
+        await dispatch(watcher)
+        assert await group_statuses(database) == {"ended"}
+        assert failures == []
+
+        await dispatch(watcher)
+        await dispatch(watcher)
+        assert len(calls) == 3
+        assert failures == [(SPEC_ID, 1, "database is locked")]
+        assert await group_statuses(database) == {"failed"}
+
+        await dispatch(watcher)
+        assert len(calls) == 3
+    run_db(test)
+
+
+def test_dispatch_waits_for_retry_delay(run_db):
+    async def test(database):
+        calls = []
+
+        async def handler(spec_id, batch_results, context):
+            calls.append(1)
+            raise RuntimeError("transient")
+
+        watcher = BatchWatcher(anthropic=FakeAnthropic({"url-1": []}), database=database, dispatch_retry_delay=60)
+        watcher.register("test", handler)
+        await end_group(database, {"batch-1": "url-1"})
+        await dispatch(watcher)
+        await dispatch(watcher)
+        assert len(calls) == 1
+        assert await watcher._next_delay() == pytest.approx(60, abs=1)
+    run_db(test)
+
+
+def test_group_without_results_is_failed(run_db):
+    async def test(database):
+        failures = []
+
+        async def handler(spec_id, batch_results, context):
+            raise AssertionError("nothing to dispatch")
+
+        async def on_failed(spec_id, context, error):
+            failures.append(error)
+
+        watcher = BatchWatcher(anthropic=FakeAnthropic({}), database=database)
+        watcher.register("test", handler, on_failed=on_failed)
+        # e.g. both batches were gone when checked
+        await end_group(database, {"batch-1": None, "batch-2": None})
+        await dispatch(watcher)
+
+        assert failures == ["Every batch in the group ended without results"]
+        assert await group_statuses(database) == {"failed"}
+    run_db(test)
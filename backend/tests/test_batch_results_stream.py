@@ -0,0 +1,92 @@
+import asyncio
+import aiohttp
+import json
+import pytest
+from aiohttp import web
+from classes.anthropic import Anthropic
+from classes.token_estimator import token_estimator
+
+
+def result_line(i: int) -> bytes:
+    row = {
+        "custom_id": f"03-033000-spec-{i}",
+        "result": {
+            "type": "succeeded",
+            "message": {
+                "content": [{"type": "text", "text": json.dumps({"is_primary": True})}],
+                "usage": {"input_tokens": 10, "output_tokens": 5},
+            },
+        },
+    }
+    return json.dumps(row).encode("utf-8") + b"\n"
+
+
+async def serve(handler) -> tuple[web.AppRunner, str]:
+    app = web.Application()
+    app.router.add_get("/results", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/results"
+
+
+@pytest.fixture
+def anthropic(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    return Anthropic()
+
+
+@pytest.fixture
+def stream(run_db, monkeypatch):
+    """Serve handler locally and collect custom_ids from iter_batch_results, flushing usage to a test database"""
+    def run(anthropic, handler, seen: list):
+        async def test(database):
+            monkeypatch.setattr(token_estimator, "db", database)
+            runner, url = await serve(handler)
+            try:
+                async for item in anthropic.iter_batch_results(url):
+                    seen.append(item["custom_id"])
+            finally:
+                await runner.cleanup()
+        return run_db(test)
+    return run
+
+
+def test_streams_every_line(anthropic, stream):
+    async def results(request):
+        resp = web.StreamResponse()
+        await resp.prepare(request)
+        for i in range(3):
+            await resp.write(result_line(i))
+        await resp.write_eof()
+        return resp
+
+    seen = []
+    stream(anthropic, results, seen)
+    assert seen == [f"03-033000-spec-{i}" for i in range(3)]
+
+
+def test_broken_stream_raises(anthropic, stream):
+    async def results(request):
+        # Promise more than is sent, then drop the connection mid-file
+        resp = web.StreamResponse(headers={"Content-Length": "100000"})
+        await resp.prepare(request)
+        await resp.write(result_line(0))
+        await resp.drain()
+        request.transport.close()
+        return resp
+
+    seen = []
+    with pytest.raises(aiohttp.ClientPayloadError):
+        stream(anthropic, results, seen)
+    assert seen == ["03-033000-spec-0"]
+
+
+def test_missing_results_url_raises(anthropic):
+    async def main():
+        return [item async for item in anthropic.iter_batch_results(None)]
+
+    with pytest.raises(ValueError):
+        asyncio.run(main())
@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+import functions.section_classification as section_classification
+from classes.progress import progress_hub
+
+SPEC_ID = "spec-progress"
+
+
+@pytest.fixture
+def failed_jobs(monkeypatch):
+    failed = []
+
+    async def fail(job_id, error):
+        failed.append((job_id, error))
+
+    monkeypatch.setattr(section_classification.job_queue, "fail", fail)
+    monkeypatch.setattr(progress_hub, "_snapshots", {})
+    return failed
+
+
+def test_finish_now_failure_fails_job_and_publishes_error(monkeypatch, failed_jobs):
+    async def handler(spec_id, batch_results, context):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(section_classification, "handle_classification_batches", handler)
+    finished = asyncio.run(section_classification.finish_classification_now(SPEC_ID, [], {"job_id": 7}))
+
+    assert finished is False
+    assert failed_jobs == [(7, "database is locked")]
+    event = progress_hub.snapshot(SPEC_ID)["error"]
+    assert event["terminal"] and event["error"] == "database is locked"
+
+
+def test_finish_now_success_publishes_nothing(monkeypatch, failed_jobs):
+    async def handler(spec_id, batch_results, context):
+        return None
+
+    monkeypatch.setattr(section_classification, "handle_classification_batches", handler)
+    assert asyncio.run(section_classification.finish_classification_now(SPEC_ID, [], {"job_id": 7}))
+    assert failed_jobs == []
+    assert progress_hub.snapshot(SPEC_ID) == {}
+
+
+def test_failed_attempt_publishes_error(monkeypatch, failed_jobs):
+    async def submit(job):
+        raise RuntimeError("batch create failed")
+
+    monkeypatch.setattr(section_classification, "submit_classification", submit)
+    for attempts, terminal in ((1, False), (3, True)):
+        job = {"id": 7, "spec_id": SPEC_ID, "attempts": attempts, "max_attempts": 3}
+        with pytest.raises(RuntimeError):
+            asyncio.run(section_classification.run_classification_job(job))
+        assert progress_hub.snapshot(SPEC_ID)["error"]["terminal"] is terminal
@@ -0,0 +1,172 @@
+import asyncio
+import time
+from classes.job_queue import JobQueue, JOB_WAITING
+from classes.progress import progress_hub
+
+SPEC_A = "spec-a"
+SPEC_B = "spec-b"
+
+
+async def claim(database, per_spec_limit=2, max_active=6, now=None):
+    return await database.claim_job(
+        owner="test", now=now or time.time(), lease_seconds=60, per_spec_limit=per_spec_limit, max_active=max_active)
+
+
+async def enqueue(database, spec_id=SPEC_A, kind="test", max_attempts=3):
+    return await database.enqueue_job(kind=kind, spec_id=spec_id, payload={}, available_at=time.time() - 1,
+                                      max_attempts=max_attempts)
+
+
+# ---------- claim_job ----------
+
+def test_claim_leases_oldest_queued_job(run_db):
+    async def test(database):
+        first = await enqueue(database)
+        await enqueue(database)
+        job = await claim(database)
+        assert job["id"] == first
+        assert job["status"] == "running"
+        assert job["attempts"] == 1
+        assert job["lease_owner"] == "test"
+    run_db(test)
+
+
+def test_claim_skips_jobs_not_yet_available(run_db):
+    async def test(database):
+        await database.enqueue_job(kind="test", spec_id=SPEC_A, payload={}, available_at=time.time() + 60)
+        assert await claim(database) is None
+    run_db(test)
+
+
+def test_claim_respects_per_spec_limit_for_running_jobs(run_db):
+    async def test(database):
+        await enqueue(database)
+        await enqueue(database)
+        other = await enqueue(database, spec_id=SPEC_B)
+        await claim(database, per_spec_limit=1)
+        # The second SPEC_A job is held back, SPEC_B is not
+        assert (await claim(database, per_spec_limit=1))["id"] == other
+        assert await claim(database, per_spec_limit=1) is None
+    run_db(test)
+
+
+def test_waiting_jobs_do_not_count_towards_limits(run_db):
+    async def test(database):
+        first = await enqueue(database)
+        second = await enqueue(database)
+        await claim(database, per_spec_limit=1, max_active=1)
+        await database.set_job_status(first, "waiting", lease_expires_at=time.time() + 60)
+        assert (await claim(database, per_spec_limit=1, max_active=1))["id"] == second
+    run_db(test)
+
+
+def test_claim_reclaims_expired_lease(run_db):
+    async def test(database):
+        job_id = await enqueue(database)
+        await claim(database)
+        job = await claim(database, now=time.time() + 120)
+        assert job["id"] == job_id
+        assert job["attempts"] == 2
+    run_db(test)
+
+
+def test_expired_waiting_jobs_are_failed(run_db):
+    async def test(database):
+        expired = await enqueue(database)
+        pending = await enqueue(database)
+        await database.set_job_status(expired, "waiting", lease_expires_at=time.time() - 1)
+        await database.set_job_status(pending, "waiting", lease_expires_at=time.time() + 60)
+        assert await database.expire_waiting_jobs(time.time(), error="timed out") == [expired]
+        assert (await database.get_job(expired))["status"] == "failed"
+        assert (await database.get_job(pending))["status"] == "waiting"
+    run_db(test)
+
+
+def test_expired_waiting_job_publishes_terminal_error(run_db):
+    async def test(database):
+        job_id = await enqueue(database)
+        await database.set_job_status(job_id, "waiting", lease_expires_at=time.time() - 1)
+        await JobQueue(database=database)._expire_waiting()
+        event = progress_hub.snapshot(SPEC_A)["error"]
+        assert event["terminal"] and event["job_id"] == job_id
+    run_db(test)
+
+
+def test_expected_status_guards_update(run_db):
+    async def test(database):
+        job_id = await enqueue(database)
+        await database.set_job_status(job_id, "failed", error="boom")
+        assert not await database.set_job_status(job_id, "queued", expected_status="running")
+        assert (await database.get_job(job_id))["status"] == "failed"
+    run_db(test)
+
+
+# ---------- _run_job ----------
+
+def run_handler(run_db, handler, max_attempts=3):
+    """Claim one job, run handler on it through the queue and return the job row afterwards"""
+    async def test(database):
+        queue = JobQueue(database=database, retry_delay=0, wait_timeout=60)
+        queue.register("test", lambda job: handler(queue, job))
+        await enqueue(database, max_attempts=max_attempts)
+        job = await claim(database)
+        try:
+            await queue._run_job(job)
+        except asyncio.CancelledError:
+            pass
+        return await database.get_job(job["id"])
+    return run_db(test)
+
+
+def test_run_job_completes(run_db):
+    async def handler(queue, job):
+        return None
+    assert run_handler(run_db, handler)["status"] == "complete"
+
+
+def test_run_job_waits_with_deadline(run_db):
+    async def handler(queue, job):
+        return JOB_WAITING
+    job = run_handler(run_db, handler)
+    assert job["status"] == "waiting"
+    assert time.time() < job["lease_expires_at"] <= time.time() + 60
+
+
+def test_run_job_requeues_failed_attempt(run_db):
+    async def handler(queue, job):
+        raise RuntimeError("transient")
+    job = run_handler(run_db, handler)
+    assert job["status"] == "queued"
+    assert job["error"] == "transient"
+
+
+def test_run_job_fails_after_last_attempt(run_db):
+    async def handler(queue, job):
+        raise RuntimeError("permanent")
+    job = run_handler(run_db, handler, max_attempts=1)
+    assert job["status"] == "failed"
+    assert job["error"] == "permanent"
+
+
+def test_run_job_keeps_failure_settled_by_handler(run_db):
+    async def handler(queue, job):
+        await queue.fail(job["id"], "results partly applied")
+        raise RuntimeError("results partly applied")
+    job = run_handler(run_db, handler)
+    assert job["status"] == "failed"
+    assert job["attempts"] == 1
+
+
+def test_run_job_does_not_complete_failed_job(run_db):
+    async def handler(queue, job):
+        await queue.fail(job["id"], "no results")
+        return None
+    assert run_handler(run_db, handler)["status"] == "failed"
+
+
+def test_run_job_cancelled_hands_job_back(run_db):
+    async def handler(queue, job):
+        raise asyncio.CancelledError()
+    job = run_handler(run_db, handler)
+    assert job["status"] == "queued"
+    assert job["attempts"] == 0
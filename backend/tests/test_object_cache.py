@@ -0,0 +1,57 @@
+import os
+from classes.object_cache import ObjectCache
+
+KEY = "spec-a/original_pages/page_{:04d}.pdf"
+
+
+def cache_bytes(cache_dir) -> int:
+    return sum(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir) if name.endswith(".bin"))
+
+
+def test_store_evicts_least_recently_used(tmp_path):
+    cache = ObjectCache(cache_dir=str(tmp_path), max_bytes=250)
+    for page in range(3):
+        cache.store(KEY.format(page), f"etag-{page}", b"x" * 100)
+    assert cache.lookup(KEY.format(0)) is None
+    assert cache.read(cache.lookup(KEY.format(2))) == b"x" * 100
+    assert cache.stats()["evictions"] == 1
+
+
+def test_init_indexes_and_bounds_existing_directory(tmp_path):
+    writer = ObjectCache(cache_dir=str(tmp_path), max_bytes=1000)
+    for page in range(5):
+        entry = writer.store(KEY.format(page), f"etag-{page}", b"x" * 100)
+        os.utime(entry.path, (1000 + page, 1000 + page))
+
+    cache = ObjectCache(cache_dir=str(tmp_path), max_bytes=250)
+    assert cache_bytes(tmp_path) <= 250
+    assert cache.stats()["entries"] == 2
+    # Entries found on disk are looked up by key with their ETag
+    entry = cache.lookup(KEY.format(4))
+    assert entry.etag == "etag-4"
+    assert cache.read(entry) == b"x" * 100
+
+
+def test_limit_covers_entries_other_processes_wrote(tmp_path):
+    cache = ObjectCache(cache_dir=str(tmp_path), max_bytes=250, rescan_interval=0)
+    other = ObjectCache(cache_dir=str(tmp_path), max_bytes=250, rescan_interval=3600)
+    for page in range(2):
+        entry = other.store(KEY.format(page), f"etag-{page}", b"x" * 100)
+        os.utime(entry.path, (1000 + page, 1000 + page))
+    cache.store(KEY.format(2), "etag-2", b"x" * 100)
+    # The other process's oldest body goes before this process's own entry
+    assert cache_bytes(tmp_path) <= 250
+    assert cache.lookup(KEY.format(0)) is None
+    assert cache.lookup(KEY.format(2)) is not None
+
+
+def test_adopting_from_disk_evicts(tmp_path):
+    cache = ObjectCache(cache_dir=str(tmp_path), max_bytes=250, rescan_interval=3600)
+    other = ObjectCache(cache_dir=str(tmp_path), max_bytes=1000)
+    cache.store(KEY.format(0), "etag-0", b"x" * 100)
+    cache.store(KEY.format(1), "etag-1", b"x" * 100)
+    other.store(KEY.format(2), "etag-2", b"x" * 100)
+
+    assert cache.lookup(KEY.format(2)).etag == "etag-2"
+    assert cache_bytes(tmp_path) <= 250
+    assert cache.lookup(KEY.format(0)) is None
@@ -0,0 +1,52 @@
+import json
+import pytest
+from classes.partial_json import StreamingArrayParser
+
+RESPONSE = json.dumps({
+    "is_compliant": False,
+    "summary": "Two findings, one with \"quotes\", braces {} and brackets [] in its text.",
+    "requirement_findings": [
+        {"requirement": "ASTM C150 {Type I}", "status": "compliant", "spec_pages": [1, 2]},
+        {"requirement": "Submit \"mix design\"", "status": "missing", "notes": "see [2.3]"},
+    ],
+    "non_conformances": [],
+    "recommendations": ["Resubmit mix design", "Provide mill certificates"],
+    "reviewer_notes": "",
+}, indent=2)
+
+FIELDS = ["requirement_findings", "non_conformances", "recommendations"]
+
+
+def parse_in_chunks(text: str, size: int) -> list:
+    parser = StreamingArrayParser(FIELDS)
+    completed = []
+    for start in range(0, len(text), size):
+        completed.extend(parser.feed(text[start:start + size]))
+    return completed
+
+
+@pytest.mark.parametrize("size", [1, 7, 64, len(RESPONSE)])
+def test_elements_of_watched_arrays_in_order(size):
+    expected = json.loads(RESPONSE)
+    assert parse_in_chunks(RESPONSE, size) == [
+        *[("requirement_findings", finding) for finding in expected["requirement_findings"]],
+        *[("recommendations", recommendation) for recommendation in expected["recommendations"]],
+    ]
+
+
+def test_elements_are_returned_as_soon_as_they_close():
+    parser = StreamingArrayParser(["recommendations"])
+    assert parser.feed('{"recommendations": ["first", "sec') == [("recommendations", "first")]
+    assert parser.feed('ond"') == []
+    assert parser.feed("]}") == [("recommendations", "second")]
+
+
+def test_unwatched_and_nested_arrays_are_ignored():
+    parser = StreamingArrayParser(["recommendations"])
+    text = '{"spec_pages": [1, 2], "nested": {"recommendations": ["not top level"]}, "recommendations": [[1, 2]]}'
+    assert parser.feed(text) == [("recommendations", [1, 2])]
+
+
+def test_string_values_are_not_taken_for_keys():
+    parser = StreamingArrayParser(["recommendations"])
+    assert parser.feed('{"summary": "recommendations", "other": ["x"]}') == []
@@ -0,0 +1,28 @@
+import pytest
+from classes.anthropic import ESTIMATED_CHARS_PER_TOKEN
+from classes.prompt_cache import MIN_CACHEABLE_PROMPT_TOKENS
+from prompts import (
+    CLASSIFICATION_PROMPT,
+    MULTI_SECTION_CLASSIFICATION_PROMPT,
+    SUMMARY_PROMPT,
+    SPEC_CHECK_PROMPT,
+    SPEC_CHECK_DRAWINGS_PROMPT,
+)
+
+
+@pytest.mark.parametrize("prompt", [
+    CLASSIFICATION_PROMPT,
+    MULTI_SECTION_CLASSIFICATION_PROMPT,
+    SUMMARY_PROMPT,
+    SPEC_CHECK_PROMPT,
+    SPEC_CHECK_DRAWINGS_PROMPT,
+])
+def test_cached_system_prompts_reach_minimum_cacheable_length(prompt):
+    # With a margin, as the character estimate is only approximate
+    assert len(prompt) // ESTIMATED_CHARS_PER_TOKEN >= MIN_CACHEABLE_PROMPT_TOKENS * 1.2
+
+
+@pytest.mark.parametrize("prompt", [CLASSIFICATION_PROMPT, SUMMARY_PROMPT, SPEC_CHECK_PROMPT])
+def test_cached_system_prompts_have_no_placeholders(prompt):
+    # A per-request value in the system prompt would give every request its own cache prefix
+    assert "{" not in prompt
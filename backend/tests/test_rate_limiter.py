@@ -0,0 +1,120 @@
+import asyncio
+import time
+from types import SimpleNamespace
+import pytest
+from anthropic import APIStatusError, RateLimitError
+import classes.anthropic as anthropic_module
+from classes.anthropic import Anthropic, RATE_LIMIT_RETRIES
+from classes.rate_limiter import RateLimiter, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+
+OUTPUT_TPM = 90000
+
+
+class Usage:
+    def __init__(self, **usage):
+        self.usage = usage
+
+    def model_dump(self):
+        return self.usage
+
+
+class Response:
+    def __init__(self, **usage):
+        self.usage = Usage(**usage)
+
+
+def status_error(status: int) -> APIStatusError:
+    # Only the status and headers of the response are read
+    response = SimpleNamespace(status_code=status, headers={"retry-after": "0"}, request=None)
+    return RateLimitError("rate limited", response=response, body=None) if status == 429 else \
+        APIStatusError("error", response=response, body=None)
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = RateLimiter(concurrency=2, input_tokens_per_minute=450000, output_tokens_per_minute=OUTPUT_TPM)
+    monkeypatch.setattr(anthropic_module, "rate_limiter", limiter)
+    return limiter
+
+
+@pytest.fixture
+def anthropic(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    return Anthropic()
+
+
+def call_failing(times: int, status: int = 429):
+    """A call that is rejected with status the first times attempts, then succeeds"""
+    attempts = []
+
+    async def call():
+        attempts.append(time.monotonic())
+        if len(attempts) <= times:
+            raise status_error(status)
+        return Response(input_tokens=1000, output_tokens=500)
+    return call, attempts
+
+
+# ---------- Reservations ----------
+
+def test_settle_refunds_unused_reservation(limiter):
+    async def test():
+        async with limiter.slot(input_tokens=2000, output_tokens=25000) as reservation:
+            assert limiter.output_tokens.level == pytest.approx(OUTPUT_TPM - 25000, abs=5)
+            reservation.settle({"input_tokens": 1000, "output_tokens": 500})
+        assert limiter.output_tokens.level == pytest.approx(OUTPUT_TPM - 500, abs=5)
+        assert limiter.in_flight == 0
+    asyncio.run(test())
+
+
+def test_queue_runs_interactive_before_background(limiter):
+    async def test():
+        limiter.concurrency = 1
+        order = []
+
+        async def request(name, priority):
+            async with limiter.slot(priority=priority):
+                order.append(name)
+
+        async with limiter.slot():
+            waiting = [asyncio.create_task(request("background", PRIORITY_BACKGROUND)),
+                       asyncio.create_task(request("interactive", PRIORITY_INTERACTIVE))]
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*waiting)
+        assert order == ["interactive", "background"]
+    asyncio.run(test())
+
+
+# ---------- 429 retries ----------
+
+def test_rejected_attempts_give_their_reservation_back(anthropic, limiter):
+    async def test():
+        call, attempts = call_failing(RATE_LIMIT_RETRIES)
+        await anthropic.call_with_rate_limit(call, input_tokens=2000, output_tokens=25000)
+        assert len(attempts) == RATE_LIMIT_RETRIES + 1
+        assert limiter.rate_limit_pauses == RATE_LIMIT_RETRIES
+        # Only the successful attempt's usage is charged
+        assert limiter.output_tokens.level == pytest.approx(OUTPUT_TPM - 500, abs=5)
+        assert limiter.in_flight == 0
+    asyncio.run(test())
+
+
+def test_last_rejection_raises_and_refunds(anthropic, limiter):
+    async def test():
+        call, attempts = call_failing(RATE_LIMIT_RETRIES + 1)
+        with pytest.raises(RateLimitError):
+            await anthropic.call_with_rate_limit(call, output_tokens=25000)
+        assert len(attempts) == RATE_LIMIT_RETRIES + 1
+        assert limiter.output_tokens.level == pytest.approx(OUTPUT_TPM, abs=5)
+    asyncio.run(test())
+
+
+def test_other_errors_raise_without_retry_and_refund(anthropic, limiter):
+    async def test():
+        call, attempts = call_failing(1, status=400)
+        with pytest.raises(APIStatusError):
+            await anthropic.call_with_rate_limit(call, output_tokens=25000)
+        assert len(attempts) == 1
+        assert limiter.rate_limit_pauses == 0
+        assert limiter.output_tokens.level == pytest.approx(OUTPUT_TPM, abs=5)
+    asyncio.run(test())
@@ -0,0 +1,107 @@
+import pytest
+from classes.anthropic import Anthropic, ESTIMATED_TOKENS_PER_PDF_PAGE, MAX_PDF_PAGES_PER_REQUEST
+from functions.request_split import parse_custom_id, parse_split_custom_id, reduce_split_results, split_part_custom_id, unique
+from functions.section_classification import reduce_classification_parts
+
+SPEC_UUID = "0f8fad5b-d9cb-469f-a165-70867728950e"
+RANGE_ID = f"03-033000-{SPEC_UUID}-10-40"
+MULTI_SECTION_RANGE_ID = f"m-{SPEC_UUID}-10-40"
+
+
+# ---------- custom ids ----------
+
+@pytest.mark.parametrize("range_id", [RANGE_ID, MULTI_SECTION_RANGE_ID])
+def test_part_ids_round_trip(range_id):
+    assert parse_split_custom_id(split_part_custom_id(range_id, 2)) == (range_id, 2)
+
+
+@pytest.mark.parametrize("custom_id", [
+    RANGE_ID,
+    MULTI_SECTION_RANGE_ID,
+    f"03-033000-{SPEC_UUID}-10",  # single page, never split
+])
+def test_whole_range_ids_are_not_parts(custom_id):
+    assert parse_split_custom_id(custom_id) == (custom_id, None)
+
+
+@pytest.mark.parametrize("custom_id, expected", [
+    (RANGE_ID, ("03", "033000", list(range(10, 41)), True)),
+    (f"03-033000-{SPEC_UUID}-10", ("03", "033000", [10], False)),
+    (MULTI_SECTION_RANGE_ID, ("m", SPEC_UUID.split("-")[0], list(range(10, 41)), True)),
+    (f"m-{SPEC_UUID}-10", ("m", SPEC_UUID.split("-")[0], [10], False)),
+])
+def test_parse_custom_id(custom_id, expected):
+    assert parse_custom_id(custom_id) == expected
+
+
+# ---------- reduce ----------
+
+def part(n, **content):
+    return n, {"custom_id": split_part_custom_id(RANGE_ID, n), "content": content}
+
+
+def test_reduce_orders_parts_before_reducing():
+    reduced = reduce_split_results(RANGE_ID, [part(2, pages=[3]), part(1, pages=[1, 2])],
+                                   lambda contents: {"pages": [p for c in contents for p in c["pages"]]})
+    assert reduced == {"custom_id": RANGE_ID, "content": {"pages": [1, 2, 3]}}
+
+
+@pytest.mark.parametrize("failed", [
+    {"type": "errored", "error": "overloaded"},
+    {"content": {"raw": "not json"}},
+    {},
+])
+def test_one_failed_part_fails_the_range(failed):
+    reduced = reduce_split_results(RANGE_ID, [part(1, pages=[1]), (2, failed)], lambda contents: {})
+    assert reduced["custom_id"] == RANGE_ID
+    assert reduced["type"] == "errored"
+
+
+def test_classification_parts_primary_if_any_part_is():
+    reduced = reduce_classification_parts([
+        {"is_primary": False, "confidence": 0.9, "reasoning": "TOC", "pages_analyzed": [10, 11],
+         "referenced_sections": ["011000"], "section_title": "Contents"},
+        {"is_primary": True, "confidence": 0.8, "reasoning": "Title block", "pages_analyzed": [12],
+         "referenced_sections": ["011000", "079200"], "section_title": "Cast-in-Place Concrete"},
+    ])
+    assert reduced["is_primary"] is True
+    assert reduced["confidence"] == 0.8
+    assert reduced["section_title"] == "Cast-in-Place Concrete"
+    assert reduced["pages_analyzed"] == [10, 11, 12]
+    assert reduced["referenced_sections"] == ["011000", "079200"]
+
+
+def test_unique_keeps_first_seen_order():
+    assert unique([3, 1, 3, [1], [1], 2]) == [3, 1, [1], 2]
+
+
+# ---------- plan ----------
+
+@pytest.fixture
+def anthropic(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    return Anthropic()
+
+
+def test_small_range_is_not_split(anthropic):
+    pages = list(range(10))
+    assert anthropic.plan_page_splits(pages, "prompt", max_tokens=1024) == [pages]
+
+
+def test_large_range_splits_into_even_contiguous_parts(anthropic):
+    pages = list(range(30))
+    context_tokens = 1024 + 11 * ESTIMATED_TOKENS_PER_PDF_PAGE  # room for 10 pages besides the request text
+    splits = anthropic.plan_page_splits(pages, "", max_tokens=1024, context_tokens=context_tokens)
+    assert splits == [pages[0:10], pages[10:20], pages[20:30]]
+
+
+def test_parts_respect_pdf_page_limit(anthropic):
+    pages = list(range(MAX_PDF_PAGES_PER_REQUEST + 1))
+    splits = anthropic.plan_page_splits(pages, "", max_tokens=0, page_tokens=1, context_tokens=10 ** 9)
+    assert [len(split) for split in splits] == [51, 50]
+
+
+def test_page_costs_fill_parts_up_to_budget(anthropic):
+    splits = anthropic.plan_page_splits([1, 2, 3, 4], "", max_tokens=0, page_tokens=10, context_tokens=110,
+                                        page_costs=[60, 30, 20, 90])
+    assert splits == [[1, 2], [3], [4]]
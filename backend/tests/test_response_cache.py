@@ -0,0 +1,61 @@
+import pytest
+from classes.response_cache import ResponseCache
+
+URL_A = "https://bucket.s3.amazonaws.com/spec/original_pages/page_0001.pdf?X-Amz-Signature=a"
+URL_B = "https://bucket.s3.amazonaws.com/spec/original_pages/page_0001.pdf?X-Amz-Signature=b"
+SCHEMA = {"type": "object", "properties": {"is_primary": {"type": "boolean"}}}
+
+
+def document(url):
+    return {"type": "document", "source": {"type": "url", "url": url}}
+
+
+def make_key(cache=None, **overrides):
+    request = {
+        "model": "claude-sonnet-4-6",
+        "max_tokens": 1024,
+        "system_prompt": "Classify the pages",
+        "schema": SCHEMA,
+        "content_blocks": [document(URL_A), {"type": "text", "text": "Section 033000"}],
+        "source_hashes": {URL_A: "etag-1", URL_B: "etag-1"},
+        **overrides,
+    }
+    return (cache or ResponseCache(database=None)).make_key(**request)
+
+
+def test_same_request_same_key():
+    assert make_key() == make_key()
+    assert len(make_key()) == 64
+
+
+def test_presigned_urls_are_keyed_by_content_hash():
+    resigned = [document(URL_B), {"type": "text", "text": "Section 033000"}]
+    assert make_key(content_blocks=resigned) == make_key()
+    assert make_key(source_hashes={URL_A: "etag-2"}) != make_key()
+
+
+def test_url_without_content_hash_is_uncacheable():
+    assert make_key(source_hashes={}) is None
+
+
+def test_cache_control_markers_do_not_change_the_key():
+    marked = [{"type": "text", "text": "Classify the pages", "cache_control": {"type": "ephemeral"}}]
+    plain = [{"type": "text", "text": "Classify the pages"}]
+    assert make_key(system_prompt=marked) == make_key(system_prompt=plain)
+
+
+@pytest.mark.parametrize("override", [
+    {"model": "claude-opus-4-6"},
+    {"max_tokens": 2048},
+    {"system_prompt": "Summarize the pages"},
+    {"schema": {**SCHEMA, "required": ["is_primary"]}},
+    {"content_blocks": [document(URL_A), {"type": "text", "text": "Section 034000"}]},
+    {"options": {"thinking": True}},
+])
+def test_everything_that_shapes_the_answer_is_in_the_key(override):
+    assert make_key(**override) != make_key()
+
+
+def test_schema_key_order_does_not_matter():
+    reordered = {"properties": SCHEMA["properties"], "type": "object"}
+    assert make_key(schema=reordered) == make_key()
@@ -0,0 +1,24 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import fitz
+from functions.section_pages_detection import section_pages_detection
+
+
+def write_spec(path: str, pages: list[str]):
+    document = fitz.open()
+    for text in pages:
+        document.new_page().insert_text((72, 72), text)
+    document.save(path)
+    document.close()
+
+
+def test_detection_runs_in_shared_executor(tmp_path):
+    path = str(tmp_path / "spec.pdf")
+    write_spec(path, [f"SECTION 03 30 00 CAST-IN-PLACE CONCRETE page {i}" for i in range(4)])
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        result = asyncio.run(section_pages_detection("spec-a", None, None, workers=2, pdf_path=path, executor=executor))
+        # The caller's pool is left open for the page split
+        assert executor.submit(sum, [1, 2]).result() == 3
+
+    assert set(result) >= {"divisions_and_sections", "page_signals", "page_texts"}